@@ -4,6 +4,9 @@ from config import Config
 from models import db
 from models.user import User
 from routes import register_blueprints
+from utils.db_engine import init_db_engine
+from utils.migrations import upgrade_db
+from utils.time_buckets import to_local
 import os
 
 # =====================================================
@@ -34,6 +37,7 @@ def create_app():
         "uploads/inventory",
         "uploads/history",
         "uploads/bultos",
+        "uploads/jobs",
         "reports",
     ]
 
@@ -49,6 +53,7 @@ def create_app():
     # INICIALIZAR EXTENSIONES
     # =====================================================
     db.init_app(app)
+    init_db_engine(app)
     login_manager.init_app(app)
 
     # Registrar Blueprints
@@ -60,8 +65,11 @@ def create_app():
     @app.after_request
     def disable_compression(response):
         response.headers["Content-Encoding"] = "identity"
-        response.headers["Cache-Control"] = "no-store"
-        response.headers["Pragma"] = "no-cache"
+
+        # Respetar la política de caché que haya definido la ruta (p. ej. ETag)
+        if "Cache-Control" not in response.headers:
+            response.headers["Cache-Control"] = "no-store"
+            response.headers["Pragma"] = "no-cache"
         return response
 
     # =====================================================
@@ -74,6 +82,9 @@ def create_app():
         except:
             return value
 
+    # Fechas guardadas en UTC → hora de Lima para mostrar
+    app.add_template_filter(to_local, "hora_local")
+
     # =====================================================
     # RUTA RAIZ → LOGIN
     # =====================================================
@@ -93,13 +104,39 @@ def create_app():
     def not_found(e):
         return jsonify({"error": "Ruta no encontrada"}), 404
 
+    # =====================================================
+    # COMANDOS CLI (flask --app app <comando>)
+    # =====================================================
+    @app.cli.command("upgrade-db")
+    def upgrade_db_cmd():
+        """Crea las tablas que falten y aplica las migraciones pendientes."""
+        corridos = upgrade_db()
+        print(f">>> Base actualizada ({len(corridos)} migraciones aplicadas).")
+
+    @app.cli.command("rebuild-kpis")
+    def rebuild_kpis():
+        """Recalcula la fila de KPI del dashboard desde las tablas de origen."""
+        from utils.dashboard_kpis import rebuild_dashboard_kpis
+
+        rebuild_dashboard_kpis()
+        db.session.commit()
+        print(">>> KPI del dashboard reconstruidos.")
+
+    @app.cli.command("rebuild-bultos-rollup")
+    def rebuild_bultos_rollup_cmd():
+        """Recalcula el rollup de bultos por hora y día desde la tabla bultos."""
+        from utils.bultos_rollup import rebuild_bultos_rollup
+
+        filas = rebuild_bultos_rollup()
+        db.session.commit()
+        print(f">>> Rollup de bultos reconstruido ({filas} filas).")
+
     # =====================================================
     # CREAR TABLAS Y OWNER
     # =====================================================
     with app.app_context():
         print("\n>>> Creando tablas si no existen...")
-        db.create_all()
-        db.session.commit()
+        upgrade_db()
         print(">>> Tablas listas.\n")
 
         # OWNER predeterminado
@@ -130,6 +167,32 @@ def create_app():
             db.session.commit()
             print(">>> OWNER verificado y activo.")
 
+        # Jobs que quedaron "en curso" porque su proceso murió
+        from utils.jobs import fail_stale_jobs
+
+        interrumpidos = fail_stale_jobs()
+        if interrumpidos:
+            print(f">>> {interrumpidos} job(s) interrumpido(s) marcados como fallidos.")
+
+        # Rollup de bultos vacío con bultos ya cargados (primer despliegue)
+        from utils.bultos_rollup import ensure_bultos_rollup
+
+        filas = ensure_bultos_rollup()
+        if filas:
+            db.session.commit()
+            print(f">>> Rollup de bultos reconstruido ({filas} filas).")
+
+        # Fila de KPI del dashboard: se crea aquí y no en el primer GET
+        from utils.dashboard_kpis import ensure_dashboard_kpis
+
+        if ensure_dashboard_kpis():
+            db.session.commit()
+            print(">>> KPI del dashboard calculados.")
+
+        # Con preload_app los workers de gunicorn se bifurcan de este proceso:
+        # cada uno debe abrir sus propias conexiones
+        db.engine.dispose()
+
     return app
 
 
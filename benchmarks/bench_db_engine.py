@@ -0,0 +1,106 @@
+import multiprocessing as mp
+import os
+import sys
+import time
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+
+from benchmarks.common import make_app, parse_sizes, temp_sqlite_uri
+from models import db
+from models.bultos import Bulto
+from models.bultos_rollup import BultosRollup
+from utils.bultos_rollup import record_bultos
+from utils.dashboard_kpis import record_bulto
+from utils.time_buckets import utc_now
+
+# =============================================================================
+# BENCHMARK: ESCRITURAS CONCURRENTES CON Y SIN EL PERFIL DEL MOTOR
+#   Cada proceso imita un worker de gunicorn: registra bultos (misma
+#   transacción que /bultos/new: bulto + KPI + rollup, un commit por bulto)
+#   y entre escritura y escritura hace una lectura, como las otras páginas.
+#   "sin perfil" = engine por defecto (journal DELETE, synchronous FULL);
+#   "perfil"     = config.engine_options + config.sqlite_pragmas.
+#
+#   python -m benchmarks.bench_db_engine [1 4 8]        (procesos)
+#   BENCH_DATABASE_URL=postgresql://... para medir contra Postgres
+#   (¡borra las tablas bultos y bultos_rollup de esa base!)
+# =============================================================================
+
+WRITES_PER_WORKER = int(os.environ.get("BENCH_WRITES", 300))
+
+
+def _worker(uri, perfil, escrituras, barrera, resultados):
+    app = make_app(uri, perfil=perfil)
+
+    with app.app_context():
+        ok = errores = 0
+        barrera.wait()
+        t0 = time.perf_counter()
+
+        for i in range(escrituras):
+            try:
+                bulto = Bulto(cantidad=i % 7 + 1, chofer="BENCH", placa=f"B{os.getpid()}",
+                              fecha_hora=utc_now())
+                db.session.add(bulto)
+                record_bulto(bulto)
+                record_bultos([bulto])
+                db.session.commit()
+                ok += 1
+            except OperationalError:
+                # "database is locked" tras agotar la espera
+                db.session.rollback()
+                errores += 1
+
+            db.session.query(func.count(Bulto.id)).filter(Bulto.chofer_norm == "BENCH").scalar()
+            db.session.commit()
+
+        resultados.put((ok, errores, time.perf_counter() - t0))
+
+
+def run(uri, perfil, workers):
+    """(escrituras ok, errores, segundos del más lento) con `workers` procesos."""
+    app = make_app(uri, perfil=perfil)
+    with app.app_context():
+        db.session.execute(Bulto.__table__.delete())
+        db.session.execute(BultosRollup.__table__.delete())
+        db.session.commit()
+        db.engine.dispose()
+
+    # spawn: procesos independientes con su propio engine, como los workers
+    ctx = mp.get_context("spawn")
+    barrera = ctx.Barrier(workers)
+    resultados = ctx.Queue()
+    procesos = [
+        ctx.Process(target=_worker, args=(uri, perfil, WRITES_PER_WORKER, barrera, resultados))
+        for _ in range(workers)
+    ]
+    for p in procesos:
+        p.start()
+
+    filas = [resultados.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+
+    return (
+        sum(ok for ok, _, _ in filas),
+        sum(err for _, err, _ in filas),
+        max(seg for _, _, seg in filas),
+    )
+
+
+def main(argv):
+    sizes = parse_sizes(argv, (1, 4, 8))
+    url = os.environ.get("BENCH_DATABASE_URL")
+
+    print(f"{'procesos':>8} {'perfil':>12} {'escrituras':>11} {'errores':>8} {'segundos':>9} {'escr/s':>9}")
+    for workers in sizes:
+        for perfil in (False, True):
+            uri = url or temp_sqlite_uri()
+            ok, errores, segundos = run(uri, perfil, workers)
+            nombre = "perfil" if perfil else "sin perfil"
+            print(f"{workers:>8} {nombre:>12} {ok:>11} {errores:>8} {segundos:>9.2f} {ok / segundos:>9,.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
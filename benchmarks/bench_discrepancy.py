@@ -0,0 +1,77 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import parse_sizes, timer
+from utils.discrepancy import add_discrepancy_columns
+
+# =============================================================================
+# BENCHMARK: DISCREPANCIAS (dos DataFrame.apply fila a fila vs máscaras numpy)
+#   python -m benchmarks.bench_discrepancy [200000]
+# =============================================================================
+
+
+def merged_frame(n, seed=0):
+    """Inventario del sistema + conteo (un 30% sin contar)."""
+    rng = np.random.default_rng(seed)
+    contado = rng.integers(0, 60, n).astype(float)
+    contado[rng.random(n) < 0.3] = np.nan
+    return pd.DataFrame({
+        "Código Material": rng.integers(1_000_000, 9_999_999, n).astype(str),
+        "Ubicación": [f"E{i % 5000:04d}" for i in range(n)],
+        "Stock sistema": rng.integers(0, 60, n).astype(float),
+        "Stock contado": contado,
+    })
+
+
+def apply_discrepancies(merged):
+    """Ruta anterior de export_discrepancies_auto (apply por fila)."""
+    merged["Stock contado"] = merged["Stock contado"].fillna("NO CONTADO")
+
+    def diff_calc(row):
+        if row["Stock contado"] == "NO CONTADO":
+            return 0
+        return int(row["Stock contado"]) - int(row["Stock sistema"])
+
+    merged["Diferencia"] = merged.apply(diff_calc, axis=1)
+
+    def estado_calc(row):
+        if row["Stock contado"] == "NO CONTADO":
+            return "NO CONTADO"
+        d = row["Diferencia"]
+        if d == 0:
+            return "OK"
+        if d < 0:
+            return "CRÍTICO" if d <= -10 else "FALTA"
+        return "SOBRA"
+
+    merged["Estado"] = merged.apply(estado_calc, axis=1)
+    return merged
+
+
+def main(argv):
+    sizes = parse_sizes(argv, (200_000,))
+
+    print(f"{'filas':>10} {'apply (s)':>10} {'numpy (s)':>10} {'x':>8}")
+    for n in sizes:
+        base = merged_frame(n)
+
+        antes = base.copy()
+        with timer({}) as r_apply:
+            apply_discrepancies(antes)
+
+        ahora = base.copy()
+        with timer({}) as r_numpy:
+            add_discrepancy_columns(ahora)
+
+        # Mismo resultado (los stocks de prueba son enteros)
+        assert (antes["Estado"].to_numpy() == ahora["Estado"].astype(str).to_numpy()).all()
+        assert (antes["Diferencia"].to_numpy() == ahora["Diferencia"].to_numpy()).all()
+
+        speedup = r_apply["segundos"] / r_numpy["segundos"]
+        print(f"{n:>10} {r_apply['segundos']:>10.3f} {r_numpy['segundos']:>10.4f} {speedup:>8.0f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
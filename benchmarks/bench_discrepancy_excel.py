@@ -0,0 +1,69 @@
+import sys
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+
+from benchmarks.bench_discrepancy import merged_frame
+from benchmarks.common import parse_sizes, timer
+from utils.discrepancy import add_discrepancy_columns
+from utils.excel import generate_discrepancies_excel
+
+# =============================================================================
+# BENCHMARK: EXCEL DE DISCREPANCIAS (openpyxl + iterrows vs xlsxwriter
+#            constant_memory)
+#   python -m benchmarks.bench_discrepancy_excel [50000 200000]
+# =============================================================================
+
+# La ruta anterior tarda minutos con tamaños grandes
+OPENPYXL_MAX_ROWS = 50000
+
+
+def openpyxl_excel(df):
+    """Ruta anterior: astype(str), iterrows() y estilos celda por celda."""
+    output = BytesIO()
+    df = df.astype(str)
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(list(df.columns))
+    for _, row in df.iterrows():
+        ws.append(row.tolist())
+
+    center = Alignment(horizontal="center")
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill("solid", fgColor="1F4E78")
+        cell.alignment = center
+
+    thin = Side(border_style="thin", color="000000")
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    for row in ws.iter_rows(min_row=2):
+        for cell in row:
+            cell.border = border
+            cell.alignment = center
+
+    wb.save(output)
+    output.seek(0)
+    return output
+
+
+def main(argv):
+    sizes = parse_sizes(argv, (50_000, 200_000))
+
+    print(f"{'filas':>10} {'método':>10} {'segundos':>10}")
+    for n in sizes:
+        df = add_discrepancy_columns(merged_frame(n))
+
+        if n <= OPENPYXL_MAX_ROWS:
+            with timer({}) as r:
+                openpyxl_excel(df)
+            print(f"{n:>10} {'openpyxl':>10} {r['segundos']:>10.2f}")
+
+        with timer({}) as r:
+            generate_discrepancies_excel(df).close()
+        print(f"{n:>10} {'xlsxwriter':>10} {r['segundos']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
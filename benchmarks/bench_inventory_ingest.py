@@ -0,0 +1,91 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import make_app, parse_sizes, timer
+from models import db
+from models.inventory import InventoryItem
+from models.inventory_history import InventoryHistory
+from utils.inventory_ingest import reload_inventory
+
+# =============================================================================
+# BENCHMARK: CARGA DE INVENTARIO (ORM fila a fila vs INSERT masivo por bloques
+#            vs recarga incremental con ~1% de posiciones modificadas)
+#   python -m benchmarks.bench_inventory_ingest [10000 100000 1000000]
+# =============================================================================
+
+ORM_MAX_ROWS = 10000
+
+
+def sap_frame(n, seed=0):
+    """DataFrame con el mismo formato que el Excel SAP de inventario."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Código del Material": rng.integers(1_000_000, 9_999_999, n).astype(str),
+        "Texto breve de material": [f"MATERIAL {i}" for i in range(n)],
+        "Unidad de medida base": rng.choice(["UN", "KG", "M", "L"], n),
+        "Ubicación": [f"E{i % 5000:04d}" for i in range(n)],
+        "Libre utilización": rng.integers(0, 500, n).astype(float),
+    })
+
+
+def orm_insert(df):
+    """Ruta anterior: dos iterrows() con db.session.add por fila."""
+    for _, row in df.iterrows():
+        db.session.add(InventoryItem(
+            material_code=row["Código del Material"],
+            material_text=row["Texto breve de material"],
+            base_unit=row["Unidad de medida base"],
+            location=row["Ubicación"],
+            libre_utilizacion=row["Libre utilización"],
+        ))
+    for _, row in df.iterrows():
+        db.session.add(InventoryHistory(
+            snapshot_id="bench",
+            material_code=row["Código del Material"],
+            material_text=row["Texto breve de material"],
+            base_unit=row["Unidad de medida base"],
+            location=row["Ubicación"],
+            libre_utilizacion=row["Libre utilización"],
+        ))
+    db.session.commit()
+
+
+def modified_frame(df, fraction=0.01, seed=1):
+    """Copia del Excel con una fracción de stocks cambiados (recarga típica)."""
+    rng = np.random.default_rng(seed)
+    out = df.copy()
+    idx = rng.choice(len(out), max(1, int(len(out) * fraction)), replace=False)
+    out.loc[idx, "Libre utilización"] += 1
+    return out
+
+
+def main(argv):
+    sizes = parse_sizes(argv, (10_000, 100_000, 1_000_000))
+
+    print(f"{'filas':>10} {'método':>8} {'segundos':>10} {'filas/s':>12}")
+    for n in sizes:
+        df = sap_frame(n)
+
+        if n <= ORM_MAX_ROWS:
+            app = make_app()
+            with app.app_context():
+                with timer({}) as r:
+                    orm_insert(df)
+            print(f"{n:>10} {'orm':>8} {r['segundos']:>10.2f} {n / r['segundos']:>12,.0f}")
+
+        app = make_app()
+        with app.app_context():
+            with timer({}) as r:
+                reload_inventory(df, "bench", "bench", modo="completo")
+            print(f"{n:>10} {'bulk':>8} {r['segundos']:>10.2f} {n / r['segundos']:>12,.0f}")
+
+            with timer({}) as r:
+                stats = reload_inventory(modified_frame(df), "bench-2", "bench-2")
+            print(f"{n:>10} {'upsert':>8} {r['segundos']:>10.2f} {n / r['segundos']:>12,.0f}"
+                  f"   ({stats['actualizados']} actualizados)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
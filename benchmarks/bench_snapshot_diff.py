@@ -0,0 +1,72 @@
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_inventory_ingest import sap_frame
+from benchmarks.common import make_app, parse_sizes, timer
+from models import db
+from models.inventory_snapshot import InventorySnapshot
+from utils.inventory_ingest import reload_inventory
+from utils.inventory_snapshots import load_snapshot, diff_snapshots
+
+# =============================================================================
+# BENCHMARK: DIFERENCIA ENTRE DOS SNAPSHOTS
+#   python -m benchmarks.bench_snapshot_diff [100000]
+#   Segundo snapshot: 2% de cantidades cambiadas, 1% eliminadas, 1% nuevas.
+# =============================================================================
+
+
+def python_diff(old, new):
+    """Referencia: diccionarios por posición recorridos en Python."""
+    a = {(r[0], r[1]): r[4] for r in old.itertuples(index=False)}
+    b = {(r[0], r[1]): r[4] for r in new.itertuples(index=False)}
+    nuevos = [k for k in b if k not in a]
+    eliminados = [k for k in a if k not in b]
+    cambiados = [k for k in a if k in b and a[k] != b[k]]
+    return nuevos, eliminados, cambiados
+
+
+def main(argv):
+    sizes = parse_sizes(argv, (100_000,))
+    rng = np.random.default_rng(1)
+
+    print(f"{'filas':>10} {'etapa':>22} {'segundos':>10}")
+    for n in sizes:
+        base = sap_frame(n)
+        base["Ubicación"] = [f"E{i:07d}" for i in range(n)]
+
+        nuevo = base.copy()
+        cambiar = rng.choice(n, n // 50, replace=False)
+        nuevo.loc[cambiar, "Libre utilización"] += 1
+        nuevo = nuevo.drop(index=rng.choice(n, n // 100, replace=False))
+        extra = base.sample(n // 100, random_state=2).assign(
+            **{"Ubicación": [f"N{i:07d}" for i in range(n // 100)]}
+        )
+        nuevo = pd.concat([nuevo, extra], ignore_index=True)
+
+        app = make_app()
+        with app.app_context():
+            id_a, id_b = str(uuid.uuid4()), str(uuid.uuid4())
+            reload_inventory(base, id_a, "A", modo="completo")
+            with timer({}) as r:
+                reload_inventory(nuevo, id_b, "B")
+            cambios = db.session.get(InventorySnapshot, id_b).changes
+            print(f"{n:>10} {'recarga + delta':>22} {r['segundos']:>10.2f}   ({cambios} filas delta)")
+
+            with timer({}) as r:
+                old, new = load_snapshot(id_a), load_snapshot(id_b)
+            print(f"{n:>10} {'reconstruir 2 snapshots':>22} {r['segundos']:>10.2f}")
+
+            with timer({}) as r:
+                diff, totales = diff_snapshots(old, new)
+            print(f"{n:>10} {'diff pandas':>22} {r['segundos']:>10.2f}   ({len(diff)} diferencias)")
+
+            with timer({}) as r:
+                python_diff(old, new)
+            print(f"{n:>10} {'diff python (dicts)':>22} {r['segundos']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+
+from config import engine_options, sqlite_pragmas
+from models import db
+from utils.db_engine import init_db_engine
+
+# =============================================================================
+# UTILIDADES COMPARTIDAS POR LOS BENCHMARKS
+#   Ejecutar desde la raíz del proyecto:  python -m benchmarks.<modulo>
+# =============================================================================
+
+
+def temp_sqlite_uri():
+    tmpdir = tempfile.mkdtemp(prefix="bench_mro_")
+    return f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+
+def make_app(db_uri=None, perfil=False):
+    """
+    App Flask mínima (sin blueprints ni usuario OWNER) con tablas creadas.
+    perfil=True aplica el perfil del motor de config (pool / PRAGMAs).
+    """
+    if db_uri is None:
+        db_uri = temp_sqlite_uri()
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = db_uri
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if perfil:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(db_uri)
+        app.config["SQLITE_PRAGMAS"] = sqlite_pragmas()
+    db.init_app(app)
+    if perfil:
+        init_db_engine(app, verbose=False)
+
+    with app.app_context():
+        db.create_all()
+
+    return app
+
+
+@contextmanager
+def timer(resultado):
+    """Guarda en resultado["segundos"] el tiempo del bloque."""
+    t0 = time.perf_counter()
+    yield resultado
+    resultado["segundos"] = time.perf_counter() - t0
+
+
+def parse_sizes(argv, default):
+    """Tamaños desde la línea de comandos: 10000 100000 1000000."""
+    sizes = [int(a) for a in argv if a.isdigit()]
+    return sizes or list(default)
@@ -2,13 +2,78 @@ import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+
+def _env_int(nombre, defecto):
+    return int(os.environ.get(nombre, defecto))
+
+
+def database_url():
+    """DATABASE_URL del entorno (Railway / Koyeb) o el archivo SQLite local."""
+    url = os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(BASE_DIR, 'warehouse_mro_v2.db')}"
+
+    # Los proveedores entregan "postgres://", SQLAlchemy 2 sólo acepta "postgresql://"
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+# =============================================================================
+# PERFIL DEL MOTOR DE BASE DE DATOS (según la URL; cada valor se puede
+# cambiar con su variable de entorno)
+#
+#   SQLite   → PRAGMAs en cada conexión (utils.db_engine): WAL para que los
+#              lectores no bloqueen al escritor, synchronous=NORMAL (seguro
+#              con WAL, un fsync por checkpoint y no por commit) y
+#              busy_timeout para esperar el lock en vez de fallar con
+#              "database is locked" cuando hay varios workers de gunicorn.
+#   Postgres → pool por worker, pre-ping para descartar conexiones cortadas
+#              y statement_timeout (SET LOCAL, utils.db_engine) sólo en las
+#              transacciones de peticiones web, para que una consulta no
+#              retenga el worker. Los jobs en segundo plano, las migraciones
+#              y los comandos CLI corren sin límite.
+# =============================================================================
+def sqlite_pragmas():
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 15000),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        # Negativo = KiB (64 MB de caché de páginas por conexión)
+        "cache_size": -_env_int("SQLITE_CACHE_KB", 64 * 1024),
+    }
+
+
+def engine_options(url):
+    """SQLALCHEMY_ENGINE_OPTIONS para la URL dada."""
+    if url.startswith("postgresql"):
+        return {
+            "pool_size": _env_int("DB_POOL_SIZE", 5),
+            "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+            "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+            "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+            "pool_pre_ping": True,
+        }
+
+    if url.startswith("sqlite"):
+        return {}
+
+    return {"pool_pre_ping": True}
+
+
 class Config:
     SECRET_KEY = "clave_super_secreta_mro_2025"
 
-    # Base de datos en archivo local
-    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BASE_DIR, 'warehouse_mro_v2.db')}"
+    # Base de datos: DATABASE_URL o archivo local
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # PRAGMAs aplicados a cada conexión SQLite (ignorados con otros motores)
+    SQLITE_PRAGMAS = sqlite_pragmas()
+
+    # Límite por consulta en peticiones web (Postgres; 0 = sin límite)
+    REQUEST_STATEMENT_TIMEOUT_MS = _env_int("DB_STATEMENT_TIMEOUT_MS", 30000)
+
     # Carpetas internas
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
     REPORT_FOLDER = os.path.join(BASE_DIR, "static", "reports")
@@ -0,0 +1,39 @@
+import os
+
+# =============================================================================
+# GUNICORN (Dockerfile y Procfile: gunicorn -c gunicorn.conf.py wsgi:app)
+#
+#   gthread → cada worker atiende varias peticiones a la vez con hilos. El
+#             stream SSE del mapa (/warehouse2d/stream) retiene su hilo hasta
+#             STREAM_SECONDS; con un worker sync ocuparía el worker entero y
+#             el resto de páginas esperaría en cola.
+#   preload → create_app (migraciones, OWNER, jobs huérfanos) corre una sola
+#             vez en el proceso maestro y no en cada worker a la vez.
+#
+#   Presupuesto de hilos (por defecto 2 workers × 8 hilos = 16):
+#     - streams del mapa: hasta GUNICORN_THREADS // 2 por worker (8 en
+#       total, MAP_STREAMS_PER_PROCESS para cambiarlo); con el cupo lleno el
+#       mapa recibe 503 y pasa a consultar /map-data cada 30 s;
+#     - el resto (8) queda siempre libre para conteo, autoguardado, estado
+#       de jobs y demás páginas.
+#
+#   Variables: PORT, WEB_CONCURRENCY (workers), GUNICORN_THREADS (hilos por
+#   worker), GUNICORN_TIMEOUT (segundos).
+# =============================================================================
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8080)}"
+
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Las cargas de Excel grandes van a jobs en segundo plano; una petición que
+# pase de aquí está colgada
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+preload_app = True
+
+accesslog = "-"
+errorlog = "-"
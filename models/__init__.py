@@ -17,8 +17,13 @@ from .technician_error import TechnicianError
 from .equipos import Equipo
 from .productividad import Productividad
 from .auditoria import Auditoria
+from .inventory_snapshot import InventorySnapshot
 from .inventory_history import InventoryHistory
 from .warehouse2d import WarehouseLocation
 from .actividad import ActividadUsuario
 from .inventory_count import InventoryCount
+from .job import Job
+from .dashboard_kpis import DashboardKpis
+from .bultos_rollup import BultosRollup
+from .schema_migration import SchemaMigration
 
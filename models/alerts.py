@@ -40,6 +40,25 @@ class Alert(db.Model):
     # Datos extras en JSON
     detalles = db.Column(db.Text, nullable=True)
 
+    # Huella tipo|ubicación|material: una sola alerta activa por huella
+    fingerprint = db.Column(db.String(255), nullable=True)
+
+    # Última vez que la condición se volvió a detectar (o se cerró)
+    actualizado = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index(
+            "ux_alertas_fingerprint_activo",
+            "fingerprint",
+            unique=True,
+            sqlite_where=db.text("estado = 'activo'"),
+            postgresql_where=db.text("estado = 'activo'"),
+        ),
+    )
+
+    # Condición del índice parcial (ON CONFLICT ... WHERE ...)
+    ACTIVE_WHERE = db.text("estado = 'activo'")
+
     # ============================================================
     # Normalizador automático: asegura compatibilidad con todo
     # ============================================================
@@ -54,6 +73,13 @@ class Alert(db.Model):
 
         super().__init__(**kwargs)
 
+    # ============================================================
+    # Huella de la alerta (sirve con str o con columnas SQL)
+    # ============================================================
+    @staticmethod
+    def make_fingerprint(alert_type, location, material):
+        return alert_type + "|" + location + "|" + material
+
     # ============================================================
     # Guardar JSON en dict automáticamente
     # ============================================================
@@ -1,6 +1,9 @@
 from models import db
 from datetime import datetime
-from zoneinfo import ZoneInfo
+from sqlalchemy import event, func, select
+
+from models.post_registro import PostRegistro
+from utils.normalize import normalize_name, normalize_plate
 
 # ============================================================
 # 📦 MODELO PRINCIPAL: BULTOS
@@ -14,19 +17,18 @@ class Bulto(db.Model):
     chofer = db.Column(db.String(120), nullable=False)
     placa = db.Column(db.String(20), nullable=False)
 
-    fecha_hora = db.Column(
-        db.DateTime,
-        default=lambda: datetime.now(ZoneInfo("America/Lima"))
-    )
+    # Copias normalizadas para filtrar por índice (se recalculan al guardar)
+    chofer_norm = db.Column(db.String(120), nullable=False, default="")
+    placa_norm = db.Column(db.String(20), nullable=False, default="")
+
+    # Fechas en UTC sin zona (utils.time_buckets convierte a hora de Lima)
+    fecha_hora = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     observacion = db.Column(db.String(255))
 
-    creado_en = db.Column(
-        db.DateTime,
-        default=lambda: datetime.now(ZoneInfo("America/Lima"))
-    )
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow)
 
-    # Relación con Post-Registro
+    # Relación con Post-Registro (lista completa: usar selectinload al consultar)
     post_registros = db.relationship(
         "PostRegistro",
         backref="bulto",
@@ -34,19 +36,44 @@ class Bulto(db.Model):
         lazy=True
     )
 
-    @property
-    def total_post_registros(self):
-        return len(self.post_registros)
+    __table_args__ = (
+        db.Index("ix_bultos_chofer_norm_fecha", "chofer_norm", "fecha_hora"),
+        db.Index("ix_bultos_placa_norm_fecha", "placa_norm", "fecha_hora"),
+    )
+
+    # Resumen de conteos calculado en SQL (subconsulta correlacionada).
+    # Diferido: sólo se carga con .options(undefer_group("post_resumen")),
+    # en la misma consulta que los bultos y sin tocar post_registros.
+    total_post_registros = db.column_property(
+        select(func.count(PostRegistro.id))
+        .where(PostRegistro.bulto_id == id)
+        .correlate_except(PostRegistro)
+        .scalar_subquery(),
+        deferred=True,
+        group="post_resumen",
+    )
+
+    ultimo_post_fecha = db.column_property(
+        select(func.max(PostRegistro.fecha_registro))
+        .where(PostRegistro.bulto_id == id)
+        .correlate_except(PostRegistro)
+        .scalar_subquery(),
+        deferred=True,
+        group="post_resumen",
+    )
 
     @property
     def ultimo_post_registro(self):
         if not self.post_registros:
             return None
-        return sorted(
-            self.post_registros,
-            key=lambda p: p.fecha_registro,
-            reverse=True
-        )[0]
+        return max(self.post_registros, key=lambda p: p.fecha_registro)
 
     def __repr__(self):
         return f"<Bulto {self.id} - {self.placa}>"
+
+
+@event.listens_for(Bulto, "before_insert")
+@event.listens_for(Bulto, "before_update")
+def _sync_normalized(mapper, connection, target):
+    target.chofer_norm = normalize_name(target.chofer)
+    target.placa_norm = normalize_plate(target.placa)
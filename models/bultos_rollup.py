@@ -0,0 +1,30 @@
+from models import db
+
+
+class BultosRollup(db.Model):
+    """
+    Totales de bultos por hora y por día (hora local de Lima). Se actualiza
+    por incremento al registrar bultos y se reconstruye con
+    `flask rebuild-bultos-rollup` (utils.bultos_rollup).
+    """
+    __tablename__ = "bultos_rollup"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # "hour" o "day"
+    periodo = db.Column(db.String(8), nullable=False)
+
+    # Inicio del bucket en UTC (clave del upsert)
+    inicio = db.Column(db.DateTime, nullable=False)
+
+    # Día y hora local del bucket (hora = None en las filas diarias)
+    dia = db.Column(db.Date, nullable=False)
+    hora = db.Column(db.Integer, nullable=True)
+
+    bultos = db.Column(db.Integer, nullable=False, default=0)     # registros
+    cantidad = db.Column(db.Integer, nullable=False, default=0)   # suma de cantidad
+
+    __table_args__ = (
+        db.Index("ux_bultos_rollup_bucket", "periodo", "inicio", unique=True),
+        db.Index("ix_bultos_rollup_dia", "periodo", "dia"),
+    )
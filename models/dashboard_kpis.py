@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from models import db
+
+
+class DashboardKpis(db.Model):
+    """
+    Fila única con los KPI del dashboard principal. La mantienen las rutas
+    que escriben (bultos, errores, cargas de inventario y layout 2D) y se
+    puede reconstruir con `flask rebuild-kpis` (utils.dashboard_kpis).
+    """
+    __tablename__ = "dashboard_kpis"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    total_stock = db.Column(db.Integer, nullable=False, default=0)
+    alertas_activas = db.Column(db.Integer, nullable=False, default=0)
+
+    # Contadores del día: si el día guardado no es hoy, valen 0
+    bultos_dia = db.Column(db.Date, nullable=True)
+    bultos_hoy = db.Column(db.Integer, nullable=False, default=0)
+    errores_dia = db.Column(db.Date, nullable=True)
+    errores_hoy = db.Column(db.Integer, nullable=False, default=0)
+
+    # Estados del layout 2D
+    criticos = db.Column(db.Integer, nullable=False, default=0)
+    bajos = db.Column(db.Integer, nullable=False, default=0)
+    normales = db.Column(db.Integer, nullable=False, default=0)
+    vacios = db.Column(db.Integer, nullable=False, default=0)
+
+    # Series de los gráficos (JSON); los bultos por hora salen del rollup
+    alertas_dias = db.Column(db.Text, nullable=True)   # [domingo..sábado]
+    equipos = db.Column(db.Text, nullable=True)        # [codigo, ...]
+
+    actualizado = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,5 +1,8 @@
 from models import db
 from datetime import datetime
+from sqlalchemy import event
+
+from utils.locations import default_sort_key
 
 class InventoryItem(db.Model):
     __tablename__ = "inventory"
@@ -12,20 +15,43 @@ class InventoryItem(db.Model):
 
     location = db.Column(db.String(50), nullable=False, index=True)
 
+    # Clave de orden natural de la ubicación (ORDER BY sin ordenar en Python)
+    location_sort = db.Column(
+        db.String(128), nullable=False, default=default_sort_key("location")
+    )
+
     libre_utilizacion = db.Column(db.Float, default=0)
 
+    # Estado de stock persistido (se recalcula al guardar, ver _sync_status)
+    status = db.Column(db.String(16), nullable=False, index=True)
+
+    # Hash del contenido (texto, unidad, stock) para la recarga incremental
+    row_hash = db.Column(db.String(16), nullable=True)
+
     creado_en = db.Column(db.DateTime, default=datetime.utcnow)
 
-    @property
-    def status(self):
-        if self.libre_utilizacion <= 0:
-            return "CRÍTICO"
-        if self.libre_utilizacion <= 5:
-            return "BAJO"
-        if self.libre_utilizacion <= 15:
-            return "MEDIO"
-        return "NORMAL"
+    __table_args__ = (
+        db.Index("ux_inventory_material_location", "material_code", "location", unique=True),
+        # Orden de listado y paginación keyset: (location_sort, id)
+        db.Index("ix_inventory_location_order", "location_sort", "id"),
+    )
+
+    # Umbrales de status sobre libre_utilizacion: (status, límite superior inclusive)
+    STATUS_LIMITS = (("CRÍTICO", 0), ("BAJO", 5), ("MEDIO", 15), ("NORMAL", None))
+
+    @classmethod
+    def status_for(cls, libre):
+        libre = libre or 0.0
+        for status, limite in cls.STATUS_LIMITS:
+            if limite is None or libre <= limite:
+                return status
 
     def __repr__(self):
         return f"<InventoryItem {self.material_code} - {self.location}>"
 
+
+@event.listens_for(InventoryItem, "before_insert")
+@event.listens_for(InventoryItem, "before_update")
+def _sync_status(mapper, connection, target):
+    target.status = InventoryItem.status_for(target.libre_utilizacion)
+
@@ -10,9 +10,33 @@ class InventoryCount(db.Model):
     material_code = db.Column(db.String(50), nullable=False, index=True)
     location = db.Column(db.String(50), nullable=False, index=True)
 
+    # Usuario que contó: cada contador tiene su propio conteo por posición
+    counter = db.Column(db.String(80), nullable=False, default="")
+
     real_count = db.Column(db.Integer, nullable=False)
 
     fecha = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index(
+            "ux_inventory_count_position",
+            "material_code", "location", "counter",
+            unique=True,
+        ),
+    )
+
     def __repr__(self):
-        return f"<InventoryCount {self.material_code} @ {self.location}>"
+        return f"<InventoryCount {self.material_code} @ {self.location} ({self.counter})>"
+
+
+class InventoryCountBatch(db.Model):
+    """Lotes de autoguardado ya aplicados (clave de idempotencia del cliente)."""
+    __tablename__ = "inventory_count_batch"
+
+    key = db.Column(db.String(64), primary_key=True)
+    counter = db.Column(db.String(80), nullable=False)
+
+    # Respuesta devuelta la primera vez (JSON), se repite en los reintentos
+    result = db.Column(db.Text, nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -3,16 +3,24 @@ from datetime import datetime
 
 
 class InventoryHistory(db.Model):
+    """
+    Fila delta de un snapshot: sólo se guardan las posiciones agregadas (A),
+    modificadas (C) o eliminadas (D) respecto al snapshot anterior. En los
+    snapshots completos (puntos de control) todas las filas son "A".
+    """
     __tablename__ = "inventory_history"
 
     id = db.Column(db.Integer, primary_key=True)
 
-    snapshot_id = db.Column(db.String(64), nullable=False, index=True)
-    snapshot_name = db.Column(db.String(150), nullable=False)
+    snapshot_id = db.Column(
+        db.String(64), db.ForeignKey("snapshot.id"), nullable=False, index=True
+    )
+
+    change_type = db.Column(db.String(1), nullable=False, default="A")
 
     material_code = db.Column(db.String(50), nullable=False, index=True)
-    material_text = db.Column(db.String(255), nullable=False)
-    base_unit = db.Column(db.String(20), nullable=False)
+    material_text = db.Column(db.String(255), nullable=True)
+    base_unit = db.Column(db.String(20), nullable=True)
     location = db.Column(db.String(50), nullable=False, index=True)
 
     libre_utilizacion = db.Column(db.Float, default=0)
@@ -20,4 +28,4 @@ class InventoryHistory(db.Model):
     creado_en = db.Column(db.DateTime, default=datetime.utcnow)
 
     def __repr__(self):
-        return f"<History {self.snapshot_name} - {self.material_code}>"
+        return f"<History {self.snapshot_id} {self.change_type} - {self.material_code}>"
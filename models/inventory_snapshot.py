@@ -0,0 +1,40 @@
+from models import db
+from datetime import datetime
+
+
+class InventorySnapshot(db.Model):
+    __tablename__ = "snapshot"
+
+    id = db.Column(db.String(64), primary_key=True)
+
+    # Orden de carga (1, 2, 3...) usado para reconstruir la cadena de deltas
+    seq = db.Column(db.Integer, nullable=False, unique=True, index=True)
+
+    name = db.Column(db.String(150), nullable=False)
+
+    # carga = inventario base (cadena de deltas) / historico = Excel antiguo aislado
+    origen = db.Column(db.String(20), nullable=False, default="carga", index=True)
+
+    # True si el snapshot guarda todas sus filas (punto de control)
+    is_full = db.Column(db.Boolean, nullable=False, default=False)
+
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    changes = db.Column(db.Integer, nullable=False, default=0)
+    checksum = db.Column(db.String(64), nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "origen": self.origen,
+            "is_full": self.is_full,
+            "row_count": self.row_count,
+            "changes": self.changes,
+            "checksum": self.checksum,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f"<Snapshot {self.name} ({self.row_count} filas)>"
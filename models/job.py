@@ -0,0 +1,58 @@
+from models import db
+from datetime import datetime
+import json
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+
+    id = db.Column(db.String(36), primary_key=True)
+
+    # Tipo de trabajo: inventario, layout_2d, analisis_oc
+    job_type = db.Column(db.String(50), nullable=False, index=True)
+
+    # pending → running → done / failed
+    status = db.Column(db.String(20), nullable=False, default="pending")
+
+    # Etapa actual legible por el usuario (Leyendo Excel, Guardando, ...)
+    stage = db.Column(db.String(100), nullable=True)
+
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+
+    # Listas / dicts serializados en JSON
+    errors = db.Column(db.Text, nullable=True)
+    result = db.Column(db.Text, nullable=True)
+
+    usuario = db.Column(db.String(120), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def get_errors(self):
+        try:
+            return json.loads(self.errors) if self.errors else []
+        except Exception:
+            return []
+
+    def get_result(self):
+        try:
+            return json.loads(self.result) if self.result else {}
+        except Exception:
+            return {}
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "type": self.job_type,
+            "status": self.status,
+            "stage": self.stage,
+            "rows_processed": self.rows_processed,
+            "errors": self.get_errors(),
+            "result": self.get_result(),
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<Job {self.job_type} {self.id} - {self.status}>"
@@ -17,5 +17,12 @@ class PostRegistro(db.Model):
     registrado_por = db.Column(db.String(100))
     fecha_registro = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Cubre el conteo y la última fecha por bulto (Bulto.total_post_registros)
+        db.Index("ix_post_registro_bulto_fecha", "bulto_id", "fecha_registro"),
+        # Historial paginado por cursor (fecha_registro, id)
+        db.Index("ix_post_registro_fecha_id", "fecha_registro", "id"),
+    )
+
     def __repr__(self):
         return f"<PostRegistro {self.id}>"
@@ -0,0 +1,13 @@
+from models import db
+from datetime import datetime
+
+
+class SchemaMigration(db.Model):
+    """Pasos de utils.migrations ya aplicados a esta base."""
+    __tablename__ = "schema_migrations"
+
+    name = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SchemaMigration {self.name}>"
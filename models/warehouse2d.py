@@ -1,9 +1,20 @@
 from datetime import datetime
+from sqlalchemy import event
 from models import db
 
+from utils.locations import default_location_coord, default_sort_key
+
 class WarehouseLocation(db.Model):
     __tablename__ = "warehouse_locations"
 
+    # Ranking de severidad (peor estado de una ubicación = mayor rank)
+    STATUS_RANK = {
+        "vacío": 0,
+        "normal": 1,
+        "bajo": 2,
+        "crítico": 3,
+    }
+
     id = db.Column(db.Integer, primary_key=True)
 
     material_code = db.Column(db.String(64), nullable=True, index=True)
@@ -16,24 +27,99 @@ class WarehouseLocation(db.Model):
     stock_seguridad = db.Column(db.Float, nullable=False, default=0.0)
     stock_maximo = db.Column(db.Float, nullable=False, default=0.0)
     ubicacion = db.Column(db.String(32), nullable=False, index=True)
+    ubicacion_sort = db.Column(
+        db.String(128), nullable=False, index=True, default=default_sort_key("ubicacion")
+    )  # Clave de orden natural (utils.locations)
+
+    # Coordenadas de la ubicación (utils.locations.location_coords)
+    zone = db.Column(db.String(16), nullable=False, default=default_location_coord("ubicacion", "zone"))
+    aisle = db.Column(db.Integer, nullable=False, default=default_location_coord("ubicacion", "aisle"))
+    rack = db.Column(db.Integer, nullable=False, default=default_location_coord("ubicacion", "rack"))
+    level = db.Column(db.Integer, nullable=False, default=default_location_coord("ubicacion", "level"))
+
     libre_utilizacion = db.Column(db.Float, nullable=False, default=0.0)
 
+    # Estado de stock persistido (se recalcula al guardar, ver _sync_status)
+    status = db.Column(db.String(16), nullable=False, index=True)
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    @property
-    def status(self) -> str:
+    __table_args__ = (
+        db.Index("ix_warehouse_locations_coords", "zone", "aisle", "rack", "level"),
+    )
+
+    @staticmethod
+    def status_for(libre, maximo, seguridad) -> str:
+        libre = libre or 0.0
+        maximo = maximo or 0.0
+        seguridad = seguridad or 0.0
 
-        if self.libre_utilizacion <= 0:
+        if libre <= 0:
             return "vacío"
-        if self.stock_maximo <= 0:
+        if maximo <= 0:
             return "normal"
 
-        ratio = self.libre_utilizacion / self.stock_maximo
+        ratio = libre / maximo
 
-        if self.libre_utilizacion < self.stock_seguridad:
+        if libre < seguridad:
             return "crítico"
         if ratio < 0.5:
             return "bajo"
         return "normal"
 
+    def refresh_status(self) -> str:
+        self.status = self.status_for(
+            self.libre_utilizacion, self.stock_maximo, self.stock_seguridad
+        )
+        return self.status
+
+
+@event.listens_for(WarehouseLocation, "before_insert")
+@event.listens_for(WarehouseLocation, "before_update")
+def _sync_status(mapper, connection, target):
+    target.refresh_status()
+
+
+
+class WarehouseLocationSummary(db.Model):
+    """Totales por ubicación para el mapa 2D (se reconstruye con cada carga)."""
+    __tablename__ = "warehouse_location_summary"
 
+    ubicacion = db.Column(db.String(32), primary_key=True)
+    ubicacion_sort = db.Column(db.String(128), nullable=False, index=True)
+
+    zone = db.Column(db.String(16), nullable=False, default="")
+    aisle = db.Column(db.Integer, nullable=False, default=0)
+    rack = db.Column(db.Integer, nullable=False, default=0)
+    level = db.Column(db.Integer, nullable=False, default=0)
+
+    total_libre = db.Column(db.Float, nullable=False, default=0.0)
+    items = db.Column(db.Integer, nullable=False, default=0)
+
+    # Peor estado entre los materiales de la ubicación
+    status = db.Column(db.String(16), nullable=False)
+    status_rank = db.Column(db.Integer, nullable=False, default=0)
+
+    # Versión del layout en la que cambió esta fila
+    version = db.Column(db.Integer, nullable=False, default=0, index=True)
+
+    __table_args__ = (
+        db.Index("ix_warehouse_location_summary_coords", "zone", "aisle", "rack", "level"),
+    )
+
+    def to_dict(self):
+        return {
+            "location": self.ubicacion,
+            "total_libre": self.total_libre,
+            "items": self.items,
+            "status": self.status,
+        }
+
+
+class WarehouseLayout(db.Model):
+    """Fila única con la versión actual del layout 2D (ETag del mapa)."""
+    __tablename__ = "warehouse_layout"
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,7 +1,11 @@
-from flask import Blueprint, render_template, request, flash
-from flask_login import login_required
+from flask import Blueprint, render_template, request, flash, redirect, url_for
+from flask_login import login_required, current_user
 import pandas as pd
-import os
+
+from models import db
+from models.job import Job
+from utils.analisis_oc import run_analisis_oc
+from utils.jobs import save_upload, submit_job, job_response
 
 analisis_oc_bp = Blueprint(
     "analisis_oc",
@@ -43,89 +47,52 @@ def upload_oc_post():
         flash("El archivo debe ser Excel (.xlsx / .xls)", "danger")
         return render_template("analisis_oc/upload_oc.html")
 
-    try:
-        # -------------------------
-        # 2. Leer Excel
-        # -------------------------
-        df = pd.read_excel(file)
-
-        # Normalizar columnas
-        df.columns = [str(col).strip().lower() for col in df.columns]
-
-        # -------------------------
-        # 3. Columnas obligatorias (según tu Excel real)
-        # -------------------------
-        columnas_necesarias = [
-            "orden de compra",
-            "proveedor",
-            "cantidad pedida",
-            "cantidad recibida",
-            "estado",
-            "fecha"
-        ]
-
-        for col in columnas_necesarias:
-            if col not in df.columns:
-                flash(f"❌ Falta la columna obligatoria: {col}", "danger")
-                return render_template("analisis_oc/upload_oc.html")
-
-        # Limpieza de NaN
-        df.fillna(0, inplace=True)
-
-        # -------------------------
-        # 4. KPIs
-        # -------------------------
-        resumen = {
-            "total_lineas": len(df),
-            "total_oc": df["orden de compra"].nunique(),
-            "total_proveedores": df["proveedor"].nunique(),
-            "total_pedido": df["cantidad pedida"].sum(),
-            "total_recibido": df["cantidad recibida"].sum(),
-        }
-
-        if resumen["total_pedido"] > 0:
-            resumen["porcentaje_atencion"] = round(
-                (resumen["total_recibido"] / resumen["total_pedido"]) * 100,
-                2
-            )
-        else:
-            resumen["porcentaje_atencion"] = 0
-
-        # -------------------------
-        # 5. Gráficos
-        # -------------------------
-
-        # Por mes
-        if "fecha" in df.columns:
-            df["mes"] = pd.to_datetime(df["fecha"], errors="coerce").dt.strftime("%Y-%m")
-            graf_por_mes = df.groupby("mes")["cantidad pedida"].sum().to_dict()
-        else:
-            graf_por_mes = {}
-
-        # Proveedores top
-        graf_por_proveedor = (
-            df.groupby("proveedor")["cantidad pedida"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(10)
-            .to_dict()
-        )
-
-        # Estados
-        graf_por_estado = df["estado"].value_counts().to_dict()
-
-        # -------------------------
-        # 6. Renderizar HTML
-        # -------------------------
-        return render_template(
-            "analisis_oc/upload_oc.html",
-            df=df,
-            resumen=resumen,
-            graf_por_mes=graf_por_mes,
-            graf_por_proveedor=graf_por_proveedor,
-            graf_por_estado=graf_por_estado
-        )
-
-    except Exception as e:
-        flash(f"Error al procesar el Excel: {str(e)}", "danger")
-        return render_template("analisis_oc/upload_oc.html")
+    # -------------------------
+    # 2. Analizar en segundo plano
+    # -------------------------
+    path = save_upload(file, "analisis_oc")
+
+    job_id = submit_job(
+        "analisis_oc",
+        run_analisis_oc,
+        path,
+        usuario=current_user.username,
+    )
+
+    return job_response(
+        job_id, next_url=url_for("analisis_oc.resultado_oc", job_id=job_id)
+    )
+
+
+# ================================
+#   RESULTADO DEL ANÁLISIS
+# ================================
+@analisis_oc_bp.route("/resultado/<job_id>")
+@login_required
+def resultado_oc(job_id):
+
+    job = db.session.get(Job, job_id)
+
+    if job is None or job.job_type != "analisis_oc":
+        flash("Análisis no encontrado.", "warning")
+        return redirect(url_for("analisis_oc.upload_oc"))
+
+    if job.status != "done":
+        for error in job.get_errors():
+            flash(f"Error al procesar el Excel: {error}", "danger")
+        return redirect(url_for("jobs.job_view", job_id=job.id,
+                                next=url_for("analisis_oc.resultado_oc", job_id=job.id)))
+
+    data = job.get_result()
+
+    # Vista rápida: sólo las filas guardadas con el resultado
+    df = pd.DataFrame(data["preview_rows"], columns=data["preview_columns"])
+
+    return render_template(
+        "analisis_oc/upload_oc.html",
+        df=df,
+        resumen=data["resumen"],
+        graf_por_mes=data["graf_por_mes"],
+        graf_por_proveedor=data["graf_por_proveedor"],
+        graf_por_estado=data["graf_por_estado"]
+    )
@@ -5,13 +5,56 @@ from flask_login import login_required, current_user
 from models.bultos import Bulto
 from models.post_registro import PostRegistro
 from models import db
-
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from utils.bultos_rollup import daily_totals, record_bultos
+from utils.dashboard_kpis import record_bulto
+from utils.normalize import normalize_name, normalize_plate, prefix_range
+from utils.time_buckets import bucket, in_range, local_days_range, local_today, parse_day, utc_now
+
+from datetime import date, datetime
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, undefer_group
 import calendar
 
 bultos_bp = Blueprint("bultos", __name__, url_prefix="/bultos")
 
+# Filas por página en la tabla de /bultos/list y en el historial
+BULTOS_PAGE_SIZE = 50
+HISTORIAL_PAGE_SIZE = 50
+
+
+# =====================================================================
+#   PAGINACIÓN POR CURSOR (fecha, id)
+# =====================================================================
+def _keyset_page(query, fecha_col, id_col, cursor, tamano):
+    """
+    Página de `tamano` filas ordenadas por (fecha, id) descendente, a partir
+    del cursor "<fecha iso>|<id>" (un cursor inválido se ignora).
+    Devuelve (filas, siguiente_cursor o None).
+    """
+    if cursor:
+        try:
+            antes_fecha, antes_id = cursor.rsplit("|", 1)
+            antes = (datetime.fromisoformat(antes_fecha), int(antes_id))
+        except ValueError:
+            antes = None
+        if antes:
+            query = query.filter(db.tuple_(fecha_col, id_col) < db.tuple_(*antes))
+
+    filas = query.order_by(fecha_col.desc(), id_col.desc()).limit(tamano + 1).all()
+
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        ultima = filas[-1]
+        siguiente = f"{getattr(ultima, fecha_col.key).isoformat()}|{getattr(ultima, id_col.key)}"
+
+    return filas, siguiente
+
+
+def _filtros_args():
+    """Filtros de la URL sin el cursor, para armar los enlaces de página."""
+    return {k: v for k, v in request.args.items() if k != "cursor" and v}
+
 
 # =====================================================================
 #   REGISTRO DE BULTOS (FORMULARIO)
@@ -27,7 +70,8 @@ def new_bulto():
         placa = request.form.get("placa", "").strip()
         observacion = request.form.get("observacion", "").strip()
 
-        fecha_hora = datetime.now(ZoneInfo("America/Lima"))
+        # Fechas en UTC (utils.time_buckets las muestra en hora de Lima)
+        fecha_hora = utc_now()
 
         nuevo_bulto = Bulto(
             cantidad=cantidad,
@@ -35,10 +79,12 @@ def new_bulto():
             placa=placa,
             fecha_hora=fecha_hora,
             observacion=observacion,
-            creado_en=datetime.now(ZoneInfo("America/Lima"))
+            creado_en=fecha_hora
         )
 
         db.session.add(nuevo_bulto)
+        record_bulto(nuevo_bulto)
+        record_bultos([nuevo_bulto])
         db.session.commit()
 
         flash("Bulto registrado correctamente.", "success")
@@ -54,69 +100,77 @@ def new_bulto():
 @login_required
 def list_bultos():
 
-    chofer = request.args.get("chofer", "").strip()
-    placa = request.args.get("placa", "").strip()
-    desde = request.args.get("desde", "").strip()
-    hasta = request.args.get("hasta", "").strip()
+    # Chofer / placa normalizados: prefijo (por defecto) o valor exacto,
+    # siempre sobre columnas indexadas
+    chofer = normalize_name(request.args.get("chofer", ""))
+    placa = normalize_plate(request.args.get("placa", ""))
+    exacto = request.args.get("exacto") == "1"
 
-    query = Bulto.query
+    # Días locales (Lima) → rango UTC semiabierto sobre la columna indexada
+    desde = parse_day(request.args.get("desde", ""))
+    hasta = parse_day(request.args.get("hasta", ""))
+
+    filtros = [in_range(Bulto.fecha_hora, *local_days_range(desde, hasta))]
 
     if chofer:
-        query = query.filter(Bulto.chofer.ilike(f"%{chofer}%"))
+        filtros.append(Bulto.chofer_norm == chofer if exacto else prefix_range(Bulto.chofer_norm, chofer))
     if placa:
-        query = query.filter(Bulto.placa.ilike(f"%{placa}%"))
-
-    if desde:
-        try:
-            query = query.filter(Bulto.fecha_hora >= datetime.strptime(desde, "%Y-%m-%d"))
-        except:
-            pass
-    if hasta:
-        try:
-            hasta_dt = datetime.strptime(hasta, "%Y-%m-%d").replace(hour=23, minute=59)
-            query = query.filter(Bulto.fecha_hora <= hasta_dt)
-        except:
-            pass
-
-    bultos = query.order_by(Bulto.fecha_hora.asc()).all()
-
-    total_bultos = sum(b.cantidad for b in bultos)
-    hoy = datetime.now(ZoneInfo("America/Lima")).date()
-    bultos_hoy = sum(b.cantidad for b in bultos if b.fecha_hora.date() == hoy)
-    total_trailers = len({b.placa for b in bultos})
+        filtros.append(Bulto.placa_norm == placa if exacto else prefix_range(Bulto.placa_norm, placa))
+
+    # Serie por día local: del rollup si no hay filtro por chofer/placa,
+    # si no GROUP BY sobre los bultos del rango (semana y mes salen de los días)
+    if chofer or placa:
+        dia = bucket(Bulto.fecha_hora, "day")
+        por_dia = [
+            (date.fromisoformat(d), cantidad)
+            for d, cantidad in db.session.query(dia, func.sum(Bulto.cantidad))
+            .filter(*filtros)
+            .group_by(dia)
+            .order_by(dia)
+        ]
+    else:
+        por_dia = [(d, cantidad) for d, _, cantidad in daily_totals(desde, hasta)]
+
+    total_bultos = sum(cantidad for _, cantidad in por_dia)
+    bultos_hoy = sum(cantidad for d, cantidad in por_dia if d == local_today())
+
+    total_trailers = (
+        db.session.query(func.count(func.distinct(Bulto.placa_norm))).filter(*filtros).scalar()
+    )
 
-    graf_dia = {}
-    for b in bultos:
-        d = b.fecha_hora.strftime("%d-%m")
-        graf_dia[d] = graf_dia.get(d, 0) + b.cantidad
+    graf_dia, graf_sem, graf_mes = {}, {}, {}
+    for d, cantidad in por_dia:
+        graf_dia[d.strftime("%d-%m")] = graf_dia.get(d.strftime("%d-%m"), 0) + cantidad
+        graf_sem[d.isocalendar().week] = graf_sem.get(d.isocalendar().week, 0) + cantidad
+        graf_mes[d.month] = graf_mes.get(d.month, 0) + cantidad
 
     dias = list(graf_dia.keys())
     bultos_dias = list(graf_dia.values())
 
-    graf_sem = {}
-    for b in bultos:
-        w = b.fecha_hora.isocalendar().week
-        graf_sem[w] = graf_sem.get(w, 0) + b.cantidad
-
     semanas = [f"Semana {w}" for w in graf_sem.keys()]
     bultos_sem = list(graf_sem.values())
 
     semanas_totales = len(semanas)
 
-    graf_mes = {}
-    for b in bultos:
-        m = b.fecha_hora.month
-        graf_mes[m] = graf_mes.get(m, 0) + b.cantidad
-
     meses = [calendar.month_name[m] for m in graf_mes.keys()]
     bultos_mes = list(graf_mes.values())
 
     inconsistencias_mes = [0] * len(meses)
     faltante_mes = [0] * len(meses)
 
+    # Tabla paginada por cursor (fecha_hora, id), de la más reciente a la más antigua
+    cursor = request.args.get("cursor", "")
+    bultos, next_cursor = _keyset_page(
+        db.session.query(Bulto).filter(*filtros),
+        Bulto.fecha_hora, Bulto.id, cursor, BULTOS_PAGE_SIZE,
+    )
+
     return render_template(
         "bultos/list.html",
         bultos=bultos,
+        next_cursor=next_cursor,
+        cursor=cursor,
+        filtros_args=_filtros_args(),
         total_bultos=total_bultos,
         bultos_hoy=bultos_hoy,
         total_trailers=total_trailers,
@@ -139,7 +193,13 @@ def list_bultos():
 @bultos_bp.route("/contar")
 @login_required
 def contar_bultos():
-    bultos = Bulto.query.order_by(Bulto.fecha_hora.desc()).all()
+    # Conteos y último conteo como subconsultas: una sola consulta en total
+    bultos = (
+        Bulto.query
+        .options(undefer_group("post_resumen"))
+        .order_by(Bulto.fecha_hora.desc())
+        .all()
+    )
     return render_template("bultos/contar_bultos.html", bultos=bultos)
 
 
@@ -164,7 +224,7 @@ def post_registro(bulto_id):
             diferencia=diferencia,
             observacion=request.form.get("observacion", ""),
             registrado_por=current_user.username,
-            fecha_registro=datetime.now(ZoneInfo("America/Lima"))
+            fecha_registro=utc_now()
         )
 
         db.session.add(nuevo)
@@ -183,9 +243,33 @@ def post_registro(bulto_id):
 @login_required
 def historial_post():
 
-    historial = PostRegistro.query.order_by(PostRegistro.fecha_registro.desc()).all()
+    chofer = normalize_name(request.args.get("chofer", ""))
+    desde = parse_day(request.args.get("desde", ""))
+    hasta = parse_day(request.args.get("hasta", ""))
 
-    return render_template("bultos/historial_post.html", historial=historial)
+    # El bulto viene en el mismo SELECT (JOIN), no una consulta por fila
+    query = (
+        PostRegistro.query
+        .options(joinedload(PostRegistro.bulto, innerjoin=True))
+        .filter(in_range(PostRegistro.fecha_registro, *local_days_range(desde, hasta)))
+    )
+
+    # Chofer por prefijo sobre la columna normalizada e indexada del bulto
+    if chofer:
+        query = query.filter(PostRegistro.bulto.has(prefix_range(Bulto.chofer_norm, chofer)))
+
+    cursor = request.args.get("cursor", "")
+    historial, next_cursor = _keyset_page(
+        query, PostRegistro.fecha_registro, PostRegistro.id, cursor, HISTORIAL_PAGE_SIZE,
+    )
+
+    return render_template(
+        "bultos/historial_post.html",
+        historial=historial,
+        next_cursor=next_cursor,
+        cursor=cursor,
+        filtros_args=_filtros_args(),
+    )
 
 
 
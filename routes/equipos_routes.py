@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required
 from models import db
 from models.equipos import Equipo
+from utils.dashboard_kpis import refresh_equipos_kpis
 
 equipos_bp = Blueprint("equipos", __name__, url_prefix="/equipos")
 
@@ -27,6 +28,8 @@ def nuevo():
 
         nuevo = Equipo(codigo=codigo, descripcion=descripcion, area=area)
         db.session.add(nuevo)
+        db.session.flush()
+        refresh_equipos_kpis()
         db.session.commit()
 
         flash("Equipo registrado correctamente.", "success")
@@ -1,3 +1,6 @@
+import csv
+import io
+import json
 import uuid
 from datetime import datetime
 import pandas as pd
@@ -11,21 +14,35 @@ from flask import (
     flash,
     send_file,
     jsonify,
+    Response,
+    stream_with_context,
 )
-from flask_login import login_required
+from flask_login import login_required, current_user
 
 # MODELOS
 from models import db
 from models.inventory import InventoryItem
-from models.inventory_history import InventoryHistory
 from models.inventory_count import InventoryCount
 
 # UTILS
 from utils.excel import (
-    load_inventory_excel,
-    sort_location_advanced,
+    XLSX_MIMETYPE,
     generate_discrepancies_excel,
+    write_xlsx_rows,
+    generate_snapshot_diff_excel,
 )
+from utils.discrepancy import (
+    EXPORT_COLUMNS,
+    add_discrepancy_columns,
+    count_by_status,
+    iter_discrepancy_rows,
+    load_discrepancies,
+)
+from utils.inventory_counts import MAX_BATCH, replace_counts, save_counts
+from utils.inventory_ingest import RELOAD_MODES, run_inventory_upload, run_history_upload
+from utils.inventory_snapshots import list_snapshots, load_snapshot, diff_snapshots
+from utils.jobs import save_upload, submit_job, job_response
+from utils.locations import location_sort_key
 
 inventory_bp = Blueprint("inventory", __name__, url_prefix="/inventory")
 
@@ -44,65 +61,217 @@ def upload_inventory():
             flash("Debes seleccionar un archivo Excel.", "warning")
             return redirect(url_for("inventory.upload_inventory"))
 
-        try:
-            df = load_inventory_excel(file)
-        except Exception as e:
-            flash(f"Error procesando archivo: {str(e)}", "danger")
+        modo = request.form.get("modo", "incremental")
+        if modo not in RELOAD_MODES:
+            mensaje = f"Modo de carga inválido: {modo}"
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify({"error": mensaje}), 400
+            flash(mensaje, "danger")
             return redirect(url_for("inventory.upload_inventory"))
 
-        # Normalizar ubicaciones
-        df["Ubicación"] = df["Ubicación"].astype(str).str.replace(" ", "").str.upper()
-
-        # Limpiar inventario anterior y conteos
-        InventoryItem.query.delete()
-        InventoryCount.query.delete()
-        db.session.commit()
-
-        # Guardar inventario nuevo
-        for _, row in df.iterrows():
-            db.session.add(
-                InventoryItem(
-                    material_code=row["Código del Material"],
-                    material_text=row["Texto breve de material"],
-                    base_unit=row["Unidad de medida base"],
-                    location=row["Ubicación"],
-                    libre_utilizacion=row["Libre utilización"],
-                )
-            )
-
-        # Guardar snapshot histórico
+        # Procesar en segundo plano: la petición responde con el id del job
+        path = save_upload(file, "inventario")
         snapshot_id = str(uuid.uuid4())
         snapshot_name = f"Inventario {datetime.now():%d/%m/%Y %H:%M}"
 
-        for _, row in df.iterrows():
-            db.session.add(
-                InventoryHistory(
-                    snapshot_id=snapshot_id,
-                    snapshot_name=snapshot_name,
-                    material_code=row["Código del Material"],
-                    material_text=row["Texto breve de material"],
-                    base_unit=row["Unidad de medida base"],
-                    location=row["Ubicación"],
-                    libre_utilizacion=row["Libre utilización"],
-                )
-            )
+        job_id = submit_job(
+            "inventario",
+            run_inventory_upload,
+            path,
+            snapshot_id,
+            snapshot_name,
+            modo=modo,
+            usuario=current_user.username,
+        )
 
-        db.session.commit()
-        flash("Inventario cargado correctamente.", "success")
-        return redirect(url_for("inventory.list_inventory"))
+        return job_response(job_id, next_url=url_for("inventory.list_inventory"))
 
     return render_template("inventory/upload.html")
 
 
+# =============================================================================
+# 1.1 SUBIR INVENTARIO ANTIGUO (SÓLO SNAPSHOT HISTÓRICO)
+# =============================================================================
+@inventory_bp.route("/upload-history", methods=["GET", "POST"])
+@login_required
+def upload_inventory_history():
+
+    if request.method == "POST":
+        file = request.files.get("file")
+
+        if not file:
+            flash("Debes seleccionar un archivo Excel.", "warning")
+            return redirect(url_for("inventory.upload_inventory_history"))
+
+        path = save_upload(file, "historico")
+        snapshot_id = str(uuid.uuid4())
+        snapshot_name = f"Histórico {file.filename}"
+
+        job_id = submit_job(
+            "historico",
+            run_history_upload,
+            path,
+            snapshot_id,
+            snapshot_name,
+            usuario=current_user.username,
+        )
+
+        return job_response(job_id, next_url=url_for("inventory.upload_inventory_history"))
+
+    return render_template("inventory/upload_history.html", snapshots=list_snapshots())
+
+
+# =============================================================================
+# 1.2 SNAPSHOTS HISTÓRICOS (LECTURA)
+# =============================================================================
+@inventory_bp.route("/history")
+@login_required
+def history_snapshots():
+    return jsonify([s.to_dict() for s in list_snapshots()])
+
+
+@inventory_bp.route("/history/diff")
+@login_required
+def history_diff():
+    desde = request.args.get("from", "").strip()
+    hasta = request.args.get("to", "").strip()
+    formato = request.args.get("format", "json").lower()
+
+    old = load_snapshot(desde) if desde else None
+    new = load_snapshot(hasta) if hasta else None
+
+    if old is None or new is None:
+        return jsonify({"error": "Debe indicar snapshots válidos en from y to"}), 404
+
+    diff, totales = diff_snapshots(old, new)
+
+    if formato == "xlsx":
+        excel = generate_snapshot_diff_excel(diff, totales)
+        return send_file(
+            excel,
+            as_attachment=True,
+            download_name=f"diferencias_snapshots_{datetime.now():%Y%m%d_%H%M}.xlsx",
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    # JSON en streaming: prefijo fijo + un json.dumps por item + sufijo fijo
+    def generar():
+        yield (
+            '{"from": ' + json.dumps(desde)
+            + ', "to": ' + json.dumps(hasta)
+            + ', "totales": ' + json.dumps(totales)
+            + ', "items": ['
+        )
+        for start in range(0, len(diff), 5000):
+            items = diff.iloc[start:start + 5000].to_dict("records")
+            yield ("," if start else "") + ",".join(
+                json.dumps(item, ensure_ascii=False) for item in items
+            )
+        yield "]}"
+
+    return Response(stream_with_context(generar()), mimetype="application/json")
+
+
+@inventory_bp.route("/history/<snapshot_id>")
+@login_required
+def history_snapshot_detail(snapshot_id):
+    frame = load_snapshot(snapshot_id)
+
+    if frame is None:
+        return jsonify({"error": "Snapshot no encontrado"}), 404
+
+    return jsonify({
+        "snapshot_id": snapshot_id,
+        "rows": len(frame),
+        "items": frame.to_dict("records"),
+    })
+
+
 # =============================================================================
 # 2. LISTA INVENTARIO
 # =============================================================================
 @inventory_bp.route("/list")
 @login_required
 def list_inventory():
-    items = InventoryItem.query.all()
-    items_sorted = sorted(items, key=lambda x: sort_location_advanced(x.location))
-    return render_template("inventory/list.html", items=items_sorted)
+    # Las filas se cargan por páginas desde /inventory/api/items
+    return render_template("inventory/list.html")
+
+
+# =============================================================================
+# 2.1 API DE ÍTEMS (PAGINACIÓN KEYSET EN ORDEN DE UBICACIÓN)
+#
+#   GET /inventory/api/items?cursor=&limit=&loc_from=&loc_to=&material=&status=
+#   El cursor es "<location_sort>|<id>" de la última fila recibida; cada
+#   página es un rango del índice ix_inventory_location_order, sin OFFSET.
+# =============================================================================
+API_PAGE_SIZE = 200
+API_MAX_PAGE_SIZE = 1000
+
+
+@inventory_bp.route("/api/items")
+@login_required
+def api_items():
+    t = InventoryItem
+
+    limit = min(request.args.get("limit", API_PAGE_SIZE, type=int), API_MAX_PAGE_SIZE)
+    limit = max(limit, 1)
+
+    # Incluye el conteo ya guardado por este usuario (autoguardado)
+    c = InventoryCount
+    stmt = db.select(
+        t.id, t.material_code, t.material_text, t.base_unit,
+        t.location, t.location_sort, t.libre_utilizacion, t.status, c.real_count,
+    ).outerjoin(c, db.and_(
+        c.material_code == t.material_code,
+        c.location == t.location,
+        c.counter == current_user.username,
+    ))
+
+    # Rango de ubicaciones (inclusive, con orden natural). "/" va justo
+    # después de "." en ASCII: loc_to="E10" incluye también "E10-1", "E10-2"...
+    loc_from = request.args.get("loc_from", "").strip()
+    loc_to = request.args.get("loc_to", "").strip()
+    if loc_from:
+        stmt = stmt.where(t.location_sort >= location_sort_key(loc_from))
+    if loc_to:
+        stmt = stmt.where(t.location_sort < location_sort_key(loc_to) + "/")
+
+    material = request.args.get("material", "").strip()
+    if material:
+        stmt = stmt.where(t.material_code.startswith(material, autoescape=True))
+
+    status = request.args.get("status", "").strip().upper()
+    if status:
+        if status not in {s for s, _ in t.STATUS_LIMITS}:
+            return jsonify({"error": f"Estado inválido: {status}"}), 400
+        stmt = stmt.where(t.status == status)
+
+    cursor = request.args.get("cursor", "")
+    if cursor:
+        try:
+            after_sort, after_id = cursor.rsplit("|", 1)
+            after_id = int(after_id)
+        except ValueError:
+            return jsonify({"error": "Cursor inválido"}), 400
+        stmt = stmt.where(db.tuple_(t.location_sort, t.id) > db.tuple_(after_sort, after_id))
+
+    # Se pide una fila extra para saber si hay más páginas
+    rows = db.session.execute(
+        stmt.order_by(t.location_sort, t.id).limit(limit + 1)
+    ).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    items = []
+    for r in rows:
+        item = r._asdict()
+        item.pop("location_sort")
+        items.append(item)
+
+    next_cursor = f"{rows[-1].location_sort}|{rows[-1].id}" if has_more else None
+
+    return jsonify({"items": items, "next_cursor": next_cursor, "has_more": has_more})
 
 
 # =============================================================================
@@ -111,9 +280,11 @@ def list_inventory():
 @inventory_bp.route("/count")
 @login_required
 def count_inventory():
-    items = InventoryItem.query.all()
-    items_sorted = sorted(items, key=lambda x: sort_location_advanced(x.location))
-    return render_template("inventory/count.html", items=items_sorted)
+    # Las filas se cargan por páginas desde /inventory/api/items; el total
+    # decide si el botón XLSX avisa antes de exportar (ver EXPORT_XLSX_MAX_ROWS)
+    total = db.session.query(db.func.count(InventoryItem.id)).scalar()
+    return render_template("inventory/count.html", total_posiciones=total,
+                           xlsx_max_rows=EXPORT_XLSX_MAX_ROWS)
 
 
 # =============================================================================
@@ -128,22 +299,9 @@ def save_count():
         if not isinstance(data, list):
             return jsonify({"success": False, "msg": "Formato inválido"}), 400
 
-        # Limpiar conteo previo
-        InventoryCount.query.delete()
-
-        # Guardar nuevo conteo
-        for c in data:
-            db.session.add(
-                InventoryCount(
-                    material_code=c["material_code"],
-                    location=c["location"].replace(" ", "").upper(),
-                    real_count=int(c["real_count"]),
-                    fecha=datetime.now(),
-                )
-            )
-
-        db.session.commit()
-        return jsonify({"success": True})
+        # Reemplaza sólo el conteo de este usuario (no el de otros contadores)
+        result = replace_counts(data, current_user.username)
+        return jsonify({"success": True, **result})
 
     except Exception as e:
         print("❌ ERROR SAVE COUNT:", e)
@@ -151,7 +309,101 @@ def save_count():
 
 
 # =============================================================================
-# 5. EXPORTAR DISCREPANCIAS (PRO, SIN ERRORES)
+# 4.1 AUTOGUARDADO DE CONTEO (LOTES PEQUEÑOS, IDEMPOTENTES)
+#
+#   POST /inventory/api/counts
+#   {"key": "<uuid del lote>", "counts": [{material_code, location, real_count}]}
+#   real_count null borra el conteo de esa posición. Reenviar el mismo "key"
+#   devuelve el resultado original sin aplicarlo otra vez.
+# =============================================================================
+@inventory_bp.route("/api/counts", methods=["POST"])
+@login_required
+def api_save_counts():
+    data = request.get_json(silent=True) or {}
+    counts = data.get("counts")
+    key = str(data.get("key") or "").strip()[:64] or None
+
+    if not isinstance(counts, list):
+        return jsonify({"success": False, "msg": "Formato inválido"}), 400
+
+    if len(counts) > MAX_BATCH:
+        return jsonify({"success": False, "msg": f"Máximo {MAX_BATCH} posiciones por lote"}), 413
+
+    try:
+        result = save_counts(counts, current_user.username, batch_key=key)
+        return jsonify({"success": True, **result})
+
+    except Exception as e:
+        print("❌ ERROR AUTOSAVE COUNT:", e)
+        return jsonify({"success": False}), 500
+
+
+# =============================================================================
+# 5. EXPORTAR DISCREPANCIAS DESDE LOS CONTEOS GUARDADOS (SQL + STREAMING)
+#
+#   GET /inventory/export-discrepancies?format=csv|xlsx&counter=
+#   La base hace el LEFT JOIN inventario ⟕ último conteo y calcula
+#   Diferencia / Estado con CASE; las filas pasan por bloques al writer.
+#   CSV es el formato por defecto: sale en streaming desde la primera fila.
+#   El XLSX se arma completo antes de enviarse (unos 16 s con 200k filas),
+#   por eso la pantalla de conteo avisa por encima de EXPORT_XLSX_MAX_ROWS.
+# =============================================================================
+EXPORT_XLSX_MAX_ROWS = 50000
+
+
+@inventory_bp.route("/export-discrepancies", methods=["GET"])
+@login_required
+def export_discrepancies():
+    formato = request.args.get("format", "csv").lower()
+    counter = request.args.get("counter", "").strip() or None
+    fname = f"discrepancias_{datetime.now():%Y%m%d_%H%M}"
+
+    if formato == "csv":
+        def generar():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+            def vaciar():
+                texto = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                return texto
+
+            # BOM para que Excel abra el CSV con tildes correctas
+            writer.writerow(EXPORT_COLUMNS)
+            yield "\ufeff" + vaciar()
+
+            for n, row in enumerate(iter_discrepancy_rows(counter), start=1):
+                writer.writerow(row)
+                if n % 2000 == 0:
+                    yield vaciar()
+
+            yield vaciar()
+
+        return Response(
+            stream_with_context(generar()),
+            mimetype="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={fname}.csv"},
+        )
+
+    try:
+        excel = write_xlsx_rows(
+            EXPORT_COLUMNS, iter_discrepancy_rows(counter), sheet_name="Discrepancias"
+        )
+        return send_file(
+            excel,
+            as_attachment=True,
+            download_name=f"{fname}.xlsx",
+            mimetype=XLSX_MIMETYPE,
+        )
+
+    except Exception as e:
+        print("❌ ERROR EXPORT-DISCREP:", e)
+        return jsonify({"success": False, "msg": "Error generando Excel"}), 500
+
+
+# =============================================================================
+# 5.1 EXPORTAR DISCREPANCIAS CON CONTEO ENVIADO POR EL NAVEGADOR (ANTERIOR)
 # =============================================================================
 @inventory_bp.route("/export-discrepancies", methods=["POST"])
 @login_required
@@ -169,54 +421,34 @@ def export_discrepancies_auto():
             InventoryItem.libre_utilizacion.label("Stock sistema"),
         )
 
-        sistema = pd.read_sql(sistema_query.statement, db.session.bind)
+        sistema = pd.read_sql(sistema_query.statement, db.engine)
 
         # Normalizar
         sistema["Código Material"] = sistema["Código Material"].astype(str).str.strip()
         sistema["Ubicación"] = sistema["Ubicación"].astype(str).str.strip()
 
         # Conteo → DataFrame
-        conteo_df = pd.DataFrame(conteo) if conteo else pd.DataFrame()
-
-        if not conteo_df.empty:
-            conteo_df = conteo_df.rename(
-                columns={
-                    "material_code": "Código Material",
-                    "location": "Ubicación",
-                    "real_count": "Stock contado",
-                }
-            )
-            conteo_df["Código Material"] = conteo_df["Código Material"].astype(str).str.strip()
-            conteo_df["Ubicación"] = conteo_df["Ubicación"].astype(str).str.strip()
+        conteo_df = pd.DataFrame(
+            conteo or [], columns=["material_code", "location", "real_count"]
+        )
+
+        conteo_df = conteo_df.rename(
+            columns={
+                "material_code": "Código Material",
+                "location": "Ubicación",
+                "real_count": "Stock contado",
+            }
+        )
+        conteo_df["Código Material"] = conteo_df["Código Material"].astype(str).str.strip()
+        conteo_df["Ubicación"] = conteo_df["Ubicación"].astype(str).str.strip()
 
         # MERGE TIPO LEFT (todos los materiales del sistema)
         merged = sistema.merge(conteo_df, on=["Código Material", "Ubicación"], how="left")
 
-        # Valores para los no contados
-        merged["Stock contado"] = merged["Stock contado"].fillna("NO CONTADO")
-
-        # Diferencia
-        def diff_calc(row):
-            if row["Stock contado"] == "NO CONTADO":
-                return 0
-            return int(row["Stock contado"]) - int(row["Stock sistema"])
-
-        merged["Diferencia"] = merged.apply(diff_calc, axis=1)
+        # Diferencia y Estado (vectorizado; no contados → Estado "NO CONTADO")
+        add_discrepancy_columns(merged)
 
-        # Estado final
-        def estado_calc(row):
-            if row["Stock contado"] == "NO CONTADO":
-                return "NO CONTADO"
-            d = row["Diferencia"]
-            if d == 0:
-                return "OK"
-            if d < 0:
-                return "CRÍTICO" if d <= -10 else "FALTA"
-            return "SOBRA"
-
-        merged["Estado"] = merged.apply(estado_calc, axis=1)
-
-        # Generar Excel válido
+        # Excel en streaming (archivo temporal, memoria constante)
         excel = generate_discrepancies_excel(merged)
         fname = f"discrepancias_{datetime.now():%Y%m%d_%H%M}.xlsx"
 
@@ -224,9 +456,47 @@ def export_discrepancies_auto():
             excel,
             as_attachment=True,
             download_name=fname,
-            mimetype="application/vnd.ms-excel",
+            mimetype=XLSX_MIMETYPE,
         )
 
     except Exception as e:
         print("❌ ERROR EXPORT-DISCREP:", e)
         return jsonify({"success": False, "msg": "Error generando Excel"}), 500
+
+
+# =============================================================================
+# 6. DASHBOARD DE INVENTARIO (discrepancias contra el último conteo guardado)
+# =============================================================================
+DASHBOARD_TOP_UBICACIONES = 15
+DASHBOARD_MAX_ITEMS = 200
+
+
+@inventory_bp.route("/dashboard")
+@login_required
+def dashboard_inventory():
+    df = load_discrepancies()
+    estados = count_by_status(df["estado"])
+
+    por_ubicacion = df["location"].value_counts().head(DASHBOARD_TOP_UBICACIONES)
+
+    # Vista rápida: posiciones contadas con diferencia, faltantes arriba
+    vista = df[df["estado"].isin(["FALTA", "CRÍTICO", "SOBRA"])]
+    vista = vista.sort_values("diferencia", kind="mergesort")
+    vista = vista.head(DASHBOARD_MAX_ITEMS)
+
+    return render_template(
+        "inventory/dashboard.html",
+        total_items=len(df),
+        ubicaciones_unicas=int(df["location"].nunique()),
+        criticos=estados["CRÍTICO"],
+        faltantes=estados["FALTA"],
+        estados={
+            "OK": estados["OK"],
+            "FALTA": estados["FALTA"],
+            "CRITICO": estados["CRÍTICO"],
+            "SOBRA": estados["SOBRA"],
+        },
+        ubicaciones_labels=json.dumps(por_ubicacion.index.tolist()),
+        ubicaciones_counts=json.dumps(por_ubicacion.tolist()),
+        items=vista.to_dict("records"),
+    )
@@ -0,0 +1,45 @@
+from flask import Blueprint, render_template, request, jsonify
+from flask_login import login_required
+
+from utils.jobs import job_status
+
+jobs_bp = Blueprint("jobs", __name__, url_prefix="/jobs")
+
+
+def _safe_next(url):
+    # Sólo rutas internas (evita redirecciones abiertas)
+    if url and url.startswith("/") and not url.startswith("//"):
+        return url
+    return None
+
+
+# =============================================================================
+# ESTADO DEL JOB (JSON PARA POLLING)
+# =============================================================================
+@jobs_bp.route("/<job_id>")
+@login_required
+def job_detail(job_id):
+    data = job_status(job_id)
+
+    if data is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+
+    return jsonify(data)
+
+
+# =============================================================================
+# PANTALLA DE PROGRESO
+# =============================================================================
+@jobs_bp.route("/<job_id>/ver")
+@login_required
+def job_view(job_id):
+    data = job_status(job_id)
+
+    if data is None:
+        return jsonify({"error": "Job no encontrado"}), 404
+
+    return render_template(
+        "jobs/progreso.html",
+        job=data,
+        next_url=_safe_next(request.args.get("next")),
+    )
@@ -4,6 +4,8 @@ from flask_login import login_required, current_user
 # ✔ IMPORTS CORREGIDOS PARA RAILWAY
 from models import db
 from models.technician_error import TechnicianError
+from utils.dashboard_kpis import record_technician_error
+from utils.time_buckets import bucket, utc_now
 
 from datetime import datetime
 from sqlalchemy import func
@@ -54,13 +56,14 @@ def new_error():
             tipo_error=tipo_error,
             gravedad=gravedad,
             observacion=observacion,
-            fecha_hora=datetime.now(),
+            fecha_hora=utc_now(),
             dinero_perdido=dinero_perdido,
             puntaje=puntaje,
-            creado_en=datetime.now()
+            creado_en=utc_now()
         )
 
         db.session.add(nuevo)
+        record_technician_error(nuevo)
         db.session.commit()
 
         flash("Error registrado exitosamente.", "success")
@@ -89,13 +92,12 @@ def list_errors():
     )
     ranking_dict = {r[0]: float(r[1]) for r in ranking}
 
+    # Pérdidas por día local (expresión de agrupación según el motor)
+    dia = bucket(TechnicianError.fecha_hora, "day")
     graf_raw = (
-        db.session.query(
-            func.date(TechnicianError.fecha_hora),
-            func.sum(TechnicianError.dinero_perdido)
-        )
-        .group_by(func.date(TechnicianError.fecha_hora))
-        .order_by(func.date(TechnicianError.fecha_hora))
+        db.session.query(dia, func.sum(TechnicianError.dinero_perdido))
+        .group_by(dia)
+        .order_by(dia)
         .all()
     )
     graf_por_dia = {str(r[0]): float(r[1]) for r in graf_raw}
@@ -1,3 +1,7 @@
+import json
+import os
+import threading
+import time
 from datetime import datetime
 import pandas as pd
 
@@ -9,25 +13,40 @@ from flask import (
     url_for,
     flash,
     jsonify,
+    Response,
+    stream_with_context,
 )
 from flask_login import login_required, current_user
 
 # ✅ IMPORTS CORREGIDOS PARA RAILWAY
 from models import db
-from models.warehouse2d import WarehouseLocation
-from models.alerts import Alert
-from utils.excel import load_warehouse2d_excel, sort_location_advanced
+from utils.warehouse2d_ingest import run_warehouse2d_upload
+from utils.jobs import save_upload, submit_job, job_response
+from utils.warehouse_layout import (
+    MAX_DETAIL_LOCATIONS,
+    layout_etag,
+    layout_version,
+    location_details,
+    location_summaries,
+    location_tiles,
+)
 
 warehouse2d_bp = Blueprint("warehouse2d", __name__, url_prefix="/warehouse2d")
 
+# Stream SSE: cada conexión dura poco y el navegador se reconecta solo
+STREAM_SECONDS = 25
+STREAM_POLL_SECONDS = 2
+STREAM_RETRY_MS = 3000
 
-# Ranking de severidad
-STATUS_RANK = {
-    "vacío": 0,
-    "normal": 1,
-    "bajo": 2,
-    "crítico": 3,
-}
+# Streams abiertos a la vez por proceso: cada uno retiene un hilo de
+# gunicorn, así que por defecto se usa la mitad de GUNICORN_THREADS y el
+# resto queda para las demás páginas (ver gunicorn.conf.py). Con el cupo
+# lleno se responde 503 y el mapa consulta /map-data cada STREAM_BUSY_RETRY_MS.
+STREAM_MAX_PER_PROCESS = int(os.environ.get(
+    "MAP_STREAMS_PER_PROCESS", max(int(os.environ.get("GUNICORN_THREADS", 8)) // 2, 1)
+))
+STREAM_BUSY_RETRY_MS = 30000
+_stream_slots = threading.BoundedSemaphore(STREAM_MAX_PER_PROCESS)
 
 
 # =====================================================================================
@@ -50,64 +69,17 @@ def upload_warehouse2d():
             flash("Debe seleccionar un archivo Excel.", "warning")
             return redirect(url_for("warehouse2d.upload_warehouse2d"))
 
-        try:
-            df = load_warehouse2d_excel(file)
-        except ValueError as e:
-            flash(str(e), "danger")
-            return redirect(url_for("warehouse2d.upload_warehouse2d"))
-        except Exception:
-            flash("Error al procesar el archivo 2D. Revise formato y columnas.", "danger")
-            return redirect(url_for("warehouse2d.upload_warehouse2d"))
+        # Procesar en segundo plano: la petición responde con el id del job
+        path = save_upload(file, "layout_2d")
 
-        # 🔥 Limpiamos la tabla antes de cargar nuevo layout
-        WarehouseLocation.query.delete()
-        db.session.commit()
-
-        # ---------------------------------------------
-        # Insertar datos del Excel
-        # ---------------------------------------------
-        for _, row in df.iterrows():
-
-            cod = str(row.get("Código del Material", "")).strip()
-            desc = str(row.get("Texto breve de material", "")).strip()
-            umb = str(row.get("Unidad de medida base", "")).strip()
-            ubi = str(row.get("Ubicación", "")).strip()
-
-            seg = float(row.get("Stock de seguridad", 0) or 0)
-            maxi = float(row.get("Stock máximo", 0) or 0)
-            libre = float(row.get("Libre utilización", 0) or 0)
-
-            item = WarehouseLocation(
-                material_code=cod,
-                material_text=desc,
-                base_unit=umb,
-                ubicacion=ubi,
-                stock_seguridad=seg,
-                stock_maximo=maxi,
-                libre_utilizacion=libre,
-            )
-
-            db.session.add(item)
-
-            # VERIFICAR ESTADO
-            estado = item.status  # Según modelo
-
-            if estado == "crítico":
-                mensaje = (
-                    f"Stock crítico en {ubi}: {cod} ({desc}) "
-                    f"Libre={libre}, Seguridad={seg}"
-                )
-                alerta = Alert(
-                    alert_type="stock_critico_2d",
-                    message=mensaje,
-                    severity="Alta",
-                )
-                db.session.add(alerta)
-
-        db.session.commit()
-
-        flash("El layout 2D fue cargado correctamente.", "success")
-        return redirect(url_for("warehouse2d.map_view"))
+        job_id = submit_job(
+            "layout_2d",
+            run_warehouse2d_upload,
+            path,
+            usuario=current_user.username,
+        )
+
+        return job_response(job_id, next_url=url_for("warehouse2d.map_view"))
 
     return render_template("warehouse2d/upload.html")
 
@@ -130,39 +102,129 @@ def map_view():
 @login_required
 def map_data():
 
-    items = WarehouseLocation.query.all()
-    por_ubicacion = {}
+    # La versión del layout es el ETag: si el cliente ya la tiene → 304
+    version = layout_version()
+    etag = layout_etag(version)
+
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(location_summaries())
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.headers["X-Layout-Version"] = str(version)
+    return response
+
+
+# =====================================================================================
+#                 TILES DEL MAPA (agregados por zona / pasillo o ubicaciones)
+#
+#   /warehouse2d/tiles?zoom=0                      → zonas
+#   /warehouse2d/tiles?zoom=2&zone=E&bbox=1,0,20,0 → pasillos 1..20 de la zona E
+#   /warehouse2d/tiles?zoom=4&zone=E&bbox=3,1,3,9  → ubicaciones del pasillo 3, racks 1..9
+# =====================================================================================
+
+@warehouse2d_bp.route("/tiles")
+@login_required
+def map_tiles():
+    zoom = request.args.get("zoom", 0, type=int)
+    zone = request.args.get("zone")
+    zone = zone.strip().upper() if zone is not None else None
+
+    bbox = None
+    if request.args.get("bbox"):
+        try:
+            bbox = [int(v) for v in request.args["bbox"].split(",")]
+        except ValueError:
+            bbox = []
+        if len(bbox) != 4:
+            return jsonify({"error": "bbox debe ser pasillo_min,rack_min,pasillo_max,rack_max"}), 400
 
-    for item in items:
-        loc = item.ubicacion or "SIN UBICACIÓN"
-        estado_item = item.status
+    version = layout_version()
+    etag = layout_etag(version)
 
-        if loc not in por_ubicacion:
-            por_ubicacion[loc] = {
-                "location": loc,
-                "total_libre": 0.0,
-                "items": 0,
-                "status": estado_item,
-                "rank": STATUS_RANK.get(estado_item, 0),
-            }
+    # Mismo ETag que map-data: los tiles sólo cambian con una nueva carga
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(dict(location_tiles(zoom, bbox=bbox, zone=zone),
+                                zoom=zoom, version=version))
 
-        por_ubicacion[loc]["total_libre"] += float(item.libre_utilizacion or 0)
-        por_ubicacion[loc]["items"] += 1
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
-        rank = STATUS_RANK.get(estado_item, 0)
-        if rank > por_ubicacion[loc]["rank"]:
-            por_ubicacion[loc]["rank"] = rank
-            por_ubicacion[loc]["status"] = estado_item
 
-    data_sorted = sorted(
-        por_ubicacion.values(),
-        key=lambda x: sort_location_advanced(x["location"])
-    )
+# =====================================================================================
+#                  CAMBIOS DEL MAPA EN VIVO (Server-Sent Events)
+#
+#   El cliente envía la versión del layout que ya tiene (?version= o el
+#   Last-Event-ID de la reconexión). Cuando la versión sube, se envían sólo
+#   las ubicaciones cuyo resumen cambió; items = 0 significa que la
+#   ubicación ya no existe. El stream se cierra a los STREAM_SECONDS.
+#   Cada stream abierto ocupa un hilo de gunicorn (worker gthread): como
+#   mucho STREAM_MAX_PER_PROCESS a la vez; el resto recibe 503 y el
+#   navegador pasa a consultar /map-data (ETag → 304 si no cambió).
+# =====================================================================================
 
-    for d in data_sorted:
-        d.pop("rank", None)
+def _sse(data, event=None, event_id=None):
+    lineas = []
+    if event_id is not None:
+        lineas.append(f"id: {event_id}")
+    if event:
+        lineas.append(f"event: {event}")
+    lineas.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lineas) + "\n\n"
 
-    return jsonify(data_sorted)
+
+@warehouse2d_bp.route("/stream")
+@login_required
+def map_stream():
+    try:
+        desde = int(request.headers.get("Last-Event-ID") or request.args.get("version", 0))
+    except ValueError:
+        desde = 0
+
+    if not _stream_slots.acquire(blocking=False):
+        ocupado = Response(f"retry: {STREAM_BUSY_RETRY_MS}\n\n", status=503,
+                           mimetype="text/event-stream")
+        ocupado.headers["Retry-After"] = str(STREAM_BUSY_RETRY_MS // 1000)
+        ocupado.headers["Cache-Control"] = "no-cache"
+        return ocupado
+
+    def eventos(desde):
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        fin = time.monotonic() + STREAM_SECONDS
+
+        while True:
+            version = layout_version()
+
+            if version < desde:
+                # La base se recreó: el cliente debe recargar el mapa completo
+                yield _sse({"version": version}, event="reload", event_id=version)
+                desde = version
+            elif version > desde:
+                cambios = location_summaries(since=desde)
+                yield _sse({"version": version, "locations": cambios},
+                           event="locations", event_id=version)
+                desde = version
+            else:
+                yield ": ping\n\n"
+
+            # No retener la conexión a la base entre consultas
+            db.session.close()
+
+            if time.monotonic() >= fin:
+                break
+            time.sleep(STREAM_POLL_SECONDS)
+
+    response = Response(stream_with_context(eventos(desde)), mimetype="text/event-stream")
+    # Se libera al cerrar la respuesta (fin del stream o cliente desconectado)
+    response.call_on_close(_stream_slots.release)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
 
 
 # =====================================================================================
@@ -173,27 +235,33 @@ def map_data():
 @login_required
 def location_detail(ubicacion):
 
-    items = (
-        WarehouseLocation.query.filter_by(ubicacion=ubicacion.strip())
-        .order_by(WarehouseLocation.material_code)
-        .all()
-    )
-
-    detalle = []
-
-    for item in items:
-        detalle.append({
-            "material_code": item.material_code,
-            "material_text": item.material_text,
-            "base_unit": item.base_unit,
-            "stock_seguridad": item.stock_seguridad,
-            "stock_maximo": item.stock_maximo,
-            "libre_utilizacion": item.libre_utilizacion,
-            "status": item.status,
-        })
+    ubicacion = ubicacion.strip()
 
     return jsonify({
         "ubicacion": ubicacion,
-        "items": detalle,
+        "items": location_details([ubicacion])[ubicacion],
+    })
+
+
+# Varias ubicaciones en una sola consulta: /warehouse2d/locations?ids=E1,E2,E3
+@warehouse2d_bp.route("/locations")
+@login_required
+def locations_detail():
+
+    ids = []
+    for valor in request.args.getlist("ids"):
+        ids.extend(u.strip() for u in valor.split(",") if u.strip())
+    ids = list(dict.fromkeys(ids))
+
+    if not ids:
+        return jsonify({"error": "Debe indicar ubicaciones en ids"}), 400
+    if len(ids) > MAX_DETAIL_LOCATIONS:
+        return jsonify({"error": f"Máximo {MAX_DETAIL_LOCATIONS} ubicaciones por petición"}), 400
+
+    version = layout_version()
+
+    return jsonify({
+        "version": version,
+        "locations": location_details(ids, version=version),
     })
 
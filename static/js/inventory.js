@@ -1,2 +1,102 @@
-// Espacio para lógica futura de inventario
-console.log("inventory.js cargado");
+/* ==================================================
+   📚 CARGA INCREMENTAL DE INVENTARIO (/inventory/api/items)
+
+   Pide páginas con cursor keyset a medida que el usuario
+   se acerca al final de la tabla, en vez de renderizar
+   todo el inventario en un solo HTML.
+   ================================================== */
+function createInventoryPager({ tbody, sentinel, status, renderRow, pageSize = 200 }) {
+
+    let filtros = {};
+    let cursor = null;
+    let hasMore = true;
+    let loading = false;
+    let generation = 0;   // descarta respuestas de filtros anteriores
+    let loaded = 0;
+
+    async function loadNext() {
+        if (loading || !hasMore) return;
+        loading = true;
+
+        const gen = generation;
+        const params = new URLSearchParams({ limit: pageSize });
+
+        Object.entries(filtros).forEach(([k, v]) => {
+            if (v) params.set(k, v);
+        });
+        if (cursor) params.set("cursor", cursor);
+
+        try {
+            const res = await fetch(`/inventory/api/items?${params}`);
+            const data = await res.json();
+
+            if (gen !== generation) return;
+
+            if (!res.ok) {
+                hasMore = false;
+                if (status) status.textContent = `❌ ${data.error || "Error cargando inventario"}`;
+                return;
+            }
+
+            const fragment = document.createDocumentFragment();
+            data.items.forEach(item => fragment.appendChild(renderRow(item)));
+            tbody.appendChild(fragment);
+
+            loaded += data.items.length;
+            cursor = data.next_cursor;
+            hasMore = data.has_more;
+
+            if (status) {
+                status.textContent = hasMore
+                    ? `${loaded} filas cargadas…`
+                    : `${loaded} filas`;
+            }
+        } catch (err) {
+            if (status) status.textContent = "❌ Error conectando con el servidor.";
+        } finally {
+            if (gen === generation) loading = false;
+        }
+
+        // Si la página no llenó la pantalla, seguir cargando
+        if (gen === generation && hasMore && isVisible(sentinel)) loadNext();
+    }
+
+    function isVisible(el) {
+        const rect = el.getBoundingClientRect();
+        return rect.top < window.innerHeight + 400;
+    }
+
+    function reset(nuevosFiltros = {}) {
+        generation++;
+        filtros = nuevosFiltros;
+        cursor = null;
+        hasMore = true;
+        loading = false;
+        loaded = 0;
+        tbody.innerHTML = "";
+        loadNext();
+    }
+
+    new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) loadNext();
+    }, { rootMargin: "400px" }).observe(sentinel);
+
+    return { reset, loadNext };
+}
+
+
+/* Lee los filtros del formulario (loc_from, loc_to, material, status) */
+function readInventoryFilters(form) {
+    return Object.fromEntries(
+        [...new FormData(form).entries()].map(([k, v]) => [k, String(v).trim()])
+    );
+}
+
+
+/* Celda de texto (evita interpretar HTML de las descripciones) */
+function inventoryCell(text, className = "") {
+    const td = document.createElement("td");
+    td.textContent = text ?? "";
+    if (className) td.className = className;
+    return td;
+}
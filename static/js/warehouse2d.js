@@ -1,40 +1,272 @@
 let MAP_DATA = [];
 let MAP_ZOOM = 1;
+let MAP_VERSION = 0;
+
+// Bloques dibujados por ubicación y filtro activo (para parchear sólo lo que cambia)
+const MAP_BLOCKS = new Map();
+let MAP_FILTER = () => true;
+
+// Layouts grandes: se navega por zonas → pasillos → ubicaciones (tiles)
+const MAP_FLAT_LIMIT = 1500;
+let MAP_TILES = null;   // Vista de tiles actual {zoom, zone, bbox}; null = mapa completo
+
+// Detalle por ubicación ya descargado (se vacía cuando cambia la versión del layout)
+const DETAIL_CACHE = new Map();
+const DETAIL_PENDING = new Set();
+let DETAIL_VERSION = 0;
+const DETAIL_NEIGHBOURS = 6;     // Vecinos a cada lado que se piden por adelantado
+const DETAIL_MAX_IDS = 200;      // Igual que MAX_DETAIL_LOCATIONS en el servidor
+
+const STATUS_CLASSES = {
+    "vacío": "block-vacio",
+    "normal": "block-normal",
+    "bajo": "block-bajo",
+    "crítico": "block-critico"
+};
 
 async function loadMap2D() {
+    const zonas = await (await fetch("/warehouse2d/tiles?zoom=0")).json();
+    const total = zonas.tiles.reduce((n, z) => n + z.locations, 0);
+
+    if (total > MAP_FLAT_LIMIT) {
+        MAP_VERSION = zonas.version;
+        await showTiles({ zoom: 0 });
+    } else {
+        await loadFlatMap();
+    }
+    subscribeMapChanges();
+}
+
+async function loadFlatMap() {
     const response = await fetch("/warehouse2d/map-data");
     MAP_DATA = await response.json();
+    MAP_VERSION = Number(response.headers.get("X-Layout-Version")) || 0;
+    MAP_TILES = null;
+
+    renderBreadcrumb();
+    applyFilter(MAP_FILTER);
+}
+
+// =============================================================
+// TILES: zonas (zoom 0) → pasillos (zoom 2) → ubicaciones (zoom 4)
+// =============================================================
+async function showTiles(view) {
+    const params = new URLSearchParams({ zoom: view.zoom });
+    if (view.zone !== undefined) params.set("zone", view.zone);
+    if (view.bbox) params.set("bbox", view.bbox.join(","));
+
+    const data = await (await fetch(`/warehouse2d/tiles?${params}`)).json();
+    MAP_TILES = view;
+    renderBreadcrumb();
+
+    if (data.level === "location") {
+        MAP_DATA = data.tiles;
+        applyFilter(MAP_FILTER);
+        return;
+    }
+
+    const container = document.getElementById("map-container");
+    container.innerHTML = "";
+    MAP_BLOCKS.clear();
+
+    const fragment = document.createDocumentFragment();
+    data.tiles.forEach(t => {
+        const div = document.createElement("div");
+        div.className = "block " + (STATUS_CLASSES[t.status] || "block-normal");
+
+        const nombre = data.level === "zone" ? `Zona ${t.zone || "–"}` : `${t.zone}${t.aisle}`;
+        div.innerHTML = `
+            <div style="font-size:16px;">${nombre}</div>
+            <small style="opacity:.8;">${t.locations} ubic. · ${t.criticos} crít.</small>
+        `;
+
+        div.onclick = () => data.level === "zone"
+            ? showTiles({ zoom: 2, zone: t.zone })
+            : showTiles({ zoom: 4, zone: t.zone, bbox: [t.aisle, 0, t.aisle, 999999] });
+        fragment.appendChild(div);
+    });
+    container.appendChild(fragment);
 
-    renderMap(MAP_DATA);
-    updateCounters(MAP_DATA);
-    updateKpis(MAP_DATA);
+    document.getElementById("kpi-panel").innerHTML = `
+        <p><strong>${data.level === "zone" ? "Zonas" : "Pasillos"}:</strong> ${data.tiles.length}</p>
+        <p><strong>Ubicaciones:</strong> ${data.tiles.reduce((n, t) => n + t.locations, 0)}</p>
+        <p><strong>Ubicaciones críticas:</strong> ${data.tiles.reduce((n, t) => n + t.criticos, 0)}</p>
+    `;
+}
+
+function renderBreadcrumb() {
+    const nav = document.getElementById("map-breadcrumb");
+    if (!MAP_TILES) {
+        nav.innerHTML = "";
+        return;
+    }
+
+    let html = `<a href="#" data-zoom="0">Zonas</a>`;
+    if (MAP_TILES.zone !== undefined) {
+        html += ` › <a href="#" data-zoom="2">Zona ${MAP_TILES.zone || "–"}</a>`;
+    }
+    if (MAP_TILES.bbox) {
+        html += ` › Pasillo ${MAP_TILES.bbox[0]}`;
+    }
+    nav.innerHTML = html;
+
+    nav.querySelectorAll("a").forEach(a => {
+        a.onclick = (e) => {
+            e.preventDefault();
+            const zoom = Number(a.dataset.zoom);
+            showTiles(zoom === 0 ? { zoom: 0 } : { zoom: 2, zone: MAP_TILES.zone });
+        };
+    });
+}
+
+function paintBlock(div, loc) {
+    const status = loc.status; // "vacío", "normal", "bajo", "crítico"
+
+    div.className = "block " + (STATUS_CLASSES[status] || "block-normal");
+    div.innerHTML = `
+        <div style="font-size:16px;">${loc.location}</div>
+        <small style="opacity:.8;">${loc.items} materiales</small>
+    `;
 }
 
 function renderMap(data) {
     const container = document.getElementById("map-container");
     container.innerHTML = "";
+    MAP_BLOCKS.clear();
+
+    const fragment = document.createDocumentFragment();
 
     data.forEach(loc => {
         const div = document.createElement("div");
-        div.classList.add("block");
+        paintBlock(div, loc);
 
-        const status = loc.status; // "vacío", "normal", "bajo", "crítico"
+        div.onclick = () => showLocationDetail(loc.location);
+        div.onmouseenter = () => prefetchNeighbours(loc.location);
+        MAP_BLOCKS.set(loc.location, div);
+        fragment.appendChild(div);
+    });
 
-        div.classList.add({
-            "vacío": "block-vacio",
-            "normal": "block-normal",
-            "bajo": "block-bajo",
-            "crítico": "block-critico"
-        }[status] || "block-normal");
+    container.appendChild(fragment);
+}
 
-        div.innerHTML = `
-            <div style="font-size:16px;">${loc.location}</div>
-            <small style="opacity:.8;">${loc.items} materiales</small>
-        `;
+function applyFilter(filter) {
+    MAP_FILTER = filter;
 
-        div.onclick = () => showLocationDetail(loc.location);
-        container.appendChild(div);
+    // Vista de zonas/pasillos: el filtro se aplica al bajar a ubicaciones
+    if (MAP_TILES && MAP_TILES.zoom < 4) return;
+
+    const filtered = MAP_DATA.filter(MAP_FILTER);
+    renderMap(filtered);
+    updateCounters(filtered);
+    updateKpis(filtered);
+}
+
+// =============================================================
+// CAMBIOS EN VIVO (SSE): sólo se repintan los bloques que cambiaron
+// =============================================================
+function subscribeMapChanges() {
+    if (!window.EventSource) return;
+
+    // El navegador se reconecta solo y envía Last-Event-ID con la última versión
+    const source = new EventSource(`/warehouse2d/stream?version=${MAP_VERSION}`);
+
+    source.addEventListener("locations", (e) => {
+        const payload = JSON.parse(e.data);
+        MAP_VERSION = payload.version;
+
+        // En la vista de tiles los agregados cambian: se vuelve a pedir la vista actual
+        if (MAP_TILES) {
+            showTiles(MAP_TILES);
+        } else {
+            patchMap(payload.locations);
+        }
+    });
+
+    source.addEventListener("reload", () => {
+        source.close();
+        loadMap2D();
     });
+
+    // 503: el servidor no tiene cupo de streams → consultar por versión
+    source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED) pollMapChanges();
+    };
+}
+
+// Sin stream: cada MAP_POLL_MS se pide /map-data (el navegador revalida con
+// ETag y recibe 304 si no cambió). Si cambió la versión se recarga el mapa,
+// que vuelve a intentar el stream.
+const MAP_POLL_MS = 30000;
+
+function pollMapChanges() {
+    setTimeout(async () => {
+        try {
+            const response = await fetch("/warehouse2d/map-data");
+            const version = Number(response.headers.get("X-Layout-Version")) || 0;
+            if (version !== MAP_VERSION) {
+                loadMap2D();
+                return;
+            }
+        } catch (e) {
+            // Red caída: se reintenta en la próxima vuelta
+        }
+        pollMapChanges();
+    }, MAP_POLL_MS);
+}
+
+function patchMap(changes) {
+    const index = new Map(MAP_DATA.map((loc, i) => [loc.location, i]));
+    let nuevas = false;
+    let eliminadas = false;
+
+    changes.forEach(loc => {
+        const i = index.get(loc.location);
+
+        if (loc.items === 0) {
+            // La ubicación ya no existe en el layout
+            if (i !== undefined) {
+                MAP_DATA[i] = null;
+                eliminadas = true;
+            }
+            const div = MAP_BLOCKS.get(loc.location);
+            if (div) {
+                div.remove();
+                MAP_BLOCKS.delete(loc.location);
+            }
+            return;
+        }
+
+        if (i === undefined) {
+            nuevas = true;
+            return;
+        }
+
+        MAP_DATA[i] = loc;
+
+        const div = MAP_BLOCKS.get(loc.location);
+        if (div && MAP_FILTER(loc)) {
+            paintBlock(div, loc);
+        } else if (div) {
+            div.remove();
+            MAP_BLOCKS.delete(loc.location);
+        } else if (MAP_FILTER(loc)) {
+            nuevas = true;  // Pasó a cumplir el filtro: hay que ubicarlo en orden
+        }
+    });
+
+    if (eliminadas) {
+        MAP_DATA = MAP_DATA.filter(loc => loc !== null);
+    }
+
+    if (nuevas) {
+        // Ubicaciones nuevas: volver a pedir el mapa (mantiene el orden natural)
+        loadFlatMap();
+        return;
+    }
+
+    const filtered = MAP_DATA.filter(MAP_FILTER);
+    updateCounters(filtered);
+    updateKpis(filtered);
 }
 
 function updateCounters(data) {
@@ -88,34 +320,81 @@ function updateKpis(data) {
 
 function filterStatus(status) {
     if (status === "todos") {
-        renderMap(MAP_DATA);
-        updateCounters(MAP_DATA);
-        updateKpis(MAP_DATA);
+        applyFilter(() => true);
         return;
     }
-    const filtered = MAP_DATA.filter(x => x.status === status);
-    renderMap(filtered);
-    updateCounters(filtered);
-    updateKpis(filtered);
+    applyFilter(x => x.status === status);
 }
 
 document.getElementById("searchBox").addEventListener("input", (e) => {
     const text = e.target.value.toLowerCase();
-    const filtered = MAP_DATA.filter(x => x.location.toLowerCase().includes(text));
-    renderMap(filtered);
-    updateCounters(filtered);
-    updateKpis(filtered);
+    applyFilter(x => x.location.toLowerCase().includes(text));
 });
 
+// =============================================================
+// DETALLE: lote de ubicaciones + prefetch de los bloques vecinos
+// =============================================================
+function neighboursOf(location) {
+    const visibles = Array.from(MAP_BLOCKS.keys());
+    const i = visibles.indexOf(location);
+    if (i < 0) return [location];
+    return visibles.slice(Math.max(0, i - DETAIL_NEIGHBOURS), i + DETAIL_NEIGHBOURS + 1);
+}
+
+async function fetchDetails(locations) {
+    if (DETAIL_VERSION !== MAP_VERSION) {
+        DETAIL_CACHE.clear();
+        DETAIL_VERSION = MAP_VERSION;
+    }
+
+    const faltan = locations.filter(l => !DETAIL_CACHE.has(l) && !DETAIL_PENDING.has(l));
+    const pedidos = [];
+
+    for (let i = 0; i < faltan.length; i += DETAIL_MAX_IDS) {
+        const lote = faltan.slice(i, i + DETAIL_MAX_IDS);
+        lote.forEach(l => DETAIL_PENDING.add(l));
+
+        const params = new URLSearchParams({ ids: lote.join(",") });
+        pedidos.push(
+            fetch(`/warehouse2d/locations?${params}`)
+                .then(r => r.json())
+                .then(data => {
+                    if (data.version === DETAIL_VERSION) {
+                        Object.entries(data.locations).forEach(([l, items]) => DETAIL_CACHE.set(l, items));
+                    }
+                })
+                .finally(() => lote.forEach(l => DETAIL_PENDING.delete(l)))
+        );
+    }
+
+    await Promise.all(pedidos);
+}
+
+function prefetchNeighbours(location) {
+    fetchDetails(neighboursOf(location)).catch(() => {});
+}
+
 async function showLocationDetail(location) {
-    const response = await fetch(`/warehouse2d/location/${location}`);
-    const data = await response.json();
+    let items = DETAIL_CACHE.get(location);
+
+    if (!items) {
+        await fetchDetails(neighboursOf(location));
+        items = DETAIL_CACHE.get(location);
+    }
+
+    if (!items) {
+        // Aún en vuelo desde un prefetch, o la versión cambió: pedirla sola
+        const response = await fetch(`/warehouse2d/location/${encodeURIComponent(location)}`);
+        items = (await response.json()).items;
+    }
+
+    prefetchNeighbours(location);
 
     document.getElementById("modal-location").innerHTML =
-        `<span class="fw-bold">Ubicación:</span> ${data.ubicacion}`;
+        `<span class="fw-bold">Ubicación:</span> ${location}`;
 
     let html = "";
-    data.items.forEach(item => {
+    items.forEach(item => {
         html += `
         <tr>
             <td>${item.material_code}</td>
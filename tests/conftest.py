@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from models import db  # noqa: E402
+
+# =============================================================================
+# APP DE PRUEBA: la app completa sobre un SQLite temporal por test
+# =============================================================================
+
+OWNER_USERNAME = "JCASTI15"
+OWNER_PASSWORD = "Admin123#"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+
+    app = create_app()
+    app.config["TESTING"] = True
+
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Cliente con sesión iniciada como el OWNER que crea create_app."""
+    client = app.test_client()
+    r = client.post("/auth/login", data={"username": OWNER_USERNAME, "password": OWNER_PASSWORD})
+    assert r.status_code in (200, 302)
+    return client
+
+
+def inventory_excel(filas):
+    """DataFrame con las columnas del Excel SAP: filas = [(material, ubicación, libre)]."""
+    return pd.DataFrame({
+        "Código del Material": [m for m, _, _ in filas],
+        "Texto breve de material": [f"TXT {m}" for m, _, _ in filas],
+        "Unidad de medida base": ["UN"] * len(filas),
+        "Ubicación": [loc for _, loc, _ in filas],
+        "Libre utilización": [float(libre) for _, _, libre in filas],
+    })
@@ -0,0 +1,91 @@
+import pandas as pd
+
+from models import db
+from models.alerts import Alert
+from utils.warehouse2d_ingest import ALERT_TYPE_CRITICO, load_warehouse2d
+
+# =============================================================================
+# ALERTAS DE STOCK CRÍTICO AL CARGAR EL LAYOUT 2D (sync_critical_alerts)
+# =============================================================================
+
+
+def _layout(filas):
+    """Bloque del Excel 2D: filas = [(material, ubicación, libre, seguridad)]."""
+    return [pd.DataFrame({
+        "Código del Material": [m for m, _, _, _ in filas],
+        "Texto breve de material": [f"TXT {m}" for m, _, _, _ in filas],
+        "Unidad de medida base": ["UN"] * len(filas),
+        "Ubicación": [loc for _, loc, _, _ in filas],
+        "Libre utilización": [float(libre) for _, _, libre, _ in filas],
+        "Stock de seguridad": [float(seg) for _, _, _, seg in filas],
+        "Stock máximo": [100.0] * len(filas),
+    })]
+
+
+def _alertas(estado=None):
+    query = Alert.query.filter(Alert.alert_type == ALERT_TYPE_CRITICO)
+    if estado:
+        query = query.filter(Alert.estado == estado)
+    return {a.fingerprint: a for a in query.order_by(Alert.id)}
+
+
+def test_first_upload_opens_one_alert_per_critical_position(app):
+    # W1 repetido en E1: una sola alerta con la libre utilización sumada
+    load_warehouse2d(_layout([
+        ("W1", "E1", 1, 5), ("W1", "E1", 2, 5), ("W2", "E2", 0.5, 5), ("W3", "E3", 80, 5),
+    ]))
+
+    activas = _alertas("activo")
+
+    assert set(activas) == {
+        Alert.make_fingerprint(ALERT_TYPE_CRITICO, "E1", "W1"),
+        Alert.make_fingerprint(ALERT_TYPE_CRITICO, "E2", "W2"),
+    }
+    assert "Libre=3" in activas[Alert.make_fingerprint(ALERT_TYPE_CRITICO, "E1", "W1")].message
+
+
+def test_second_upload_refreshes_open_alerts_and_closes_resolved_ones(app):
+    load_warehouse2d(_layout([("W1", "E1", 1, 5), ("W2", "E2", 1, 5)]))
+    antes = {f: (a.id, a.fecha, a.actualizado) for f, a in _alertas().items()}
+    db.session.expire_all()
+
+    # W1 sigue crítico con otro stock, W2 se repuso, W4 es nuevo
+    load_warehouse2d(_layout([("W1", "E1", 2, 5), ("W2", "E2", 50, 5), ("W4", "E4", 0.5, 5)]))
+    db.session.expire_all()
+
+    w1 = Alert.make_fingerprint(ALERT_TYPE_CRITICO, "E1", "W1")
+    w2 = Alert.make_fingerprint(ALERT_TYPE_CRITICO, "E2", "W2")
+    w4 = Alert.make_fingerprint(ALERT_TYPE_CRITICO, "E4", "W4")
+
+    activas = _alertas("activo")
+    assert set(activas) == {w1, w4}
+
+    # Misma fila refrescada: mismo id y fecha de apertura, mensaje nuevo
+    assert activas[w1].id == antes[w1][0]
+    assert activas[w1].fecha == antes[w1][1]
+    assert activas[w1].actualizado > antes[w1][2]
+    assert "Libre=2" in activas[w1].message
+
+    cerradas = _alertas("cerrado")
+    assert set(cerradas) == {w2}
+    assert cerradas[w2].id == antes[w2][0]
+
+
+def test_reopened_position_gets_a_new_alert(app):
+    load_warehouse2d(_layout([("W1", "E1", 1, 5)]))
+    load_warehouse2d(_layout([("W1", "E1", 50, 5)]))
+    load_warehouse2d(_layout([("W1", "E1", 1, 5)]))
+
+    todas = Alert.query.filter(Alert.alert_type == ALERT_TYPE_CRITICO).order_by(Alert.id).all()
+
+    assert [a.estado for a in todas] == ["cerrado", "activo"]
+
+
+def test_other_alert_types_are_left_alone(app):
+    db.session.add(Alert(alert_type="manual", tipo="manual", message="revisar", estado="activo"))
+    db.session.commit()
+
+    load_warehouse2d(_layout([("W1", "E1", 50, 5)]))
+
+    manual = Alert.query.filter_by(alert_type="manual").one()
+    assert manual.estado == "activo"
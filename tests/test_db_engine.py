@@ -0,0 +1,21 @@
+import pytest
+from flask import Flask
+
+from models import db
+from utils.db_engine import init_db_engine
+
+# =============================================================================
+# PERFIL DEL MOTOR: MOTORES SOPORTADOS
+# =============================================================================
+
+
+def test_unsupported_dialect_fails_at_startup():
+    # create_engine no se conecta: basta con que el driver esté instalado
+    pytest.importorskip("pymysql")
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "mysql+pymysql://u:p@localhost/mro"
+    db.init_app(app)
+
+    with pytest.raises(RuntimeError, match="no soportado: mysql"):
+        init_db_engine(app, verbose=False)
@@ -0,0 +1,75 @@
+import uuid
+
+import numpy as np
+import pytest
+from conftest import inventory_excel
+
+from utils.discrepancy import (
+    ESTADOS,
+    compute_discrepancies,
+    count_by_status,
+    iter_discrepancy_rows,
+    load_discrepancies,
+)
+from utils.inventory_counts import save_counts
+from utils.inventory_ingest import reload_inventory
+
+# =============================================================================
+# CLASIFICACIÓN DE DISCREPANCIAS (numpy y CASE de SQL con las mismas reglas)
+# =============================================================================
+
+# (sistema, contado, diferencia, estado)
+CASOS = [
+    (5, 5, 0, "OK"),
+    (5, 4, -1, "FALTA"),
+    (15, 5.5, -9.5, "FALTA"),
+    (15, 5, -10, "CRÍTICO"),
+    (20, 0, -20, "CRÍTICO"),
+    (5, 8, 3, "SOBRA"),
+    (5, np.nan, 0, "NO CONTADO"),
+    (np.nan, 2, 2, "SOBRA"),         # sin stock en sistema cuenta como 0
+]
+
+
+def test_compute_discrepancies_classifies_each_case():
+    sistema, contado, diferencia, estado = zip(*CASOS)
+
+    dif, est = compute_discrepancies(sistema, contado)
+
+    assert dif.tolist() == list(diferencia)
+    assert list(est) == list(estado)
+    assert list(est.categories) == ESTADOS
+
+
+def test_count_by_status_includes_empty_states():
+    _, estado = compute_discrepancies([5, 5], [5, np.nan])
+
+    assert count_by_status(estado) == {"OK": 1, "FALTA": 0, "CRÍTICO": 0, "SOBRA": 0, "NO CONTADO": 1}
+
+
+@pytest.fixture
+def contado(app):
+    """Inventario + un conteo por caso con stock y conteo enteros (real_count es entero)."""
+    casos = [
+        (f"M{i}", f"A{i}", s, c) for i, (s, c, _, _) in enumerate(CASOS)
+        if not np.isnan(s) and (np.isnan(c) or c == int(c))
+    ]
+    snapshot_id = str(uuid.uuid4())
+    reload_inventory(inventory_excel([(m, loc, s) for m, loc, s, _ in casos]), snapshot_id, snapshot_id)
+
+    save_counts([
+        {"material_code": m, "location": loc, "real_count": int(c)}
+        for m, loc, _, c in casos if not np.isnan(c)
+    ], "ANA")
+
+
+def test_sql_export_matches_numpy_classification(contado):
+    df = load_discrepancies()
+    exportadas = {r[3]: (r[6], r[7]) for r in iter_discrepancy_rows()}
+
+    esperado = {
+        loc: (float(dif), str(est))
+        for loc, dif, est in zip(df["location"], df["diferencia"], df["estado"])
+    }
+    assert exportadas == esperado
+    assert set(df["estado"]) == {"OK", "FALTA", "CRÍTICO", "SOBRA", "NO CONTADO"}
@@ -0,0 +1,40 @@
+import uuid
+
+from conftest import inventory_excel
+
+import routes.inventory_routes as inventory_routes
+from utils.discrepancy import EXPORT_COLUMNS
+from utils.inventory_ingest import reload_inventory
+
+# =============================================================================
+# EXPORTAR DISCREPANCIAS: CSV POR DEFECTO Y AVISO DEL XLSX GRANDE
+# =============================================================================
+
+
+def _cargar(n):
+    snapshot_id = str(uuid.uuid4())
+    filas = [(f"M{i}", f"A{i}", i) for i in range(n)]
+    reload_inventory(inventory_excel(filas), snapshot_id, snapshot_id)
+
+
+def test_export_defaults_to_streamed_csv(client):
+    _cargar(3)
+
+    r = client.get("/inventory/export-discrepancies")
+
+    assert r.mimetype == "text/csv"
+    lineas = r.get_data(as_text=True).lstrip("﻿").splitlines()
+    assert lineas[0].split(",") == EXPORT_COLUMNS
+    assert len(lineas) == 4
+
+
+def test_count_screen_warns_before_large_xlsx(client, monkeypatch):
+    _cargar(3)
+    monkeypatch.setattr(inventory_routes, "EXPORT_XLSX_MAX_ROWS", 2)
+
+    html = client.get("/inventory/count").get_data(as_text=True)
+
+    assert "const TOTAL_POSICIONES = 3;" in html
+    assert "const XLSX_MAX_ROWS = 2;" in html
+    # El botón principal exporta CSV
+    assert html.index('data-format="csv"') < html.index('data-format="xlsx"')
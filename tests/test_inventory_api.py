@@ -0,0 +1,72 @@
+import pytest
+from conftest import inventory_excel
+
+from utils.inventory_ingest import reload_inventory
+
+# =============================================================================
+# /inventory/api/items: PAGINACIÓN KEYSET POR (location_sort, id)
+# =============================================================================
+
+# Orden natural esperado: E1, E2, E2-1, E10, E10-2
+FILAS = [("M5", "E10-2", 1), ("M1", "E1", 1), ("M4", "E10", 1), ("M2", "E2", 1), ("M3", "E2-1", 1)]
+ORDEN = ["E1", "E2", "E2-1", "E10", "E10-2"]
+
+
+@pytest.fixture
+def cargado(app):
+    reload_inventory(inventory_excel(FILAS), "s1", "s1")
+
+
+def _page(client, **params):
+    r = client.get("/inventory/api/items", query_string=params)
+    return r.status_code, r.get_json()
+
+
+def _walk(client, limit, **params):
+    """Todas las páginas siguiendo next_cursor; devuelve (ubicaciones, páginas)."""
+    ubicaciones, paginas, cursor = [], 0, ""
+    while True:
+        status, data = _page(client, limit=limit, cursor=cursor, **params)
+        assert status == 200
+        ubicaciones += [i["location"] for i in data["items"]]
+        paginas += 1
+        if not data["has_more"]:
+            assert data["next_cursor"] is None
+            return ubicaciones, paginas
+        cursor = data["next_cursor"]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4, 5, 6])
+def test_pages_cover_every_row_once_in_location_order(client, cargado, limit):
+    ubicaciones, paginas = _walk(client, limit)
+
+    assert ubicaciones == ORDEN
+    # La fila extra evita una última página vacía cuando el total es múltiplo
+    assert paginas == -(-len(ORDEN) // limit)
+
+
+def test_cursor_after_last_row_returns_empty_page(client, cargado):
+    _, data = _page(client, limit=len(ORDEN) - 1)
+    _, data = _page(client, limit=10, cursor=data["next_cursor"])
+    assert [i["location"] for i in data["items"]] == ORDEN[-1:]
+
+    status, data = _page(client, cursor="ZZZ|999999")
+    assert status == 200
+    assert data == {"items": [], "next_cursor": None, "has_more": False}
+
+
+def test_location_range_is_inclusive_and_includes_sublocations(client, cargado):
+    ubicaciones, _ = _walk(client, 2, loc_from="E2", loc_to="E10")
+    assert ubicaciones == ["E2", "E2-1", "E10", "E10-2"]
+
+
+@pytest.mark.parametrize("cursor", ["abc", "E1|x", "|", "E1|1.5"])
+def test_invalid_cursor_is_rejected(client, cargado, cursor):
+    status, data = _page(client, cursor=cursor)
+    assert status == 400
+    assert data["error"] == "Cursor inválido"
+
+
+def test_invalid_status_is_rejected(client, cargado):
+    status, _ = _page(client, status="NOPE")
+    assert status == 400
@@ -0,0 +1,86 @@
+import uuid
+
+import pytest
+from conftest import OWNER_USERNAME, inventory_excel
+
+from models.inventory_count import InventoryCount
+from utils.inventory_counts import save_counts
+from utils.inventory_ingest import reload_inventory
+
+# =============================================================================
+# AUTOGUARDADO DE CONTEOS (utils.inventory_counts.save_counts, /api/counts)
+# =============================================================================
+
+
+@pytest.fixture
+def cargado(app):
+    # Id único: el set de posiciones se cachea por id del último snapshot
+    snapshot_id = str(uuid.uuid4())
+    reload_inventory(inventory_excel([("M1", "A1", 5), ("M2", "B1", 3)]), snapshot_id, snapshot_id)
+
+
+def _conteos(counter="ANA"):
+    return {
+        (c.material_code, c.location): c.real_count
+        for c in InventoryCount.query.filter_by(counter=counter)
+    }
+
+
+def test_repeated_batch_key_returns_original_result_without_reapplying(cargado):
+    primero = save_counts([{"material_code": "M1", "location": "A1", "real_count": 4}],
+                          "ANA", batch_key="lote-1")
+    assert primero["saved"] == 1
+    assert primero["duplicate"] is False
+
+    # Reintento con la misma clave (aunque el contenido haya cambiado)
+    repetido = save_counts([{"material_code": "M1", "location": "A1", "real_count": 9}],
+                           "ANA", batch_key="lote-1")
+
+    assert repetido == dict(primero, duplicate=True)
+    assert _conteos() == {("M1", "A1"): 4}
+
+
+def test_new_batch_key_upserts_the_same_position(cargado):
+    save_counts([{"material_code": "M1", "location": "A1", "real_count": 4}], "ANA", batch_key="k1")
+    save_counts([{"material_code": "M1", "location": "A1", "real_count": 6}], "ANA", batch_key="k2")
+
+    assert _conteos() == {("M1", "A1"): 6}
+    assert InventoryCount.query.count() == 1
+
+
+def test_counters_keep_separate_counts_for_a_position(cargado):
+    save_counts([{"material_code": "M1", "location": "A1", "real_count": 4}], "ANA", batch_key="k1")
+    save_counts([{"material_code": "M1", "location": "A1", "real_count": 5}], "LUIS", batch_key="k2")
+
+    assert _conteos("ANA") == {("M1", "A1"): 4}
+    assert _conteos("LUIS") == {("M1", "A1"): 5}
+
+
+def test_blank_count_deletes_and_unknown_positions_are_rejected(cargado):
+    save_counts([{"material_code": "M1", "location": "A1", "real_count": 4},
+                 {"material_code": "M2", "location": "B1", "real_count": 2}], "ANA")
+
+    result = save_counts([
+        {"material_code": "M1", "location": "a 1", "real_count": ""},
+        {"material_code": "M9", "location": "Z9", "real_count": 1},
+        {"material_code": "M2", "location": "B1", "real_count": -1},
+    ], "ANA", batch_key="k3")
+
+    assert result["saved"] == 0
+    assert result["deleted"] == 1
+    assert [r["error"] for r in result["rejected"]] == [
+        "Posición no existe en el inventario", "Cantidad inválida",
+    ]
+    assert _conteos() == {("M2", "B1"): 2}
+
+
+def test_api_replays_duplicate_batch(client, cargado):
+    body = {"key": "lote-api", "counts": [{"material_code": "M2", "location": "B1", "real_count": 1}]}
+
+    primero = client.post("/inventory/api/counts", json=body).get_json()
+    repetido = client.post("/inventory/api/counts", json=body).get_json()
+
+    assert primero["success"] and primero["duplicate"] is False
+    assert repetido["success"] and repetido["duplicate"] is True
+    assert repetido["saved"] == primero["saved"] == 1
+    assert _conteos(OWNER_USERNAME) == {("M2", "B1"): 1}
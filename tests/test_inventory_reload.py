@@ -0,0 +1,117 @@
+import io
+
+import pytest
+from conftest import inventory_excel
+
+from models import db
+from models.inventory import InventoryItem
+from models.inventory_count import InventoryCount
+from models.job import Job
+from utils.inventory_ingest import reload_inventory
+
+# =============================================================================
+# RECARGA INCREMENTAL DEL INVENTARIO (utils.inventory_ingest.reload_inventory)
+# =============================================================================
+
+INICIAL = [("M1", "A1", 5), ("M2", "B1", 3), ("M3", "C1", 1)]
+
+
+def _reload(filas, snapshot_id, **kwargs):
+    return reload_inventory(inventory_excel(filas), snapshot_id, snapshot_id, **kwargs)
+
+
+def _stock():
+    return {
+        (i.material_code, i.location): i.libre_utilizacion
+        for i in InventoryItem.query.all()
+    }
+
+
+def _contar(material, location, cantidad, counter="ANA"):
+    db.session.add(InventoryCount(material_code=material, location=location,
+                                  counter=counter, real_count=cantidad))
+    db.session.commit()
+
+
+def test_first_load_inserts_every_position(app):
+    stats = _reload(INICIAL, "s1")
+
+    assert stats["insertados"] == 3
+    assert stats["actualizados"] == stats["eliminados"] == stats["sin_cambios"] == 0
+    assert _stock() == {("M1", "A1"): 5.0, ("M2", "B1"): 3.0, ("M3", "C1"): 1.0}
+
+
+def test_reload_classifies_insert_update_delete_and_unchanged(app):
+    _reload(INICIAL, "s1")
+
+    stats = _reload([("M1", "A1", 5), ("M2", "B1", 7), ("M4", "D1", 2)], "s2")
+
+    assert stats["insertados"] == 1       # M4
+    assert stats["actualizados"] == 1     # M2
+    assert stats["eliminados"] == 1       # M3
+    assert stats["sin_cambios"] == 1      # M1
+    assert _stock() == {("M1", "A1"): 5.0, ("M2", "B1"): 7.0, ("M4", "D1"): 2.0}
+
+
+def test_reload_keeps_ids_of_existing_positions(app):
+    _reload(INICIAL, "s1")
+    antes = {(i.material_code, i.location): i.id for i in InventoryItem.query.all()}
+
+    _reload([("M1", "A1", 5), ("M2", "B1", 9)], "s2")
+    despues = {(i.material_code, i.location): i.id for i in InventoryItem.query.all()}
+
+    assert despues == {k: antes[k] for k in despues}
+
+
+def test_same_content_reports_no_changes(app):
+    filas = INICIAL + [("M1", "A1", 2)]    # posición repetida: se suma
+    _reload(filas, "s1")
+
+    # Bloques de una fila: la repetición cae en bloques distintos
+    stats = _reload(filas, "s2", chunk_size=1)
+
+    assert stats["actualizados"] == stats["insertados"] == stats["eliminados"] == 0
+    assert stats["sin_cambios"] == 3
+    assert stats["duplicados_fusionados"] == 1
+    assert _stock()[("M1", "A1")] == 7.0
+
+
+def test_changed_and_deleted_positions_invalidate_counts(app):
+    _reload(INICIAL, "s1")
+    _contar("M1", "A1", 5)
+    _contar("M2", "B1", 3)
+    _contar("M3", "C1", 1)
+
+    _reload([("M1", "A1", 5), ("M2", "B1", 7)], "s2")
+
+    contadas = {(c.material_code, c.location) for c in InventoryCount.query.all()}
+    assert contadas == {("M1", "A1")}
+
+
+def test_full_mode_replaces_table_and_counts(app):
+    _reload(INICIAL, "s1")
+    _contar("M1", "A1", 5)
+
+    stats = _reload([("M1", "A1", 5)], "s2", modo="completo")
+
+    assert stats["insertados"] == 1
+    assert _stock() == {("M1", "A1"): 5.0}
+    assert InventoryCount.query.count() == 0
+
+
+def test_unknown_mode_is_rejected(app):
+    with pytest.raises(ValueError):
+        _reload(INICIAL, "s1", modo="total")
+
+    assert InventoryItem.query.count() == 0
+
+
+def test_upload_rejects_unknown_mode_before_starting_a_job(client):
+    data = {"file": (io.BytesIO(b"x"), "inv.xlsx"), "modo": "total"}
+
+    r = client.post("/inventory/upload", data=data, content_type="multipart/form-data",
+                    headers={"Accept": "application/json"})
+
+    assert r.status_code == 400
+    assert "total" in r.get_json()["error"]
+    assert Job.query.count() == 0
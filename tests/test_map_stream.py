@@ -0,0 +1,34 @@
+import threading
+
+import routes.warehouse2d_routes as w2d
+
+# =============================================================================
+# /warehouse2d/stream: CUPO DE STREAMS POR PROCESO
+# =============================================================================
+
+
+def test_stream_releases_its_slot_when_closed(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(w2d, "_stream_slots", slots)
+    monkeypatch.setattr(w2d, "STREAM_SECONDS", 0)
+
+    r = client.get("/warehouse2d/stream")
+    assert r.status_code == 200
+    assert r.get_data(as_text=True).startswith(f"retry: {w2d.STREAM_RETRY_MS}")
+    r.close()
+
+    # El cupo volvió: se puede tomar otra vez
+    assert slots.acquire(blocking=False)
+
+
+def test_stream_returns_503_when_no_slots_are_free(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    slots.acquire()
+    monkeypatch.setattr(w2d, "_stream_slots", slots)
+
+    r = client.get("/warehouse2d/stream")
+
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == str(w2d.STREAM_BUSY_RETRY_MS // 1000)
+    # El 503 no toma cupo: liberar el que se tomó arriba no excede el límite
+    slots.release()
@@ -0,0 +1,102 @@
+import os
+
+import pandas as pd
+
+# =============================================================================
+# ANÁLISIS DE ÓRDENES DE COMPRA (EXCEL)
+# =============================================================================
+
+# Columnas obligatorias (según el Excel real)
+COLUMNAS_OC = [
+    "orden de compra",
+    "proveedor",
+    "cantidad pedida",
+    "cantidad recibida",
+    "estado",
+    "fecha",
+]
+
+PREVIEW_ROWS = 50
+
+
+def _nativo(valor):
+    """numpy → tipos de Python para poder serializar en JSON."""
+    return valor.item() if hasattr(valor, "item") else valor
+
+
+def analizar_oc(df):
+    """
+    Calcula KPIs y series de gráficos de un DataFrame de OC.
+    Devuelve un dict serializable (se guarda como resultado del job).
+    """
+    # Normalizar columnas
+    df.columns = [str(col).strip().lower() for col in df.columns]
+
+    for col in COLUMNAS_OC:
+        if col not in df.columns:
+            raise ValueError(f"❌ Falta la columna obligatoria: {col}")
+
+    # Limpieza de NaN
+    df.fillna(0, inplace=True)
+
+    # -------------------------
+    # KPIs
+    # -------------------------
+    resumen = {
+        "total_lineas": len(df),
+        "total_oc": df["orden de compra"].nunique(),
+        "total_proveedores": df["proveedor"].nunique(),
+        "total_pedido": df["cantidad pedida"].sum(),
+        "total_recibido": df["cantidad recibida"].sum(),
+    }
+
+    if resumen["total_pedido"] > 0:
+        resumen["porcentaje_atencion"] = round(
+            (resumen["total_recibido"] / resumen["total_pedido"]) * 100,
+            2
+        )
+    else:
+        resumen["porcentaje_atencion"] = 0
+
+    # -------------------------
+    # Gráficos
+    # -------------------------
+    df["mes"] = pd.to_datetime(df["fecha"], errors="coerce").dt.strftime("%Y-%m")
+    graf_por_mes = df.groupby("mes")["cantidad pedida"].sum().to_dict()
+
+    graf_por_proveedor = (
+        df.groupby("proveedor")["cantidad pedida"]
+        .sum()
+        .sort_values(ascending=False)
+        .head(10)
+        .to_dict()
+    )
+
+    graf_por_estado = df["estado"].value_counts().to_dict()
+
+    preview = df.head(PREVIEW_ROWS)
+
+    return {
+        "resumen": {k: _nativo(v) for k, v in resumen.items()},
+        "graf_por_mes": {str(k): _nativo(v) for k, v in graf_por_mes.items()},
+        "graf_por_proveedor": {str(k): _nativo(v) for k, v in graf_por_proveedor.items()},
+        "graf_por_estado": {str(k): _nativo(v) for k, v in graf_por_estado.items()},
+        "preview_columns": list(preview.columns),
+        "preview_rows": preview.astype(str).values.tolist(),
+    }
+
+
+# =============================================================================
+# TRABAJO EN SEGUNDO PLANO (utils.jobs)
+# =============================================================================
+def run_analisis_oc(job, path):
+    try:
+        job.stage("Leyendo Excel")
+        df = pd.read_excel(path)
+        job.stage("Calculando KPIs")
+        resultado = analizar_oc(df)
+        job.progress(len(df))
+    finally:
+        os.remove(path)
+
+    return resultado
@@ -0,0 +1,124 @@
+from datetime import datetime, time
+
+from sqlalchemy import func
+
+from models import db
+from models.bultos import Bulto
+from models.bultos_rollup import BultosRollup
+from utils.time_buckets import LOCAL_TZ, bucket, local_day_start, to_local, to_utc, utc_now
+from utils.upsert import upsert
+
+# =============================================================================
+# ROLLUP DE BULTOS POR HORA Y POR DÍA (hora local de Lima)
+#
+#   Cada bulto suma 1 registro y su cantidad a dos filas: la de su hora y la
+#   de su día. El upsert incrementa la fila existente en la misma
+#   transacción que inserta el bulto, así los gráficos leen unos cientos de
+#   filas ya sumadas en vez de todo el historial. rebuild_bultos_rollup()
+#   recalcula la tabla desde bultos; al arrancar, ensure_bultos_rollup() la
+#   arma si está vacía y ya hay bultos (primer despliegue con el rollup).
+# =============================================================================
+
+
+def _hour_start(dia, hora):
+    """Inicio en UTC de la hora local `hora` del día local `dia`."""
+    return to_utc(datetime.combine(dia, time(hora), tzinfo=LOCAL_TZ))
+
+
+def _fila(periodo, dia, hora, bultos, cantidad):
+    inicio = local_day_start(dia) if periodo == "day" else _hour_start(dia, hora)
+    return {"periodo": periodo, "inicio": inicio, "dia": dia, "hora": hora,
+            "bultos": bultos, "cantidad": cantidad}
+
+
+def record_bultos(bultos):
+    """Suma los bultos a sus buckets de hora y día (sin commit)."""
+    filas = {}
+
+    for b in bultos:
+        local = to_local(b.fecha_hora or utc_now())
+        dia = local.date()
+
+        for periodo, hora in (("hour", local.hour), ("day", None)):
+            fila = filas.get((periodo, dia, hora))
+            if fila is None:
+                fila = filas[(periodo, dia, hora)] = _fila(periodo, dia, hora, 0, 0)
+            fila["bultos"] += 1
+            fila["cantidad"] += b.cantidad or 0
+
+    if not filas:
+        return
+
+    t = BultosRollup.__table__
+    db.session.execute(
+        upsert(t, ["periodo", "inicio"], lambda excluded: {
+            "bultos": t.c.bultos + excluded.bultos,
+            "cantidad": t.c.cantidad + excluded.cantidad,
+        }),
+        list(filas.values()),
+    )
+
+
+def rebuild_bultos_rollup():
+    """Reemplaza el rollup con los totales calculados desde bultos (sin commit)."""
+    dia = bucket(Bulto.fecha_hora, "day")
+    hora = bucket(Bulto.fecha_hora, "hour")
+
+    por_hora = (
+        db.session.query(dia, hora, func.count(Bulto.id), func.coalesce(func.sum(Bulto.cantidad), 0))
+        .filter(Bulto.fecha_hora.isnot(None))
+        .group_by(dia, hora)
+        .all()
+    )
+
+    filas, dias = [], {}
+    for d, h, bultos, cantidad in por_hora:
+        d = datetime.strptime(d, "%Y-%m-%d").date()
+        filas.append(_fila("hour", d, h, bultos, cantidad))
+
+        total = dias.setdefault(d, [0, 0])
+        total[0] += bultos
+        total[1] += cantidad
+
+    filas.extend(_fila("day", d, None, b, c) for d, (b, c) in dias.items())
+
+    t = BultosRollup.__table__
+    db.session.execute(t.delete())
+    if filas:
+        db.session.execute(t.insert(), filas)
+
+    return len(filas)
+
+
+def ensure_bultos_rollup():
+    """Reconstruye el rollup si está vacío y hay bultos (sin commit)."""
+    if db.session.query(BultosRollup.id).first() is not None:
+        return 0
+    if db.session.query(Bulto.id).first() is None:
+        return 0
+    return rebuild_bultos_rollup()
+
+
+# =============================================================================
+# LECTURAS
+# =============================================================================
+def daily_totals(desde=None, hasta=None):
+    """[(dia, bultos, cantidad)] por día local, desde..hasta inclusive."""
+    r = BultosRollup
+    query = db.session.query(r.dia, r.bultos, r.cantidad).filter(r.periodo == "day")
+    if desde:
+        query = query.filter(r.dia >= desde)
+    if hasta:
+        query = query.filter(r.dia <= hasta)
+    return query.order_by(r.dia).all()
+
+
+def hourly_profile():
+    """{hora local: bultos} sumando todas las filas por hora."""
+    r = BultosRollup
+    return dict(
+        db.session.query(r.hora, func.sum(r.bultos))
+        .filter(r.periodo == "hour")
+        .group_by(r.hora)
+        .all()
+    )
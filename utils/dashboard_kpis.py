@@ -0,0 +1,191 @@
+import json
+from datetime import datetime
+
+from sqlalchemy import func
+
+from models import db
+from models.alerts import Alert
+from models.bultos import Bulto
+from models.dashboard_kpis import DashboardKpis
+from models.equipos import Equipo
+from models.inventory import InventoryItem
+from models.technician_error import TechnicianError
+from models.warehouse2d import WarehouseLocation
+from utils.bultos_rollup import hourly_profile
+from utils.time_buckets import bucket, local_today, on_local_day, to_local, utc_now
+
+# =============================================================================
+# KPI DEL DASHBOARD PRECALCULADOS (fila única en dashboard_kpis)
+#
+#   Las rutas que escriben actualizan sólo su parte de la fila, dentro de su
+#   propia transacción:
+#     - nuevo bulto / nuevo error → incremento atómico del contador del día
+#     - carga de inventario       → total_stock
+#     - carga del layout 2D       → estados + alertas activas / por día
+#     - nuevo equipo              → lista de equipos
+#   Los contadores son UPDATE atómicos: dos bultos a la vez no se pisan
+#   (también en SQLite, donde no hay SELECT ... FOR UPDATE). La serie por
+#   hora no se guarda aquí: se lee del rollup de bultos (utils.bultos_rollup).
+#   La fila se crea al arrancar la app (ensure_dashboard_kpis); si falta,
+#   las escrituras no hacen nada y el dashboard calcula los valores sin
+#   guardarlos. `flask rebuild-kpis` corrige cualquier desvío.
+#   "Hoy" y las horas son de Lima (utils.time_buckets); las fechas, UTC.
+# =============================================================================
+
+KPIS_ID = 1
+
+HORAS = [str(h).zfill(2) for h in range(24)]
+
+
+def _update(**valores):
+    """UPDATE de la fila de KPI (no hace nada si todavía no existe)."""
+    t = DashboardKpis.__table__
+    db.session.execute(
+        t.update().where(t.c.id == KPIS_ID).values(actualizado=datetime.utcnow(), **valores)
+    )
+
+
+def _incrementar_dia(contador, columna_dia, dia):
+    """contador + 1 si el día guardado es `dia`; si no, arranca en 1."""
+    t = DashboardKpis.__table__
+    _update(**{
+        contador: db.case((t.c[columna_dia] == dia, t.c[contador] + 1), else_=1),
+        columna_dia: dia,
+    })
+
+
+# =============================================================================
+# ESCRITURAS (sin commit: van en la transacción de la ruta)
+# =============================================================================
+def record_bulto(bulto):
+    """Suma un bulto al contador del día (la hora la suma el rollup)."""
+    fecha = to_local(bulto.fecha_hora or utc_now())
+    _incrementar_dia("bultos_hoy", "bultos_dia", fecha.date())
+
+
+def record_technician_error(error):
+    """Suma un error técnico al contador del día."""
+    fecha = to_local(error.creado_en or utc_now())
+    _incrementar_dia("errores_hoy", "errores_dia", fecha.date())
+
+
+def refresh_inventory_kpis():
+    _update(total_stock=db.session.query(func.count(InventoryItem.id)).scalar())
+
+
+def _layout_valores():
+    por_estado = dict(
+        db.session.query(WarehouseLocation.status, func.count(WarehouseLocation.id))
+        .group_by(WarehouseLocation.status)
+        .all()
+    )
+
+    # Alertas por día de la semana (0 = domingo)
+    alertas_dias = [0] * 7
+    dia = bucket(Alert.fecha, "weekday")
+    por_dia = (
+        db.session.query(dia, func.count(Alert.id))
+        .filter(Alert.fecha.isnot(None))
+        .group_by(dia)
+    )
+    for d, cant in por_dia:
+        alertas_dias[d] = cant
+
+    return {
+        "criticos": por_estado.get("crítico", 0),
+        "bajos": por_estado.get("bajo", 0),
+        "normales": por_estado.get("normal", 0),
+        "vacios": por_estado.get("vacío", 0),
+        "alertas_activas": Alert.query.filter(Alert.estado == "activo").count(),
+        "alertas_dias": json.dumps(alertas_dias),
+    }
+
+
+def refresh_layout_kpis():
+    """Estados del layout y alertas (después de cargar el Excel 2D)."""
+    _update(**_layout_valores())
+
+
+def _equipos_valores():
+    codigos = [c for (c,) in db.session.query(Equipo.codigo).order_by(Equipo.id)]
+    return {"equipos": json.dumps(codigos)}
+
+
+def refresh_equipos_kpis():
+    _update(**_equipos_valores())
+
+
+# =============================================================================
+# RECONSTRUCCIÓN COMPLETA Y LECTURA
+# =============================================================================
+def _valores_completos():
+    """Todas las columnas de la fila, calculadas desde las tablas de origen."""
+    hoy = local_today()
+
+    return dict(
+        _layout_valores(),
+        **_equipos_valores(),
+        total_stock=db.session.query(func.count(InventoryItem.id)).scalar(),
+        bultos_dia=hoy,
+        bultos_hoy=db.session.query(func.count(Bulto.id))
+        .filter(on_local_day(Bulto.fecha_hora, hoy)).scalar(),
+        errores_dia=hoy,
+        errores_hoy=db.session.query(func.count(TechnicianError.id))
+        .filter(on_local_day(TechnicianError.creado_en, hoy)).scalar(),
+        actualizado=datetime.utcnow(),
+    )
+
+
+def rebuild_dashboard_kpis():
+    """Recalcula toda la fila desde las tablas de origen (sin commit)."""
+    kpis = db.session.get(DashboardKpis, KPIS_ID, with_for_update=True)
+    if kpis is None:
+        kpis = DashboardKpis(id=KPIS_ID)
+        db.session.add(kpis)
+
+    for campo, valor in _valores_completos().items():
+        setattr(kpis, campo, valor)
+
+    db.session.flush()
+    return kpis
+
+
+def ensure_dashboard_kpis():
+    """Crea la fila si todavía no existe (arranque de la app; sin commit)."""
+    if db.session.get(DashboardKpis, KPIS_ID) is not None:
+        return False
+
+    rebuild_dashboard_kpis()
+    return True
+
+
+def dashboard_kpis():
+    """Valores para el template del dashboard, leídos de una sola fila."""
+    kpis = db.session.get(DashboardKpis, KPIS_ID)
+    if kpis is None:
+        # Sin fila (arranque pendiente): se calcula al vuelo, un GET no escribe
+        kpis = DashboardKpis(**_valores_completos())
+
+    hoy = local_today()
+    equipos = json.loads(kpis.equipos or "[]")
+
+    # Bultos por hora: del rollup (unas pocas filas por día, no todo bultos)
+    horas = {str(h).zfill(2): int(cant) for h, cant in hourly_profile().items()}
+
+    return {
+        "total_stock": kpis.total_stock,
+        "bultos_hoy": kpis.bultos_hoy if kpis.bultos_dia == hoy else 0,
+        "alertas_activas": kpis.alertas_activas,
+        "errores_hoy": kpis.errores_hoy if kpis.errores_dia == hoy else 0,
+        "criticos": kpis.criticos,
+        "bajos": kpis.bajos,
+        "normales": kpis.normales,
+        "vacios": kpis.vacios,
+        "alertas_dias": json.loads(kpis.alertas_dias or "[0, 0, 0, 0, 0, 0, 0]"),
+        "horas_bultos": {h: horas.get(h, 0) for h in HORAS[6:18]},
+        # Equipo no tiene productividad ni estado: mismos valores que antes
+        "prod_labels": equipos,
+        "prod_values": [0] * len(equipos),
+        "estado_labels": ["Sin estado"] if equipos else [],
+        "estado_values": [len(equipos)] if equipos else [],
+    }
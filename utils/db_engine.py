@@ -0,0 +1,69 @@
+from flask import has_request_context
+from sqlalchemy import event
+
+from models import db
+
+# =============================================================================
+# PERFIL DEL MOTOR: PRAGMAs DE SQLITE EN CADA CONEXIÓN
+#
+#   Las opciones del pool (Postgres) las aplica Flask-SQLAlchemy desde
+#   SQLALCHEMY_ENGINE_OPTIONS; los PRAGMAs de SQLite son por conexión, así
+#   que se ejecutan en el evento "connect" del engine (config.sqlite_pragmas).
+#
+#   El statement_timeout de Postgres no va en la conexión (la comparten las
+#   peticiones, los jobs y las migraciones del pool): cada transacción que
+#   empieza dentro de una petición web hace SET LOCAL, que vence con ella.
+#
+#   Motores soportados: SQLite y PostgreSQL (upsert ON CONFLICT, índices
+#   parciales y agrupación por hora local de utils.time_buckets). Con otro
+#   motor la app no arranca, en vez de fallar en la primera petición.
+# =============================================================================
+
+SUPPORTED_DIALECTS = ("sqlite", "postgresql")
+
+
+def install_sqlite_pragmas(engine, pragmas):
+    """Ejecuta los PRAGMAs en cada conexión nueva del engine."""
+
+    @event.listens_for(engine, "connect")
+    def _aplicar_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        for nombre, valor in pragmas.items():
+            cursor.execute(f"PRAGMA {nombre}={valor}")
+        cursor.close()
+
+
+def install_request_statement_timeout(engine, timeout_ms):
+    """SET LOCAL statement_timeout en cada transacción abierta durante una petición."""
+
+    @event.listens_for(engine, "begin")
+    def _timeout_peticion(conn):
+        if has_request_context():
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def init_db_engine(app, verbose=True):
+    """Aplica el perfil del motor al engine de la app (llamar tras db.init_app)."""
+    pragmas = app.config.get("SQLITE_PRAGMAS")
+    timeout_ms = app.config.get("REQUEST_STATEMENT_TIMEOUT_MS")
+
+    with app.app_context():
+        engine = db.engine
+
+        if engine.dialect.name not in SUPPORTED_DIALECTS:
+            raise RuntimeError(
+                f"Motor de base de datos no soportado: {engine.dialect.name}. "
+                f"DATABASE_URL debe ser {' o '.join(SUPPORTED_DIALECTS)}."
+            )
+
+        if engine.dialect.name == "sqlite" and pragmas:
+            install_sqlite_pragmas(engine, pragmas)
+            if verbose:
+                print(f"✔ SQLite: {', '.join(f'{k}={v}' for k, v in pragmas.items())}")
+        elif verbose:
+            print(f"✔ Motor {engine.dialect.name}: pool {engine.pool.status()}")
+
+        if engine.dialect.name == "postgresql" and timeout_ms:
+            install_request_statement_timeout(engine, timeout_ms)
+            if verbose:
+                print(f"✔ statement_timeout en peticiones web: {timeout_ms} ms")
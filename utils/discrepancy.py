@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+from models import db
+from models.inventory import InventoryItem
+from models.inventory_count import InventoryCount
+
+# =============================================================================
+# DISCREPANCIAS DE CONTEO (vectorizado con máscaras de numpy)
+#
+#   Diferencia = contado - sistema. Las columnas se mantienen numéricas:
+#   una posición no contada tiene Stock contado = NaN y su estado lo dice.
+#
+#   Estado:
+#     NO CONTADO  → sin conteo
+#     OK          → diferencia = 0
+#     SOBRA       → diferencia > 0
+#     FALTA       → -10 < diferencia < 0
+#     CRÍTICO     → diferencia <= -10
+# =============================================================================
+
+ESTADOS = ["OK", "FALTA", "CRÍTICO", "SOBRA", "NO CONTADO"]
+
+# Faltante a partir del cual la diferencia es crítica
+LIMITE_CRITICO = -10
+
+
+def compute_discrepancies(sistema, contado):
+    """
+    Calcula (diferencia, estado) para arrays de stock del sistema y stock
+    contado (NaN = no contado). estado es un pd.Categorical con ESTADOS.
+    """
+    sistema = np.asarray(sistema, dtype=float)
+    contado = np.asarray(contado, dtype=float)
+
+    no_contado = np.isnan(contado)
+    diferencia = np.where(no_contado, 0.0, contado - np.nan_to_num(sistema))
+
+    # Códigos en el orden de ESTADOS; se asignan de menor a mayor prioridad
+    codigos = np.zeros(len(diferencia), dtype=np.int8)              # OK
+    codigos[diferencia < 0] = 1                                      # FALTA
+    codigos[diferencia <= LIMITE_CRITICO] = 2                        # CRÍTICO
+    codigos[diferencia > 0] = 3                                      # SOBRA
+    codigos[no_contado] = 4                                          # NO CONTADO
+
+    estado = pd.Categorical.from_codes(codigos, categories=ESTADOS)
+    return diferencia, estado
+
+
+def add_discrepancy_columns(df, sistema="Stock sistema", contado="Stock contado",
+                            diferencia="Diferencia", estado="Estado"):
+    """Agrega las columnas de diferencia y estado a un DataFrame (in place)."""
+    df[contado] = pd.to_numeric(df[contado], errors="coerce")
+    df[diferencia], df[estado] = compute_discrepancies(df[sistema], df[contado])
+    return df
+
+
+def count_by_status(estado):
+    """Totales por estado: {"OK": n, "FALTA": n, ...} (incluye los que son 0)."""
+    return {e: int(n) for e, n in pd.Series(estado).value_counts(sort=False).items()}
+
+
+# =============================================================================
+# INVENTARIO + ÚLTIMO CONTEO GUARDADO DE CADA POSICIÓN
+# =============================================================================
+def latest_counts_subquery(counter=None):
+    """
+    Último conteo de cada (material_code, location), entre todos los
+    contadores o sólo los del contador indicado.
+    """
+    c = InventoryCount
+    numerado = db.select(
+        c.material_code,
+        c.location,
+        c.real_count,
+        db.func.row_number().over(
+            partition_by=(c.material_code, c.location),
+            order_by=(c.fecha.desc(), c.id.desc()),
+        ).label("n"),
+    )
+    if counter:
+        numerado = numerado.where(c.counter == counter)
+    numerado = numerado.subquery()
+
+    return (
+        db.select(numerado.c.material_code, numerado.c.location, numerado.c.real_count)
+        .where(numerado.c.n == 1)
+        .subquery("ultimo_conteo")
+    )
+
+
+def load_discrepancies():
+    """
+    DataFrame con el inventario actual, el último conteo guardado y las
+    columnas Diferencia / Estado, en orden natural de ubicación.
+    """
+    t = InventoryItem
+    ultimo = latest_counts_subquery()
+
+    stmt = (
+        db.select(
+            t.material_code, t.material_text, t.base_unit, t.location,
+            t.libre_utilizacion, ultimo.c.real_count,
+        )
+        .outerjoin(ultimo, db.and_(
+            ultimo.c.material_code == t.material_code,
+            ultimo.c.location == t.location,
+        ))
+        .order_by(t.location_sort, t.id)
+    )
+
+    df = pd.DataFrame(
+        db.session.execute(stmt).all(),
+        columns=["material_code", "material_text", "base_unit", "location",
+                 "libre_utilizacion", "real_count"],
+    )
+    df["libre_utilizacion"] = df["libre_utilizacion"].astype(float)
+
+    return add_discrepancy_columns(
+        df, sistema="libre_utilizacion", contado="real_count",
+        diferencia="diferencia", estado="estado",
+    )
+
+
+# =============================================================================
+# DISCREPANCIAS CALCULADAS EN SQL (exportación en streaming)
+#
+#   Mismas reglas que compute_discrepancies, expresadas con CASE para que
+#   la base de datos entregue las filas ya calculadas y en orden.
+# =============================================================================
+EXPORT_COLUMNS = [
+    "Código Material", "Descripción", "Unidad", "Ubicación",
+    "Stock sistema", "Stock contado", "Diferencia", "Estado",
+]
+
+
+def discrepancy_select(counter=None):
+    """SELECT inventario ⟕ último conteo con Diferencia y Estado (columnas EXPORT_COLUMNS)."""
+    t = InventoryItem
+    ultimo = latest_counts_subquery(counter)
+
+    contado = ultimo.c.real_count
+    sistema = db.func.coalesce(t.libre_utilizacion, 0.0)
+    diferencia = contado - sistema
+
+    estado = db.case(
+        (contado.is_(None), "NO CONTADO"),
+        (diferencia == 0, "OK"),
+        (diferencia <= LIMITE_CRITICO, "CRÍTICO"),
+        (diferencia < 0, "FALTA"),
+        else_="SOBRA",
+    )
+
+    return (
+        db.select(
+            t.material_code,
+            t.material_text,
+            t.base_unit,
+            t.location,
+            sistema,
+            contado,
+            db.case((contado.is_(None), 0.0), else_=diferencia),
+            estado,
+        )
+        .outerjoin(ultimo, db.and_(
+            ultimo.c.material_code == t.material_code,
+            ultimo.c.location == t.location,
+        ))
+        .order_by(t.location_sort, t.id)
+    )
+
+
+def iter_discrepancy_rows(counter=None, batch_size=2000):
+    """Filas de discrepancias leídas por bloques desde la base (no carga todo)."""
+    result = db.session.execute(
+        discrepancy_select(counter).execution_options(yield_per=batch_size)
+    )
+    for partition in result.partitions():
+        yield from partition
@@ -1,123 +1,218 @@
+import tempfile
 from io import BytesIO
+from zipfile import BadZipFile
 import pandas as pd
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+import xlsxwriter
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Filas por bloque entregado al insertador
+CHUNK_ROWS = 5000
+
+COLUMNAS_INVENTARIO = [
+    "Código del Material",
+    "Texto breve de material",
+    "Unidad de medida base",
+    "Ubicación",
+    "Libre utilización",
+]
+
+COLUMNAS_2D = [
+    "Código del Material",
+    "Texto breve de material",
+    "Unidad de medida base",
+    "Ubicación",
+    "Stock máximo",
+    "Consumo mes actual",
+    "Libre utilización",
+    "Tamaño de lote mínimo",
+]
+
+# Columnas que se conservan si vienen en el Excel 2D, aunque no son obligatorias
+COLUMNAS_2D_OPCIONALES = ["Stock de seguridad"]
+
 
 # =============================================================================
-# 1. CARGA FLEXIBLE DE INVENTARIO BASE
+# 0. LECTURA EN STREAMING (openpyxl read-only → bloques de DataFrame)
 # =============================================================================
-def load_inventory_excel(file):
-    df = pd.read_excel(file)
+def _normalizar_bloque(df):
+    df["Código del Material"] = df["Código del Material"].fillna("").astype(str).str.strip()
+    df["Ubicación"] = df["Ubicación"].fillna("").astype(str).str.strip()
+    return df
+
 
-    columnas = [
-        "Código del Material",
-        "Texto breve de material",
-        "Unidad de medida base",
-        "Ubicación",
-        "Libre utilización",
-    ]
+def _iter_excel_rows(file):
+    """
+    Devuelve (cabecera, iterador de filas). Usa openpyxl en modo read-only para
+    no cargar el libro completo; los .xls antiguos caen a pandas.
+    """
+    try:
+        wb = load_workbook(file, read_only=True, data_only=True)
+    except (InvalidFileException, BadZipFile):
+        file.seek(0)
+        df = pd.read_excel(file)
+        return [str(c) for c in df.columns], df.itertuples(index=False, name=None), None
+
+    rows = wb.active.iter_rows(values_only=True)
+    header = next(rows, None) or ()
+    header = [str(h).strip() if h is not None else "" for h in header]
+    return header, rows, wb
+
+
+def iter_excel_chunks(file, columnas, opcionales=(), chunk_size=CHUNK_ROWS, contexto=""):
+    """
+    Valida las cabeceras con la primera fila y devuelve un generador de
+    DataFrames de como máximo chunk_size filas. La validación ocurre al
+    llamar a la función, no al consumir el primer bloque.
+    """
+    header, rows, wb = _iter_excel_rows(file)
 
     for c in columnas:
-        if c not in df.columns:
-            raise Exception(f"❌ Falta columna: {c}")
+        if c not in header:
+            if wb is not None:
+                wb.close()
+            raise ValueError(f"❌ Falta columna{contexto}: {c}")
+
+    keep = [c for c in list(columnas) + list(opcionales) if c in header]
+    idx = [header.index(c) for c in keep]
+
+    def generar():
+        buffer = []
+        try:
+            for row in rows:
+                if row is None or all(v is None for v in row):
+                    continue
+                buffer.append([row[i] if i < len(row) else None for i in idx])
+                if len(buffer) >= chunk_size:
+                    yield _normalizar_bloque(pd.DataFrame(buffer, columns=keep))
+                    buffer = []
+            if buffer:
+                yield _normalizar_bloque(pd.DataFrame(buffer, columns=keep))
+        finally:
+            if wb is not None:
+                wb.close()
+
+    return generar()
 
-    df["Código del Material"] = df["Código del Material"].astype(str).str.strip()
-    df["Ubicación"] = df["Ubicación"].astype(str).str.strip()
 
-    return df
+# =============================================================================
+# 1. CARGA FLEXIBLE DE INVENTARIO BASE
+# =============================================================================
+def iter_inventory_excel(file, chunk_size=CHUNK_ROWS):
+    return iter_excel_chunks(file, COLUMNAS_INVENTARIO, chunk_size=chunk_size)
+
+
+def load_inventory_excel(file):
+    chunks = list(iter_inventory_excel(file))
+    if not chunks:
+        return pd.DataFrame(columns=COLUMNAS_INVENTARIO)
+    return pd.concat(chunks, ignore_index=True)
 
 
 # =============================================================================
 # 2. CARGA DE INVENTARIO 2D (REQUERIDO POR warehouse2d_routes)
 # =============================================================================
-def load_warehouse2d_excel(file):
-    df = pd.read_excel(file)
-
-    columnas_requeridas = [
-        "Código del Material",
-        "Texto breve de material",
-        "Unidad de medida base",
-        "Ubicación",
-        "Stock máximo",
-        "Consumo mes actual",
-        "Libre utilización",
-        "Tamaño de lote mínimo",
-    ]
-
-    for c in columnas_requeridas:
-        if c not in df.columns:
-            raise Exception(f"❌ Falta columna obligatoria en mapa 2D: {c}")
-
-    df["Código del Material"] = df["Código del Material"].astype(str).str.strip()
-    df["Ubicación"] = df["Ubicación"].astype(str).str.strip()
+def iter_warehouse2d_excel(file, chunk_size=CHUNK_ROWS):
+    return iter_excel_chunks(
+        file,
+        COLUMNAS_2D,
+        opcionales=COLUMNAS_2D_OPCIONALES,
+        chunk_size=chunk_size,
+        contexto=" obligatoria en mapa 2D",
+    )
 
-    return df
+
+def load_warehouse2d_excel(file):
+    chunks = list(iter_warehouse2d_excel(file))
+    if not chunks:
+        return pd.DataFrame(columns=COLUMNAS_2D)
+    return pd.concat(chunks, ignore_index=True)
 
 
 # =============================================================================
-# 3. ORDENAR UBICACIONES (E001, E015, E120...)
+# 3. GENERAR EXCEL DE DISCREPANCIAS (xlsxwriter constant_memory, en streaming)
+#
+#   Las filas se escriben en orden y se vuelcan a disco al avanzar, así la
+#   memoria no crece con el tamaño del reporte. Los estilos son formatos
+#   compartidos (uno para cabecera y otro para celdas) y los números se
+#   escriben como números. El resultado queda en un archivo temporal
+#   (en memoria hasta XLSX_SPOOL_BYTES) listo para send_file.
 # =============================================================================
-def sort_location_advanced(loc):
-    try:
-        if isinstance(loc, str) and loc.startswith("E"):
-            return int("".join([x for x in loc if x.isdigit()]))
-        return 999999
-    except:
-        return 999999
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+XLSX_SPOOL_BYTES = 16 * 1024 * 1024
+
+
+def write_xlsx_rows(columns, rows, sheet_name="Hoja1", widths=None):
+    """
+    Escribe un XLSX con cabecera + filas (iterable de secuencias, p. ej. un
+    cursor de la base de datos) y devuelve un SpooledTemporaryFile al inicio.
+    None / NaN se escriben como celda vacía con borde.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=XLSX_SPOOL_BYTES)
+
+    wb = xlsxwriter.Workbook(output, {"constant_memory": True})
+    ws = wb.add_worksheet(sheet_name)
+
+    header_fmt = wb.add_format({
+        "bold": True, "font_color": "#FFFFFF", "bg_color": "#1F4E78",
+        "align": "center", "border": 1,
+    })
+    cell_fmt = wb.add_format({"align": "center", "border": 1})
+
+    for col, name in enumerate(columns):
+        ancho = (widths or {}).get(name, max(12, len(str(name)) + 4))
+        ws.set_column(col, col, ancho)
+
+    ws.write_row(0, 0, list(columns), header_fmt)
+
+    write_number, write_string, write_blank = ws.write_number, ws.write_string, ws.write_blank
+
+    row_idx = 0
+    for row_idx, row in enumerate(rows, start=1):
+        for col, value in enumerate(row):
+            if value is None:
+                write_blank(row_idx, col, None, cell_fmt)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                if value != value:  # NaN
+                    write_blank(row_idx, col, None, cell_fmt)
+                else:
+                    write_number(row_idx, col, value, cell_fmt)
+            else:
+                write_string(row_idx, col, str(value), cell_fmt)
+
+    ws.autofilter(0, 0, row_idx, len(columns) - 1)
+    ws.freeze_panes(1, 0)
+
+    wb.close()
+    output.seek(0)
+    return output
+
+
+def generate_discrepancies_excel(df):
+
+    # Si viene sin datos
+    if df is None or df.empty:
+        return write_xlsx_rows(["SIN DATOS"], [], sheet_name="Discrepancias")
+
+    # Filas como listas de objetos Python (numpy → int/float/str, NaN → None)
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+    return write_xlsx_rows(list(df.columns), rows, sheet_name="Discrepancias")
 
 
 # =============================================================================
-# 4. GENERAR EXCEL DE DISCREPANCIAS (SIN CORRUPCIÓN)
+# 4. EXCEL DE DIFERENCIAS ENTRE SNAPSHOTS
 # =============================================================================
-def generate_discrepancies_excel(df):
+def generate_snapshot_diff_excel(diff, totales):
 
     output = BytesIO()
 
-    # Si viene sin datos
-    if df is None or df.empty:
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Discrepancias"
-        ws.append(["SIN DATOS"])
-        wb.save(output)
-        output.seek(0)
-        return output
-
-    # Normalizar todo a texto
-    df = df.astype(str)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Discrepancias"
-
-    # Cabeceras
-    ws.append(list(df.columns))
-
-    # Filas
-    for _, row in df.iterrows():
-        ws.append(row.tolist())
-
-    # Estilos
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill("solid", fgColor="1F4E78")
-    center = Alignment(horizontal="center")
-
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = center
-
-    # Bordes
-    thin = Side(border_style="thin", color="000000")
-    border = Border(left=thin, right=thin, top=thin, bottom=thin)
-
-    for row in ws.iter_rows(min_row=2):
-        for cell in row:
-            cell.border = border
-            cell.alignment = center
-
-    ws.auto_filter.ref = ws.dimensions
-
-    wb.save(output)
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        diff.to_excel(writer, sheet_name="Diferencias", index=False)
+        pd.DataFrame(
+            list(totales.items()), columns=["Indicador", "Valor"]
+        ).to_excel(writer, sheet_name="Totales", index=False)
+
     output.seek(0)
     return output
@@ -0,0 +1,176 @@
+import json
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.inventory import InventoryItem
+from models.inventory_count import InventoryCount, InventoryCountBatch
+from models.inventory_snapshot import InventorySnapshot
+from utils.upsert import upsert
+
+# =============================================================================
+# CONTEOS DE INVENTARIO POR CONTADOR (AUTOGUARDADO INCREMENTAL)
+#
+#   Cada contador guarda sólo las posiciones que cambió, en lotes pequeños
+#   con una clave de idempotencia: un reintento del mismo lote devuelve la
+#   respuesta original sin volver a aplicarlo. Las posiciones se validan
+#   contra un set en memoria de (material_code, location) del inventario
+#   actual, que se recarga cuando cambia el último snapshot de carga.
+# =============================================================================
+
+# Máximo de posiciones por lote de autoguardado
+MAX_BATCH = 500
+
+# Las claves de idempotencia se guardan un día
+BATCH_KEY_TTL = timedelta(days=1)
+
+_keys_cache = {"version": None, "keys": frozenset()}
+_keys_lock = threading.Lock()
+
+
+def inventory_keys():
+    """Set de (material_code, location) del inventario actual (cacheado por versión)."""
+    version = (
+        db.session.query(InventorySnapshot.id)
+        .filter(InventorySnapshot.origen == "carga")
+        .order_by(InventorySnapshot.seq.desc())
+        .limit(1)
+        .scalar()
+    )
+
+    with _keys_lock:
+        if version is not None and _keys_cache["version"] == version:
+            return _keys_cache["keys"]
+
+    t = InventoryItem.__table__.c
+    keys = frozenset(
+        db.session.execute(db.select(t.material_code, t.location)).tuples()
+    )
+
+    with _keys_lock:
+        _keys_cache["version"] = version
+        _keys_cache["keys"] = keys
+
+    return keys
+
+
+def _parse_entries(entries, keys):
+    """Separa las entradas en (a guardar, a borrar, rechazadas)."""
+    guardar, borrar, rechazadas = {}, set(), []
+
+    for e in entries:
+        if not isinstance(e, dict):
+            rechazadas.append({"entry": e, "error": "Formato inválido"})
+            continue
+
+        code = str(e.get("material_code", "")).strip()
+        loc = str(e.get("location", "")).replace(" ", "").upper()
+
+        if (code, loc) not in keys:
+            rechazadas.append({"material_code": code, "location": loc,
+                               "error": "Posición no existe en el inventario"})
+            continue
+
+        valor = e.get("real_count")
+
+        # Casilla vaciada en pantalla → se borra el conteo de esa posición
+        if valor is None or valor == "":
+            borrar.add((code, loc))
+            guardar.pop((code, loc), None)
+            continue
+
+        try:
+            valor = int(valor)
+            if valor < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            rechazadas.append({"material_code": code, "location": loc,
+                               "error": "Cantidad inválida"})
+            continue
+
+        guardar[(code, loc)] = valor
+        borrar.discard((code, loc))
+
+    return guardar, borrar, rechazadas
+
+
+def save_counts(entries, counter, batch_key=None):
+    """
+    Aplica un lote de conteos del contador indicado (upsert por posición).
+    Con batch_key, un lote repetido devuelve el resultado original con
+    duplicate=True. Devuelve {"saved", "deleted", "rejected", "duplicate"}.
+    """
+    if batch_key:
+        previo = db.session.get(InventoryCountBatch, batch_key)
+        if previo is not None:
+            return dict(json.loads(previo.result), duplicate=True)
+
+    guardar, borrar, rechazadas = _parse_entries(entries, inventory_keys())
+
+    t = InventoryCount.__table__
+    ahora = datetime.utcnow()
+
+    result = {
+        "saved": len(guardar),
+        "deleted": len(borrar),
+        "rejected": rechazadas,
+        "duplicate": False,
+    }
+
+    try:
+        if guardar:
+            db.session.execute(
+                upsert(t, ["material_code", "location", "counter"], ["real_count", "fecha"]),
+                [
+                    {"material_code": code, "location": loc, "counter": counter,
+                     "real_count": valor, "fecha": ahora}
+                    for (code, loc), valor in guardar.items()
+                ],
+            )
+
+        if borrar:
+            db.session.execute(
+                t.delete().where(
+                    t.c.material_code == bindparam("b_material_code"),
+                    t.c.location == bindparam("b_location"),
+                    t.c.counter == counter,
+                ),
+                [{"b_material_code": code, "b_location": loc} for code, loc in borrar],
+            )
+
+        if batch_key:
+            db.session.query(InventoryCountBatch).filter(
+                InventoryCountBatch.created_at < ahora - BATCH_KEY_TTL
+            ).delete(synchronize_session=False)
+
+            db.session.add(InventoryCountBatch(
+                key=batch_key, counter=counter, result=json.dumps(result), created_at=ahora
+            ))
+
+        db.session.commit()
+
+    except IntegrityError:
+        # Otro proceso aplicó el mismo lote a la vez: devolver su resultado
+        db.session.rollback()
+        previo = db.session.get(InventoryCountBatch, batch_key) if batch_key else None
+        if previo is None:
+            raise
+        return dict(json.loads(previo.result), duplicate=True)
+
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return result
+
+
+def replace_counts(entries, counter):
+    """
+    Reemplaza todo el conteo del contador (envío completo de /save-count).
+    El borrado previo se confirma o se revierte junto con el lote.
+    """
+    InventoryCount.query.filter_by(counter=counter).delete()
+    return save_counts(entries, counter)
@@ -0,0 +1,443 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam
+
+from models import db
+from models.inventory import InventoryItem
+from models.inventory_count import InventoryCount
+from utils.dashboard_kpis import refresh_inventory_kpis
+from utils.excel import iter_inventory_excel
+from utils.locations import location_sort_keys
+from utils.inventory_snapshots import (
+    COLUMNS,
+    KEY,
+    VALUE_COLS,
+    begin_snapshot,
+    copy_to_snapshot,
+    finish_snapshot,
+    match_positions,
+    merge_duplicate_rows,
+    snapshot_frame,
+    snapshot_rows_query,
+    write_snapshot_rows,
+)
+
+# =============================================================================
+# CARGA MASIVA DE INVENTARIO (Core executemany bloque a bloque)
+#
+#   Los bloques del Excel se procesan de a uno y se descartan: nunca está en
+#   memoria el archivo completo ni la tabla "inventory". Cada bloque se
+#   compara sólo contra las filas existentes de sus materiales (consultadas
+#   por lotes de LOOKUP_BATCH códigos). Al terminar se borran las posiciones
+#   que no vinieron y el snapshot se escribe con INSERT ... SELECT desde la
+#   tabla, que tras la carga es exactamente el contenido del Excel.
+# =============================================================================
+
+# Columnas del Excel SAP → columnas de la tabla "inventory"
+COLUMNAS_INVENTARIO = {
+    "Código del Material": "material_code",
+    "Texto breve de material": "material_text",
+    "Unidad de medida base": "base_unit",
+    "Ubicación": "location",
+    "Libre utilización": "libre_utilizacion",
+}
+
+# Filas por cada executemany
+CHUNK_SIZE = 5000
+
+# Códigos de material por consulta IN (...) al buscar filas existentes
+LOOKUP_BATCH = 1000
+
+# Modos de reload_inventory: diferencias contra la tabla o reemplazo total
+RELOAD_MODES = ("incremental", "completo")
+
+
+def normalize_inventory_frame(df):
+    """
+    Convierte el DataFrame del Excel en un DataFrame tipado con los nombres
+    de columna de la base de datos, listo para insertarse sin pasar por el ORM.
+    """
+    out = df[list(COLUMNAS_INVENTARIO)].rename(columns=COLUMNAS_INVENTARIO)
+
+    for col in ("material_code", "material_text", "base_unit"):
+        out[col] = out[col].fillna("").astype(str).str.strip()
+
+    out["location"] = (
+        out["location"].fillna("").astype(str).str.replace(" ", "").str.upper()
+    )
+    out["libre_utilizacion"] = (
+        pd.to_numeric(out["libre_utilizacion"], errors="coerce").fillna(0.0).astype(float)
+    )
+
+    return out.reset_index(drop=True)
+
+
+def iter_frame_chunks(chunks, chunk_size=CHUNK_SIZE):
+    """Bloques del Excel; un DataFrame suelto se parte en bloques de chunk_size."""
+    if isinstance(chunks, pd.DataFrame):
+        for start in range(0, len(chunks), chunk_size):
+            yield chunks.iloc[start:start + chunk_size]
+    else:
+        yield from chunks
+
+
+def iter_record_chunks(df, chunk_size=CHUNK_SIZE, **constantes):
+    """Genera listas de dicts (una por bloque) con columnas constantes añadidas."""
+    for start in range(0, len(df), chunk_size):
+        records = df.iloc[start:start + chunk_size].to_dict("records")
+        if constantes:
+            for r in records:
+                r.update(constantes)
+        yield records
+
+
+def row_hashes(frame):
+    """Hash de contenido por fila (hex de 16 caracteres)."""
+    if frame.empty:
+        return pd.Series([], dtype=object)
+    hashes = pd.util.hash_pandas_object(frame[VALUE_COLS], index=False)
+    return hashes.map("{:016x}".format)
+
+
+def status_column(libre):
+    """Estado de InventoryItem.STATUS_LIMITS para una columna de stock (vectorizado)."""
+    libre = np.nan_to_num(np.asarray(libre, dtype=float))
+
+    condiciones, valores, resto = [], [], None
+    for status, limite in InventoryItem.STATUS_LIMITS:
+        if limite is None:
+            resto = status
+        else:
+            condiciones.append(libre <= limite)
+            valores.append(status)
+
+    return np.select(condiciones, valores, default=resto)
+
+
+def _with_derived(frame):
+    """Agrega row_hash y status calculados desde las columnas de valor."""
+    return frame.assign(
+        row_hash=row_hashes(frame).to_numpy(),
+        status=status_column(frame["libre_utilizacion"]),
+    )
+
+
+def _existing_rows(codigos):
+    """Posición, hash y stock actuales de "inventory" para los materiales dados (por lotes)."""
+    t = InventoryItem.__table__
+    columnas = ["id", "row_hash"] + KEY + ["libre_utilizacion"]
+
+    filas = []
+    for start in range(0, len(codigos), LOOKUP_BATCH):
+        filas.extend(db.session.execute(
+            db.select(*[t.c[col] for col in columnas])
+            .where(t.c.material_code.in_(codigos[start:start + LOOKUP_BATCH]))
+        ).all())
+
+    return pd.DataFrame(filas, columns=columnas)
+
+
+def _stored_texts(ids):
+    """{id: (material_text, base_unit)} de las filas dadas."""
+    t = InventoryItem.__table__
+    return {
+        id_: (texto, unidad)
+        for id_, texto, unidad in db.session.execute(
+            db.select(t.c.id, t.c.material_text, t.c.base_unit).where(t.c.id.in_(ids))
+        )
+    }
+
+
+def _invalidate_counts(claves, chunk_size):
+    """Borra los conteos de las posiciones dadas (DataFrame con KEY)."""
+    c = InventoryCount.__table__
+    borrar_conteo = c.delete().where(
+        c.c.material_code == bindparam("b_material_code"),
+        c.c.location == bindparam("b_location"),
+    )
+    for records in iter_record_chunks(claves[KEY].add_prefix("b_"), chunk_size):
+        db.session.execute(borrar_conteo, records)
+
+
+def _apply_chunk(data, estado, ahora, chunk_size):
+    """
+    Aplica un bloque (una fila por posición) contra la tabla:
+      - posición nueva                      → INSERT
+      - posición existente vista por 1ª vez → UPDATE sólo si cambió el hash
+      - posición ya escrita en esta carga   → suma la libre utilización
+        (la misma posición repetida en bloques distintos)
+    """
+    t = InventoryItem.__table__
+
+    actual = _existing_rows(data["material_code"].unique().tolist())
+    en_actual, _ = match_positions(actual, data)
+
+    nuevos = en_actual == -1
+    existentes = np.flatnonzero(~nuevos)
+    ids = actual["id"].to_numpy()[en_actual[existentes]]
+
+    repetida = np.array(
+        [i > estado["max_id"] or i in estado["tocados"] for i in ids], dtype=bool
+    )
+
+    # Primera vez que se ve la posición: gana el contenido del Excel
+    primeras = data.iloc[existentes[~repetida]].assign(id=ids[~repetida])
+    primeras = _with_derived(primeras)
+    cambio = (
+        primeras["row_hash"].to_numpy()
+        != actual["row_hash"].to_numpy()[en_actual[existentes[~repetida]]]
+    )
+    estado["tocados"].update(primeras["id"].tolist())
+    estado["cambiados"].update(primeras.loc[cambio, "id"].tolist())
+    estado["originales"].update(zip(
+        primeras.loc[cambio, "id"].tolist(),
+        actual["row_hash"].to_numpy()[en_actual[existentes[~repetida]]][cambio],
+    ))
+
+    # Posición repetida: se conserva texto y unidad de la primera fila
+    previas = actual.iloc[en_actual[existentes[repetida]]]
+    textos = _stored_texts(previas["id"].tolist()) if len(previas) else {}
+    fusionadas = previas[["id"] + KEY].assign(
+        material_text=[textos[i][0] for i in previas["id"]],
+        base_unit=[textos[i][1] for i in previas["id"]],
+        libre_utilizacion=(
+            previas["libre_utilizacion"].fillna(0.0).to_numpy(dtype=float)
+            + data["libre_utilizacion"].to_numpy()[existentes[repetida]]
+        )
+    )
+    fusionadas = _with_derived(fusionadas)
+
+    # Una fila anterior a la carga cambió sólo si el resultado final difiere
+    # de su hash original (el primer bloque deja una suma parcial)
+    for id_, previo, final in zip(
+        fusionadas["id"].tolist(), previas["row_hash"].tolist(), fusionadas["row_hash"].tolist()
+    ):
+        if id_ > estado["max_id"]:
+            continue
+        if final == estado["originales"].setdefault(id_, previo):
+            estado["cambiados"].discard(id_)
+        else:
+            estado["cambiados"].add(id_)
+
+    actualizar = pd.concat([primeras[cambio], fusionadas], ignore_index=True)
+
+    sentencia = t.update().where(t.c.id == bindparam("b_id")).values(
+        material_text=bindparam("b_material_text"),
+        base_unit=bindparam("b_base_unit"),
+        libre_utilizacion=bindparam("b_libre_utilizacion"),
+        status=bindparam("b_status"),
+        row_hash=bindparam("b_row_hash"),
+    )
+    cambios = actualizar[["id"] + VALUE_COLS + ["status", "row_hash"]]
+    for records in iter_record_chunks(cambios.add_prefix("b_"), chunk_size):
+        db.session.execute(sentencia, records)
+
+    # INSERT de posiciones nuevas
+    insertar = _with_derived(data[nuevos])
+    insertar["location_sort"] = location_sort_keys(insertar["location"]).to_numpy()
+    for records in iter_record_chunks(insertar, chunk_size, creado_en=ahora):
+        db.session.execute(t.insert(), records)
+
+    estado["insertados"] += len(insertar)
+
+
+def _delete_missing(estado, snapshot, ahora, chunk_size):
+    """
+    Borra (con sus conteos) las posiciones anteriores a la carga que no
+    vinieron en el Excel. Recorre los ids por keyset; si el snapshot es delta
+    guarda antes las filas "D". Devuelve cuántas borró.
+    """
+    t = InventoryItem.__table__
+    eliminados = 0
+    ultimo = 0
+
+    while True:
+        filas = db.session.execute(
+            db.select(t.c.id, t.c.material_code, t.c.location)
+            .where(t.c.id > ultimo, t.c.id <= estado["max_id"])
+            .order_by(t.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not filas:
+            return eliminados
+        ultimo = filas[-1][0]
+
+        bloque = pd.DataFrame(filas, columns=["id"] + KEY)
+        bloque = bloque[~bloque["id"].isin(estado["tocados"])]
+        if bloque.empty:
+            continue
+
+        ids = bloque["id"].tolist()
+        if not snapshot.is_full:
+            copy_to_snapshot(snapshot.id, "D", t, t.c.id.in_(ids), ahora=ahora)
+        _invalidate_counts(bloque, chunk_size)
+        db.session.execute(t.delete().where(t.c.id.in_(ids)))
+        eliminados += len(ids)
+
+
+def _invalidate_changed(estado, chunk_size):
+    """Los conteos de las posiciones modificadas dejan de ser válidos."""
+    t = InventoryItem.__table__
+    cambiados = sorted(estado["cambiados"])
+
+    for start in range(0, len(cambiados), chunk_size):
+        claves = pd.DataFrame(
+            db.session.execute(
+                db.select(t.c.material_code, t.c.location)
+                .where(t.c.id.in_(cambiados[start:start + chunk_size]))
+            ).all(),
+            columns=KEY,
+        )
+        _invalidate_counts(claves, chunk_size)
+
+
+def _write_history(estado, snapshot, ahora, chunk_size):
+    """Filas "A" / "C" del snapshot copiadas desde la tabla ya cargada."""
+    t = InventoryItem.__table__
+
+    if snapshot.is_full:
+        copy_to_snapshot(snapshot.id, "A", t, ahora=ahora)
+        return
+
+    copy_to_snapshot(snapshot.id, "A", t, t.c.id > estado["max_id"], ahora=ahora)
+
+    cambiados = sorted(estado["cambiados"])
+    for start in range(0, len(cambiados), chunk_size):
+        copy_to_snapshot(
+            snapshot.id, "C", t, t.c.id.in_(cambiados[start:start + chunk_size]), ahora=ahora
+        )
+
+
+def reload_inventory(chunks, snapshot_id, snapshot_name, modo="incremental",
+                     chunk_size=CHUNK_SIZE, progreso=None):
+    """
+    Carga el inventario base y guarda el snapshot histórico en una sola
+    transacción. modo="incremental" aplica sólo las diferencias contra la
+    tabla actual; modo="completo" la reemplaza entera (borra los conteos).
+    Las filas que repiten posición se fusionan sumando su libre utilización
+    (ver snapshot_frame). progreso(filas) se llama tras cada bloque leído.
+    Devuelve las métricas.
+    """
+    if modo not in RELOAD_MODES:
+        raise ValueError(f"Modo de carga inválido: {modo}")
+
+    t = InventoryItem.__table__
+    ahora = datetime.utcnow()
+
+    try:
+        # Primero la cabecera: toma el lock de escritura antes de leer la tabla
+        snapshot = begin_snapshot(snapshot_id, snapshot_name, full=modo == "completo")
+
+        if modo == "completo":
+            db.session.execute(InventoryCount.__table__.delete())
+            db.session.execute(t.delete())
+
+        estado = {
+            # Filas con id <= max_id existían antes de la carga
+            "max_id": db.session.execute(db.select(db.func.max(t.c.id))).scalar() or 0,
+            "tocados": set(),
+            "cambiados": set(),
+            # Hash previo a la carga de las filas que el primer bloque modificó
+            "originales": {},
+            "insertados": 0,
+        }
+
+        leidas = 0
+        for chunk in iter_frame_chunks(chunks, chunk_size):
+            data = snapshot_frame(normalize_inventory_frame(chunk))
+            _apply_chunk(data, estado, ahora, chunk_size)
+            leidas += len(chunk)
+            if progreso:
+                progreso(len(chunk))
+
+        eliminados = _delete_missing(estado, snapshot, ahora, chunk_size)
+        _invalidate_changed(estado, chunk_size)
+        _write_history(estado, snapshot, ahora, chunk_size)
+        finish_snapshot(snapshot, db.select(*[t.c[col] for col in COLUMNS]))
+        refresh_inventory_kpis()
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    posiciones = estado["insertados"] + len(estado["tocados"])
+    return {
+        "insertados": estado["insertados"],
+        "actualizados": len(estado["cambiados"]),
+        "eliminados": eliminados,
+        "sin_cambios": len(estado["tocados"]) - len(estado["cambiados"]),
+        "rows": leidas,
+        "posiciones": posiciones,
+        "duplicados_fusionados": leidas - posiciones,
+    }
+
+
+def import_history_snapshot(chunks, snapshot_id, snapshot_name, progreso=None):
+    """
+    Guarda un inventario antiguo como snapshot histórico completo, sin tocar
+    el inventario actual. Los bloques se escriben tal como llegan y las
+    posiciones repetidas se fusionan al final en la base. Devuelve las filas
+    leídas y cuántas se fusionaron por repetir posición.
+    """
+    ahora = datetime.utcnow()
+
+    try:
+        snapshot = begin_snapshot(snapshot_id, snapshot_name, origen="historico")
+
+        leidas = 0
+        for chunk in iter_frame_chunks(chunks):
+            write_snapshot_rows(snapshot_id, normalize_inventory_frame(chunk), ahora=ahora)
+            leidas += len(chunk)
+            if progreso:
+                progreso(len(chunk))
+
+        if not leidas:
+            raise ValueError("❌ El archivo no contiene filas de inventario.")
+
+        duplicados = merge_duplicate_rows(snapshot_id)
+        finish_snapshot(snapshot, snapshot_rows_query(snapshot_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {"rows": leidas, "duplicados_fusionados": duplicados}
+
+
+# =============================================================================
+# TRABAJO EN SEGUNDO PLANO (utils.jobs)
+# =============================================================================
+def run_inventory_upload(job, path, snapshot_id, snapshot_name, modo="incremental"):
+    try:
+        job.stage("Leyendo Excel")
+        with open(path, "rb") as fh:
+            chunks = iter_inventory_excel(fh)
+            job.stage("Guardando inventario")
+            stats = reload_inventory(
+                chunks, snapshot_id, snapshot_name, modo=modo, progreso=job.progress
+            )
+    finally:
+        os.remove(path)
+
+    stats["snapshot_id"] = snapshot_id
+    stats["modo"] = modo
+    return stats
+
+
+def run_history_upload(job, path, snapshot_id, snapshot_name):
+    try:
+        job.stage("Leyendo Excel")
+        with open(path, "rb") as fh:
+            chunks = iter_inventory_excel(fh)
+            stats = import_history_snapshot(
+                chunks, snapshot_id, snapshot_name, progreso=job.progress
+            )
+    finally:
+        os.remove(path)
+
+    stats["snapshot_id"] = snapshot_id
+    return stats
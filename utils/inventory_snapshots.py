@@ -0,0 +1,419 @@
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, func
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.inventory_snapshot import InventorySnapshot
+from models.inventory_history import InventoryHistory
+
+# =============================================================================
+# SNAPSHOTS DE INVENTARIO CON ALMACENAMIENTO DELTA
+#
+#   Cada carga crea una cabecera en "snapshot" y guarda en inventory_history
+#   sólo las posiciones (material_code, location) que cambiaron respecto al
+#   snapshot anterior. Cada FULL_EVERY cargas se guarda un snapshot completo
+#   para que la reconstrucción nunca recorra una cadena larga.
+#
+#   La escritura va por partes para no tener el archivo entero en memoria:
+#   begin_snapshot() crea la cabecera, las filas se agregan por bloques
+#   (write_snapshot_rows) o con INSERT ... SELECT desde otra tabla
+#   (copy_to_snapshot) y finish_snapshot() calcula filas y checksum leyendo
+#   el contenido por bloques.
+# =============================================================================
+
+KEY = ["material_code", "location"]
+VALUE_COLS = ["material_text", "base_unit", "libre_utilizacion"]
+COLUMNS = KEY + VALUE_COLS
+
+FULL_EVERY = 30
+
+CHUNK_SIZE = 5000
+
+# Intentos de asignar seq si otra carga tomó el mismo número
+SEQ_RETRIES = 5
+
+
+def snapshot_frame(df):
+    """
+    Una fila por posición: los duplicados de (material, ubicación) suman su
+    libre utilización (la carga informa cuántos fusionó en
+    "duplicados_fusionados"). Ordenado por clave para que el checksum sea
+    estable.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    frame = (
+        df[COLUMNS]
+        .groupby(KEY, as_index=False, sort=True)
+        .agg({
+            "material_text": "first",
+            "base_unit": "first",
+            "libre_utilizacion": "sum",
+        })
+    )
+    return frame[COLUMNS].reset_index(drop=True)
+
+
+def _hash_sum(frame):
+    """Suma módulo 2**64 de los hash por fila: no depende del orden de las filas."""
+    if frame.empty:
+        return 0
+
+    valores = frame[COLUMNS].assign(
+        material_text=frame["material_text"].fillna(""),
+        base_unit=frame["base_unit"].fillna(""),
+        libre_utilizacion=frame["libre_utilizacion"].fillna(0.0).astype(float),
+    )
+    hashes = pd.util.hash_pandas_object(valores, index=False).to_numpy(np.uint64)
+    return int(hashes.sum(dtype=np.uint64))
+
+
+def query_checksum(stmt):
+    """
+    (filas, sha256) del contenido de un SELECT de COLUMNS, leído por bloques
+    de CHUNK_SIZE filas. Mismo valor para el mismo contenido en cualquier orden.
+    """
+    filas = suma = 0
+
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_SIZE))
+    for bloque in result.partitions():
+        frame = pd.DataFrame(bloque, columns=COLUMNS)
+        filas += len(frame)
+        suma = (suma + _hash_sum(frame)) % 2 ** 64
+
+    return filas, hashlib.sha256(f"{filas}:{suma:016x}".encode()).hexdigest()
+
+
+def match_positions(old, new):
+    """
+    Empareja las posiciones de dos snapshots sin merge de strings: factoriza
+    material y ubicación a enteros, combina ambos códigos en una clave int64
+    y usa get_indexer. Devuelve (fila de old para cada fila de new,
+    fila de new para cada fila de old), con -1 cuando no existe.
+    """
+    n_old = len(old)
+
+    mat, _ = pd.factorize(np.concatenate([
+        old["material_code"].to_numpy(object), new["material_code"].to_numpy(object)
+    ]))
+    loc, ubicaciones = pd.factorize(np.concatenate([
+        old["location"].to_numpy(object), new["location"].to_numpy(object)
+    ]))
+
+    key = mat.astype(np.int64) * max(len(ubicaciones), 1) + loc
+    key_old, key_new = pd.Index(key[:n_old]), pd.Index(key[n_old:])
+
+    return key_old.get_indexer(key_new), key_new.get_indexer(key_old)
+
+
+# =============================================================================
+# LECTURA
+# =============================================================================
+def list_snapshots():
+    return InventorySnapshot.query.order_by(InventorySnapshot.seq.desc()).all()
+
+
+def latest_snapshot(origen="carga"):
+    return (
+        InventorySnapshot.query.filter_by(origen=origen)
+        .order_by(InventorySnapshot.seq.desc())
+        .first()
+    )
+
+
+def _chain(snapshot):
+    """Snapshots a leer para reconstruir: último completo + deltas posteriores."""
+    if snapshot.is_full:
+        return [snapshot]
+
+    base = (
+        InventorySnapshot.query.filter(
+            InventorySnapshot.origen == snapshot.origen,
+            InventorySnapshot.is_full.is_(True),
+            InventorySnapshot.seq <= snapshot.seq,
+        )
+        .order_by(InventorySnapshot.seq.desc())
+        .first()
+    )
+
+    return (
+        InventorySnapshot.query.filter(
+            InventorySnapshot.origen == snapshot.origen,
+            InventorySnapshot.seq >= base.seq,
+            InventorySnapshot.seq <= snapshot.seq,
+        )
+        .order_by(InventorySnapshot.seq)
+        .all()
+    )
+
+
+def load_snapshot(snapshot_id):
+    """
+    Reconstruye el contenido completo de un snapshot (DataFrame con COLUMNS).
+    Lee la cadena en una sola consulta y se queda con el último cambio de
+    cada posición; las posiciones cuyo último cambio es "D" no existen.
+    """
+    snapshot = db.session.get(InventorySnapshot, snapshot_id)
+    if snapshot is None:
+        return None
+
+    chain = _chain(snapshot)
+    orden = {s.id: s.seq for s in chain}
+
+    h = InventoryHistory.__table__.c
+    stmt = db.select(
+        h.snapshot_id, h.change_type, h.material_code, h.location,
+        h.material_text, h.base_unit, h.libre_utilizacion,
+    ).where(h.snapshot_id.in_(list(orden)))
+
+    rows = pd.DataFrame(
+        db.session.execute(stmt).all(),
+        columns=["snapshot_id", "change_type"] + KEY + VALUE_COLS,
+    )
+
+    if rows.empty:
+        return pd.DataFrame(columns=COLUMNS)
+
+    if len(chain) > 1:
+        rows["seq"] = rows["snapshot_id"].map(orden)
+        rows = rows.sort_values("seq", kind="mergesort").drop_duplicates(KEY, keep="last")
+        rows = rows[rows["change_type"] != "D"]
+
+    return rows[COLUMNS].reset_index(drop=True)
+
+
+# =============================================================================
+# ESCRITURA (no hace commit: corre dentro de la transacción de la carga)
+# =============================================================================
+def _insert_header(snapshot_id, name, origen):
+    """
+    INSERT de la cabecera con seq = max(seq) + 1 calculado en la misma
+    sentencia. En SQLite la sentencia toma el lock de escritura, así que dos
+    cargas no leen el mismo máximo (y un SAVEPOINT al inicio de la
+    transacción la confirmaría sola); en Postgres sí pueden, y la segunda
+    choca con el índice único: se reintenta en un savepoint con el máximo
+    nuevo.
+    """
+    t = InventorySnapshot.__table__
+    siguiente = db.select(func.coalesce(func.max(t.c.seq), 0) + 1).scalar_subquery()
+    stmt = t.insert().values(
+        id=snapshot_id, seq=siguiente, name=name, origen=origen, is_full=False,
+        row_count=0, changes=0, checksum="", created_at=datetime.utcnow(),
+    )
+
+    if db.session.get_bind().dialect.name == "sqlite":
+        db.session.execute(stmt)
+        return
+
+    for intento in range(SEQ_RETRIES):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(stmt)
+            return
+        except IntegrityError:
+            if intento == SEQ_RETRIES - 1:
+                raise
+
+
+def begin_snapshot(snapshot_id, name, origen="carga", full=False):
+    """
+    Crea la cabecera del snapshot con el siguiente seq. Los de origen
+    "carga" son delta contra el anterior salvo el primero, cada FULL_EVERY
+    cargas o si se pide full=True; los históricos siempre son completos.
+    Llamar antes de leer las tablas que el snapshot va a comparar: la
+    cabecera toma el lock de escritura de la carga.
+    """
+    _insert_header(snapshot_id, name, origen)
+    snapshot = db.session.get(InventorySnapshot, snapshot_id)
+
+    is_full = full or origen != "carga"
+    if not is_full:
+        anteriores = InventorySnapshot.query.filter(
+            InventorySnapshot.origen == origen,
+            InventorySnapshot.seq < snapshot.seq,
+        )
+        ultimo_full = (
+            anteriores.filter(InventorySnapshot.is_full.is_(True))
+            .with_entities(func.max(InventorySnapshot.seq))
+            .scalar()
+        )
+        is_full = (
+            ultimo_full is None
+            or anteriores.filter(InventorySnapshot.seq > ultimo_full).count() + 1 >= FULL_EVERY
+        )
+
+    snapshot.is_full = is_full
+    db.session.flush()
+    return snapshot
+
+
+def write_snapshot_rows(snapshot_id, frame, change_type="A", ahora=None):
+    """INSERT por bloques de las filas de un DataFrame con COLUMNS."""
+    ahora = ahora or datetime.utcnow()
+    history_insert = InventoryHistory.__table__.insert()
+
+    for start in range(0, len(frame), CHUNK_SIZE):
+        records = frame[COLUMNS].iloc[start:start + CHUNK_SIZE].to_dict("records")
+        for r in records:
+            r["snapshot_id"] = snapshot_id
+            r["change_type"] = change_type
+            r["creado_en"] = ahora
+        db.session.execute(history_insert, records)
+
+
+def copy_to_snapshot(snapshot_id, change_type, tabla, *condiciones, ahora=None):
+    """
+    INSERT ... SELECT de las filas de `tabla` (con las columnas de COLUMNS)
+    que cumplen las condiciones. Las filas "D" sólo guardan la posición.
+    Devuelve las filas copiadas.
+    """
+    c = tabla.c
+    if change_type == "D":
+        valores = [db.null(), db.null(), db.literal(0.0)]
+    else:
+        valores = [c.material_text, c.base_unit, c.libre_utilizacion]
+
+    origen = db.select(
+        db.literal(snapshot_id),
+        db.literal(change_type),
+        c.material_code,
+        c.location,
+        *valores,
+        db.literal(ahora or datetime.utcnow()),
+    ).where(*condiciones)
+
+    return db.session.execute(
+        InventoryHistory.__table__.insert().from_select(
+            ["snapshot_id", "change_type", "material_code", "location",
+             "material_text", "base_unit", "libre_utilizacion", "creado_en"],
+            origen,
+        )
+    ).rowcount
+
+
+def merge_duplicate_rows(snapshot_id):
+    """
+    Fusiona las filas de un snapshot que repiten posición (suma la libre
+    utilización en la primera y borra el resto). Devuelve las filas que
+    sobraban. El GROUP BY corre en la base: sólo las posiciones repetidas
+    llegan a Python.
+    """
+    t = InventoryHistory.__table__
+
+    repetidas = db.session.execute(
+        db.select(
+            t.c.material_code, t.c.location,
+            func.min(t.c.id), func.sum(t.c.libre_utilizacion), func.count(),
+        )
+        .where(t.c.snapshot_id == snapshot_id)
+        .group_by(t.c.material_code, t.c.location)
+        .having(func.count() > 1)
+    ).all()
+
+    sumar = t.update().where(t.c.id == bindparam("b_id")).values(
+        libre_utilizacion=bindparam("b_libre")
+    )
+    sobrantes = t.delete().where(
+        t.c.snapshot_id == snapshot_id,
+        t.c.material_code == bindparam("b_material_code"),
+        t.c.location == bindparam("b_location"),
+        t.c.id != bindparam("b_id"),
+    )
+
+    for start in range(0, len(repetidas), CHUNK_SIZE):
+        bloque = [
+            {"b_material_code": m, "b_location": loc, "b_id": primera, "b_libre": libre}
+            for m, loc, primera, libre, _ in repetidas[start:start + CHUNK_SIZE]
+        ]
+        db.session.execute(sumar, bloque)
+        db.session.execute(sobrantes, bloque)
+
+    return sum(cantidad - 1 for *_, cantidad in repetidas)
+
+
+def snapshot_rows_query(snapshot_id):
+    """SELECT de COLUMNS con las filas guardadas de un snapshot."""
+    h = InventoryHistory.__table__.c
+    return db.select(*[h[col] for col in COLUMNS]).where(h.snapshot_id == snapshot_id)
+
+
+def finish_snapshot(snapshot, contenido):
+    """
+    Completa la cabecera: filas guardadas en el snapshot, filas de su
+    contenido completo y checksum (contenido = SELECT de COLUMNS).
+    """
+    h = InventoryHistory.__table__.c
+
+    snapshot.changes = db.session.execute(
+        db.select(func.count()).select_from(InventoryHistory.__table__)
+        .where(h.snapshot_id == snapshot.id)
+    ).scalar()
+    snapshot.row_count, snapshot.checksum = query_checksum(contenido)
+
+    db.session.flush()
+    return snapshot
+
+
+# =============================================================================
+# COMPARACIÓN ENTRE DOS SNAPSHOTS (merge vectorizado)
+# =============================================================================
+DIFF_COLUMNS = KEY + [
+    "material_text", "base_unit", "libre_from", "libre_to", "diferencia", "cambio",
+]
+
+
+def diff_snapshots(old, new):
+    """
+    Compara dos snapshots reconstruidos. Devuelve (DataFrame de diferencias,
+    totales). cambio = NUEVO / ELIMINADO / CANTIDAD.
+    """
+    en_old, en_new = match_positions(old, new)
+
+    libre_old = old["libre_utilizacion"].to_numpy(dtype=float)
+    libre_new = new["libre_utilizacion"].to_numpy(dtype=float)
+
+    nuevo = en_old == -1
+    eliminado = en_new == -1
+    both = ~nuevo
+
+    diferencia_both = libre_new[both] - libre_old[en_old[both]]
+    cantidad = np.zeros(len(new), dtype=bool)
+    cantidad[both] = diferencia_both != 0
+
+    libre_from = np.zeros(len(new))
+    libre_from[both] = libre_old[en_old[both]]
+
+    cambios_new = nuevo | cantidad
+    parte_new = new.loc[cambios_new, COLUMNS[:-1]].assign(
+        libre_from=libre_from[cambios_new],
+        libre_to=libre_new[cambios_new],
+        cambio=np.where(nuevo[cambios_new], "NUEVO", "CANTIDAD"),
+    )
+    parte_old = old.loc[eliminado, COLUMNS[:-1]].assign(
+        libre_from=libre_old[eliminado],
+        libre_to=0.0,
+        cambio="ELIMINADO",
+    )
+
+    diff = pd.concat([parte_new, parte_old], ignore_index=True)
+    diff["diferencia"] = diff["libre_to"] - diff["libre_from"]
+
+    totales = {
+        "rows_from": len(old),
+        "rows_to": len(new),
+        "nuevos": int(nuevo.sum()),
+        "eliminados": int(eliminado.sum()),
+        "cantidad_cambiada": int(cantidad.sum()),
+        "stock_from": float(libre_old.sum()),
+        "stock_to": float(libre_new.sum()),
+        "stock_nuevos": float(libre_new[nuevo].sum()),
+        "stock_eliminados": float(libre_old[eliminado].sum()),
+        "variacion_neta": float(libre_new.sum() - libre_old.sum()),
+    }
+
+    return diff[DIFF_COLUMNS].sort_values(KEY).reset_index(drop=True), totales
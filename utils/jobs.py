@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app, request, jsonify, redirect, url_for
+from sqlalchemy.exc import OperationalError
+
+from models import db
+from models.job import Job
+
+# =============================================================================
+# EJECUTOR LOCAL DE TRABAJOS EN SEGUNDO PLANO (sin broker externo)
+#
+#   - Un ThreadPoolExecutor por proceso de gunicorn.
+#   - La tabla "jobs" guarda estado, etapa, filas y errores.
+#   - El contador de filas vive en memoria y se persiste, junto con el
+#     latido (updated_at), cada JOB_PROGRESS_EVERY filas, en cada cambio de
+#     etapa y al terminar. Así otro worker de gunicorn ve el avance.
+#   - Un job "pending"/"running" sin latido hace más de JOB_STALE_SECONDS
+#     murió con su proceso (reinicio, OOM): se marca como fallido al
+#     consultarlo y al arrancar la app. El valor debe superar la carga más
+#     larga: en SQLite el latido no se puede escribir mientras la
+#     transacción de la carga está abierta.
+# =============================================================================
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+
+JOB_PROGRESS_EVERY = int(os.environ.get("JOB_PROGRESS_EVERY", 20000))
+
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 1800))
+
+# Espera máxima del lock de SQLite al persistir el avance (ms)
+PROGRESS_LOCK_WAIT_MS = 200
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="mro-job")
+
+# job_id → {"stage": ..., "rows_processed": ...} de los trabajos en curso
+_en_curso = {}
+_lock = threading.Lock()
+
+
+def _actualizar_job(job_id, **campos):
+    """Actualiza la fila del job con una conexión propia (fuera de la sesión del trabajo)."""
+    campos["updated_at"] = datetime.utcnow()
+    with db.engine.begin() as conn:
+        conn.execute(
+            Job.__table__.update().where(Job.__table__.c.id == job_id).values(**campos)
+        )
+
+
+def _guardar_avance(job_id, filas):
+    """
+    Persiste filas procesadas y latido sin frenar el trabajo. En SQLite la
+    base está tomada mientras la transacción del trabajo sigue abierta: se
+    espera a lo sumo PROGRESS_LOCK_WAIT_MS y, si no se pudo, el avance queda
+    en memoria hasta el siguiente intento. Devuelve True si se guardó.
+    """
+    with db.engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            espera = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            conn.exec_driver_sql(f"PRAGMA busy_timeout={PROGRESS_LOCK_WAIT_MS}")
+
+        try:
+            conn.execute(
+                Job.__table__.update()
+                .where(Job.__table__.c.id == job_id)
+                .values(rows_processed=filas, updated_at=datetime.utcnow())
+            )
+            conn.commit()
+            return True
+        except OperationalError:
+            conn.rollback()
+            return False
+        finally:
+            if sqlite:
+                conn.exec_driver_sql(f"PRAGMA busy_timeout={espera}")
+                conn.commit()
+
+
+class JobContext:
+    """Objeto que recibe la función del trabajo para reportar su avance."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.rows_processed = 0
+        self.rows_persisted = 0
+
+    def stage(self, nombre):
+        """Cambia de etapa. Llamar sólo sin transacción de escritura abierta."""
+        with _lock:
+            _en_curso[self.id]["stage"] = nombre
+        _actualizar_job(self.id, stage=nombre, rows_processed=self.rows_processed)
+        self.rows_persisted = self.rows_processed
+
+    def progress(self, filas):
+        """Suma filas procesadas; se persisten cada JOB_PROGRESS_EVERY filas."""
+        self.rows_processed += filas
+        with _lock:
+            _en_curso[self.id]["rows_processed"] = self.rows_processed
+
+        if self.rows_processed - self.rows_persisted >= JOB_PROGRESS_EVERY:
+            if _guardar_avance(self.id, self.rows_processed):
+                self.rows_persisted = self.rows_processed
+
+
+def _run(app, job_id, fn, args, kwargs):
+    with app.app_context():
+        ctx = JobContext(job_id)
+        _actualizar_job(job_id, status="running", stage="Iniciando")
+
+        try:
+            result = fn(ctx, *args, **kwargs)
+            _actualizar_job(
+                job_id,
+                status="done",
+                stage="Completado",
+                rows_processed=ctx.rows_processed,
+                result=json.dumps(result or {}, default=str),
+                finished_at=datetime.utcnow(),
+            )
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ ERROR JOB {job_id}:", e)
+            if not isinstance(e, ValueError):
+                traceback.print_exc()
+            _actualizar_job(
+                job_id,
+                status="failed",
+                stage="Error",
+                rows_processed=ctx.rows_processed,
+                errors=json.dumps([str(e)]),
+                finished_at=datetime.utcnow(),
+            )
+        finally:
+            db.session.remove()
+            with _lock:
+                _en_curso.pop(job_id, None)
+
+
+def submit_job(job_type, fn, *args, usuario=None, **kwargs):
+    """
+    Registra el job y lo encola. fn(ctx, *args, **kwargs) corre en un hilo
+    con su propio app context; lo que devuelva se guarda como resultado.
+    Devuelve el id del job.
+    """
+    job_id = str(uuid.uuid4())
+
+    db.session.add(Job(id=job_id, job_type=job_type, status="pending",
+                       stage="En cola", usuario=usuario))
+    db.session.commit()
+
+    with _lock:
+        _en_curso[job_id] = {"stage": "En cola", "rows_processed": 0}
+
+    app = current_app._get_current_object()
+    _executor.submit(_run, app, job_id, fn, args, kwargs)
+
+    return job_id
+
+
+def _limite_latido(ahora=None):
+    return (ahora or datetime.utcnow()) - timedelta(seconds=JOB_STALE_SECONDS)
+
+
+def fail_stale_jobs(job_id=None):
+    """
+    Marca como fallidos los jobs pendientes o en curso sin latido hace más
+    de JOB_STALE_SECONDS que no corren en este proceso (todos, o sólo
+    job_id). Devuelve cuántos marcó.
+    """
+    t = Job.__table__
+    ahora = datetime.utcnow()
+    limite = _limite_latido(ahora)
+
+    with _lock:
+        vivos = list(_en_curso)
+
+    stmt = t.update().where(
+        t.c.status.in_(("pending", "running")),
+        t.c.updated_at < limite,
+    )
+    if job_id is not None:
+        stmt = stmt.where(t.c.id == job_id)
+    if vivos:
+        stmt = stmt.where(t.c.id.notin_(vivos))
+
+    marcados = db.session.execute(
+        stmt.values(
+            status="failed",
+            stage="Error",
+            errors=json.dumps(["❌ El trabajo se interrumpió (sin avance registrado)."]),
+            updated_at=ahora,
+            finished_at=ahora,
+        )
+    ).rowcount
+    db.session.commit()
+    return marcados
+
+
+def job_status(job_id):
+    """Estado del job: fila de la tabla + avance en memoria si corre en este proceso."""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return None
+
+    # Se verifica leyendo: el UPDATE sólo corre si de verdad está colgado
+    colgado = (
+        job.status in ("pending", "running")
+        and job.updated_at is not None
+        and job.updated_at < _limite_latido()
+    )
+    if colgado and fail_stale_jobs(job_id):
+        db.session.refresh(job)
+
+    data = job.to_dict()
+
+    with _lock:
+        vivo = _en_curso.get(job_id)
+        if vivo and data["status"] in ("pending", "running"):
+            data["stage"] = vivo["stage"]
+            data["rows_processed"] = max(data["rows_processed"], vivo["rows_processed"])
+
+    return data
+
+
+def save_upload(file, job_type):
+    """Guarda el archivo subido para que el job lo lea cuando la petición ya terminó."""
+    carpeta = os.path.join(current_app.config["UPLOAD_FOLDER"], "jobs")
+    os.makedirs(carpeta, exist_ok=True)
+
+    ext = os.path.splitext(file.filename or "")[1].lower() or ".xlsx"
+    path = os.path.join(carpeta, f"{job_type}_{uuid.uuid4().hex}{ext}")
+    file.save(path)
+    return path
+
+
+def job_response(job_id, next_url=None):
+    """
+    Respuesta inmediata de un endpoint de carga: JSON 202 para clientes
+    fetch/XHR, o redirección a la pantalla de progreso para formularios.
+    """
+    status_url = url_for("jobs.job_detail", job_id=job_id)
+
+    if request.accept_mimetypes.best == "application/json" or request.is_json:
+        return jsonify({"job_id": job_id, "status_url": status_url}), 202
+
+    return redirect(url_for("jobs.job_view", job_id=job_id, next=next_url))
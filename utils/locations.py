@@ -0,0 +1,93 @@
+import re
+
+import pandas as pd
+
+# =============================================================================
+# UBICACIONES DEL ALMACÉN
+#
+#   Clave de orden natural: se calcula una vez al guardar la fila y se
+#   persiste en una columna indexada, para ordenar en SQL (ORDER BY) en vez
+#   de ordenar en Python cada vez que se lista.
+# =============================================================================
+
+# Ancho fijo de cada componente numérico ("E12" → "E.000012")
+NUM_WIDTH = 6
+
+# Largo máximo de la clave (tamaño de la columna)
+SORT_KEY_LEN = 128
+
+_TOKENS = re.compile(r"\d+|[A-Z]+")
+
+
+def location_sort_key(loc):
+    """
+    Clave de texto con orden natural: zona (letras) + componentes numéricos
+    rellenados con ceros, separados por ".". Así "E2" < "E10" < "E10-1" y
+    las zonas quedan ordenadas alfabéticamente (A… antes que E…).
+    """
+    if not loc:
+        return ""
+
+    partes = []
+    for token in _TOKENS.findall(str(loc).upper()):
+        partes.append(token.zfill(NUM_WIDTH) if token.isdigit() else token)
+
+    return ".".join(partes)[:SORT_KEY_LEN]
+
+
+def location_sort_keys(series):
+    """Versión para columnas de pandas: calcula la clave una vez por ubicación distinta."""
+    unicas = series.drop_duplicates()
+    claves = dict(zip(unicas, unicas.map(location_sort_key)))
+    return series.map(claves)
+
+
+def default_sort_key(columna):
+    """Default de SQLAlchemy: calcula la clave a partir de otra columna del INSERT."""
+    def _default(context):
+        return location_sort_key(context.get_current_parameters().get(columna))
+    return _default
+
+
+# =============================================================================
+# COORDENADAS: ZONA / PASILLO / RACK / NIVEL
+#
+#   "E10-2-3" → zona E, pasillo 10, rack 2, nivel 3. Los componentes que
+#   faltan quedan en 0 ("E10" → rack 0, nivel 0), así los rangos del mapa
+#   se filtran sobre el índice sin tratar nulos. Se persisten en columnas
+#   indexadas para agregar y recortar el mapa por zona o pasillo.
+# =============================================================================
+
+ZONE_LEN = 16
+
+# Tope de cada coordenada numérica (mismo ancho que la clave de orden)
+MAX_COORD = 10 ** NUM_WIDTH - 1
+
+
+def location_coords(loc):
+    """{"zone", "aisle", "rack", "level"} a partir del texto de la ubicación."""
+    tokens = _TOKENS.findall(str(loc or "").upper())
+
+    zone = ""
+    if tokens and not tokens[0].isdigit():
+        zone = tokens.pop(0)[:ZONE_LEN]
+
+    numeros = [min(int(t), MAX_COORD) for t in tokens if t.isdigit()][:3]
+    numeros += [0] * (3 - len(numeros))
+
+    aisle, rack, level = numeros
+    return {"zone": zone, "aisle": aisle, "rack": rack, "level": level}
+
+
+def location_coords_frame(series):
+    """Columnas zone/aisle/rack/level para una Serie de ubicaciones (una vez por ubicación distinta)."""
+    unicas = series.drop_duplicates()
+    coords = pd.DataFrame([location_coords(loc) for loc in unicas], index=unicas)
+    return coords.reindex(series.to_numpy()).reset_index(drop=True)
+
+
+def default_location_coord(columna, parte):
+    """Default de SQLAlchemy para zone/aisle/rack/level a partir de la ubicación."""
+    def _default(context):
+        return location_coords(context.get_current_parameters().get(columna))[parte]
+    return _default
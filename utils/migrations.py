@@ -0,0 +1,543 @@
+import os
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+from sqlalchemy import bindparam, func, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.schema_migration import SchemaMigration
+from utils.time_buckets import LOCAL_OFFSET_HOURS
+
+# =============================================================================
+# MIGRACIONES DE ESQUEMA Y DATOS (sin Alembic)
+#
+#   create_all sólo crea las tablas que faltan: no agrega columnas ni
+#   índices a tablas existentes ni convierte datos. Cada paso registrado con
+#   @migration corre una sola vez, en el orden en que aparece en este
+#   archivo, y queda anotado en "schema_migrations". Los pasos de esquema
+#   revisan si la columna o el índice ya existen antes de crearlos.
+#
+#   Una base nueva (sin ninguna tabla de la app) no necesita pasos:
+#   create_all ya la crea con el esquema actual y sólo se anotan.
+#
+#   flask --app app upgrade-db       (también corre al arrancar la app)
+# =============================================================================
+
+MIGRATIONS = []
+
+# Filas por bloque al rellenar columnas nuevas
+BACKFILL_CHUNK = 5000
+
+
+def migration(nombre):
+    """Registra un paso de migración (en orden de declaración)."""
+    def registrar(fn):
+        MIGRATIONS.append((nombre, fn))
+        return fn
+    return registrar
+
+
+# =============================================================================
+# AYUDANTES
+# =============================================================================
+def _inspector():
+    return inspect(db.session.connection())
+
+
+def has_table(tabla):
+    return _inspector().has_table(tabla)
+
+
+def columns(tabla):
+    return {c["name"] for c in _inspector().get_columns(tabla)}
+
+
+def add_column(tabla, nombre, defecto=None):
+    """
+    Agrega la columna del modelo si falta. Con defecto (SQL literal) se crea
+    NOT NULL DEFAULT defecto, así SQLite acepta agregarla a una tabla con
+    filas. Devuelve True si la creó.
+    """
+    if nombre in columns(tabla.name):
+        return False
+
+    tipo = tabla.c[nombre].type.compile(dialect=db.session.get_bind().dialect)
+    sql = f"ALTER TABLE {tabla.name} ADD COLUMN {nombre} {tipo}"
+    if defecto is not None:
+        sql += f" NOT NULL DEFAULT {defecto}"
+
+    db.session.execute(text(sql))
+    return True
+
+
+def create_indexes(tabla, *nombres):
+    """Crea los índices del modelo indicados (todos si no se indican) que falten."""
+    existentes = {i["name"] for i in _inspector().get_indexes(tabla.name)}
+
+    for index in tabla.indexes:
+        if (not nombres or index.name in nombres) and index.name not in existentes:
+            index.create(db.session.connection())
+
+
+def backfill(tabla, fuentes, calcular):
+    """
+    Rellena columnas recorriendo la tabla por id en bloques de
+    BACKFILL_CHUNK: calcular(frame con id + fuentes) devuelve un DataFrame
+    con las columnas a escribir. Devuelve las filas actualizadas.
+    """
+    c = tabla.c
+    ultimo = total = 0
+
+    while True:
+        filas = db.session.execute(
+            db.select(c.id, *[c[f] for f in fuentes])
+            .where(c.id > ultimo)
+            .order_by(c.id)
+            .limit(BACKFILL_CHUNK)
+        ).all()
+        if not filas:
+            return total
+        ultimo = filas[-1][0]
+
+        frame = pd.DataFrame(filas, columns=["id"] + list(fuentes))
+        valores = calcular(frame).reset_index(drop=True)
+
+        stmt = tabla.update().where(c.id == bindparam("b_id")).values(
+            **{col: bindparam(f"b_{col}") for col in valores.columns}
+        )
+        records = valores.assign(id=frame["id"].to_numpy()).add_prefix("b_").to_dict("records")
+        db.session.execute(stmt, records)
+        total += len(records)
+
+
+def _as_datetime(valor):
+    """Fecha leída con SQL crudo (en SQLite llega como texto ISO)."""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(str(valor))
+
+
+def _is_new_database():
+    """True si la base no tiene ninguna tabla de la app (antes de create_all)."""
+    existentes = set(inspect(db.engine).get_table_names())
+    return not existentes & set(db.metadata.tables)
+
+
+# =============================================================================
+# EJECUCIÓN
+# =============================================================================
+def upgrade_db(verbose=True):
+    """
+    create_all + pasos pendientes. Cada paso se reclama insertando su fila
+    en schema_migrations dentro de la misma transacción: si otro proceso lo
+    aplicó antes, el INSERT falla y el paso se salta. Devuelve los pasos
+    aplicados.
+    """
+    nueva = _is_new_database()
+    db.create_all()
+    db.session.commit()
+
+    aplicados = {nombre for (nombre,) in db.session.query(SchemaMigration.name)}
+    corridos = []
+
+    for nombre, fn in MIGRATIONS:
+        if nombre in aplicados:
+            continue
+
+        try:
+            db.session.add(SchemaMigration(name=nombre, applied_at=datetime.utcnow()))
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            continue
+
+        try:
+            if not nueva:
+                fn()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if not nueva:
+            corridos.append(nombre)
+            if verbose:
+                print(f">>> Migración aplicada: {nombre}")
+
+    return corridos
+
+
+# =============================================================================
+# PASOS
+# =============================================================================
+@migration("004_inventory_snapshots")
+def _inventory_snapshots():
+    """
+    inventory_history antes de los snapshots: filas sueltas con snapshot_id
+    y snapshot_name, sin cabecera. Cada snapshot_id pasa a ser un snapshot
+    completo de origen "carga" (seq en orden de carga), la tabla se
+    reconstruye con change_type y la FK, y las posiciones repetidas de cada
+    snapshot se fusionan como en la carga actual.
+    """
+    from models.inventory_history import InventoryHistory
+    from models.inventory_snapshot import InventorySnapshot
+    from utils.inventory_snapshots import (
+        finish_snapshot,
+        merge_duplicate_rows,
+        snapshot_rows_query,
+    )
+
+    if "snapshot_name" not in columns("inventory_history"):
+        return
+
+    # Copia sin índices ni restricciones y tabla nueva con el esquema actual
+    db.session.execute(text(
+        "CREATE TABLE inventory_history_legacy AS SELECT * FROM inventory_history"
+    ))
+    db.session.execute(text("DROP TABLE inventory_history"))
+    InventoryHistory.__table__.create(db.session.connection())
+
+    grupos = db.session.execute(text(
+        "SELECT snapshot_id, MIN(snapshot_name), MIN(creado_en) "
+        "FROM inventory_history_legacy "
+        "GROUP BY snapshot_id ORDER BY MIN(creado_en), snapshot_id"
+    )).all()
+
+    seq = db.session.query(db.func.max(InventorySnapshot.seq)).scalar() or 0
+    for snapshot_id, nombre, creado in grupos:
+        seq += 1
+        db.session.add(InventorySnapshot(
+            id=snapshot_id, seq=seq, name=nombre, origen="carga", is_full=True,
+            row_count=0, changes=0, checksum="",
+            created_at=_as_datetime(creado),
+        ))
+    db.session.flush()
+
+    db.session.execute(text(
+        "INSERT INTO inventory_history (snapshot_id, change_type, material_code, "
+        "material_text, base_unit, location, libre_utilizacion, creado_en) "
+        "SELECT snapshot_id, 'A', material_code, material_text, base_unit, location, "
+        "libre_utilizacion, creado_en FROM inventory_history_legacy ORDER BY id"
+    ))
+    db.session.execute(text("DROP TABLE inventory_history_legacy"))
+
+    for snapshot_id, _, _ in grupos:
+        merge_duplicate_rows(snapshot_id)
+        finish_snapshot(db.session.get(InventorySnapshot, snapshot_id),
+                        snapshot_rows_query(snapshot_id))
+
+
+@migration("006_inventory_row_hash")
+def _inventory_row_hash():
+    """
+    Índice único por posición y hash de contenido para la recarga
+    incremental. Las posiciones repetidas (la carga anterior las insertaba
+    tal cual) se fusionan primero sumando su libre utilización, igual que
+    en el snapshot.
+    """
+    from models.inventory import InventoryItem
+    from utils.inventory_ingest import row_hashes
+
+    t = InventoryItem.__table__
+
+    repetidas = db.session.execute(
+        db.select(
+            func.min(t.c.id), t.c.material_code, t.c.location,
+            func.sum(t.c.libre_utilizacion),
+        )
+        .group_by(t.c.material_code, t.c.location)
+        .having(func.count() > 1)
+    ).all()
+    for primera, material, ubicacion, libre in repetidas:
+        db.session.execute(
+            t.update().where(t.c.id == primera).values(libre_utilizacion=libre)
+        )
+        db.session.execute(
+            t.delete().where(
+                t.c.material_code == material, t.c.location == ubicacion, t.c.id != primera,
+            )
+        )
+
+    add_column(t, "row_hash")
+
+    def calcular(frame):
+        valores = frame.assign(
+            material_text=frame["material_text"].fillna("").astype(str),
+            base_unit=frame["base_unit"].fillna("").astype(str),
+            libre_utilizacion=pd.to_numeric(frame["libre_utilizacion"]).fillna(0.0).astype(float),
+        )
+        return pd.DataFrame({"row_hash": row_hashes(valores).to_numpy()})
+
+    backfill(t, ["material_text", "base_unit", "libre_utilizacion"], calcular)
+    create_indexes(t, "ux_inventory_material_location")
+
+
+@migration("007_location_sort_keys")
+def _location_sort_keys():
+    """Clave de orden natural de la ubicación en inventario y layout 2D."""
+    from models.inventory import InventoryItem
+    from models.warehouse2d import WarehouseLocation
+    from utils.locations import location_sort_keys
+
+    for tabla, fuente, destino in (
+        (InventoryItem.__table__, "location", "location_sort"),
+        (WarehouseLocation.__table__, "ubicacion", "ubicacion_sort"),
+    ):
+        add_column(tabla, destino, defecto="''")
+        backfill(
+            tabla, [fuente],
+            lambda frame, fuente=fuente, destino=destino: pd.DataFrame(
+                {destino: location_sort_keys(frame[fuente]).to_numpy()}
+            ),
+        )
+
+    create_indexes(WarehouseLocation.__table__, "ix_warehouse_locations_ubicacion_sort")
+
+
+@migration("008_inventory_location_order")
+def _inventory_location_order():
+    """Índice (location_sort, id) del listado keyset de inventario."""
+    from models.inventory import InventoryItem
+
+    create_indexes(InventoryItem.__table__, "ix_inventory_location_order")
+
+
+@migration("009_inventory_count_counter")
+def _inventory_count_counter():
+    """
+    Conteo por contador: columna counter (los conteos anteriores quedan con
+    contador "") e índice único por posición y contador. Si una posición se
+    guardó más de una vez queda el último registro.
+    """
+    from models.inventory_count import InventoryCount
+
+    t = InventoryCount.__table__
+    add_column(t, "counter", defecto="''")
+
+    ultimos = (
+        db.select(func.max(t.c.id))
+        .group_by(t.c.material_code, t.c.location, t.c.counter)
+        .scalar_subquery()
+    )
+    db.session.execute(t.delete().where(t.c.id.notin_(ultimos)))
+
+    create_indexes(t, "ux_inventory_count_position")
+
+
+@migration("014_stock_status")
+def _stock_status():
+    """Estado de stock persistido en inventario y layout 2D."""
+    from models.inventory import InventoryItem
+    from models.warehouse2d import WarehouseLocation
+    from utils.inventory_ingest import status_column as inventory_status
+    from utils.warehouse2d_ingest import status_column as layout_status
+
+    def numero(serie):
+        return pd.to_numeric(serie).fillna(0.0).astype(float)
+
+    inventario = InventoryItem.__table__
+    add_column(inventario, "status", defecto="''")
+    backfill(
+        inventario, ["libre_utilizacion"],
+        lambda f: pd.DataFrame({"status": inventory_status(numero(f["libre_utilizacion"]))}),
+    )
+    create_indexes(inventario, "ix_inventory_status")
+
+    layout = WarehouseLocation.__table__
+    add_column(layout, "status", defecto="''")
+    backfill(
+        layout, ["libre_utilizacion", "stock_maximo", "stock_seguridad"],
+        lambda f: pd.DataFrame({"status": layout_status(
+            numero(f["libre_utilizacion"]), numero(f["stock_maximo"]), numero(f["stock_seguridad"])
+        )}),
+    )
+    create_indexes(layout, "ix_warehouse_locations_status")
+
+
+@migration("015_alert_fingerprints")
+def _alert_fingerprints():
+    """
+    Huella y fecha de actualización de las alertas. La huella de las alertas
+    de stock crítico anteriores se reconstruye desde el mensaje ("Stock
+    crítico en <ubicación>: <material> (...") y, si una condición tiene
+    varias alertas activas, queda activa sólo la última registrada: el índice
+    único parcial admite una sola.
+    """
+    from models.alerts import Alert
+    from utils.warehouse2d_ingest import ALERT_TYPE_CRITICO
+
+    t = Alert.__table__
+    add_column(t, "fingerprint")
+    add_column(t, "actualizado")
+
+    def calcular(frame):
+        partes = frame["message"].fillna("").str.extract(
+            r"^Stock crítico en (?P<ubicacion>[^:]*): (?P<material>\S*) \("
+        )
+        huella = (ALERT_TYPE_CRITICO + "|" + partes["ubicacion"] + "|" + partes["material"])
+        huella = huella.where(frame["alert_type"].eq(ALERT_TYPE_CRITICO) & partes["ubicacion"].notna())
+        return pd.DataFrame({"fingerprint": huella.astype(object).where(huella.notna(), None)})
+
+    backfill(t, ["alert_type", "message"], calcular)
+    db.session.execute(t.update().where(t.c.actualizado.is_(None)).values(actualizado=t.c.fecha))
+
+    activas = t.c.estado == "activo"
+    ultimas = (
+        db.select(func.max(t.c.id))
+        .where(activas, t.c.fingerprint.isnot(None))
+        .group_by(t.c.fingerprint)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        t.update()
+        .where(activas, t.c.fingerprint.isnot(None), t.c.id.notin_(ultimas))
+        .values(estado="cerrado", actualizado=datetime.utcnow())
+    )
+
+    create_indexes(t, "ux_alertas_fingerprint_activo")
+
+
+@migration("017_location_coords")
+def _location_coords():
+    """
+    Coordenadas zona/pasillo/rack/nivel del layout 2D. Si el resumen por
+    ubicación del mapa está vacío se arma desde el layout ya cargado, para
+    no esperar a la próxima carga del Excel 2D.
+    """
+    from models.warehouse2d import WarehouseLocation, WarehouseLocationSummary
+    from utils.locations import location_coords_frame
+    from utils.warehouse_layout import accumulate_locations, rebuild_location_summary
+
+    t = WarehouseLocation.__table__
+    for columna, defecto in (("zone", "''"), ("aisle", "0"), ("rack", "0"), ("level", "0")):
+        add_column(t, columna, defecto=defecto)
+
+    backfill(t, ["ubicacion"], lambda f: location_coords_frame(f["ubicacion"]))
+    create_indexes(t, "ix_warehouse_locations_coords")
+
+    if db.session.query(WarehouseLocationSummary.ubicacion).first() is not None:
+        return
+
+    resumen = {}
+    ultimo = 0
+    while True:
+        filas = db.session.execute(
+            db.select(t.c.id, t.c.ubicacion, t.c.libre_utilizacion, t.c.status)
+            .where(t.c.id > ultimo)
+            .order_by(t.c.id)
+            .limit(BACKFILL_CHUNK)
+        ).all()
+        if not filas:
+            break
+        ultimo = filas[-1][0]
+        frame = pd.DataFrame(filas, columns=["id", "ubicacion", "libre_utilizacion", "status"])
+        accumulate_locations(resumen, frame.fillna({"ubicacion": "", "libre_utilizacion": 0.0}))
+
+    if resumen:
+        rebuild_location_summary(resumen)
+
+
+def _horas_a_utc(hora_servidor):
+    """
+    Horas que hay que sumar a una fecha guardada por la versión anterior
+    para pasarla a UTC.
+
+    hora_servidor=False → se guardaba datetime.now(America/Lima) (con zona):
+        SQLite guarda la hora de Lima tal cual; PostgreSQL la convierte a la
+        zona de la sesión al meterla en una columna sin zona.
+    hora_servidor=True  → se guardaba datetime.now() (sin zona): la hora del
+        servidor que corría la app (MIGRATION_SERVER_TZ, por defecto la de
+        este proceso).
+    """
+    if hora_servidor:
+        zona = os.environ.get("MIGRATION_SERVER_TZ")
+        ahora = datetime.now(ZoneInfo(zona)) if zona else datetime.now().astimezone()
+        return -ahora.utcoffset().total_seconds() / 3600
+
+    if db.session.get_bind().dialect.name == "postgresql":
+        segundos = db.session.execute(text("SELECT EXTRACT(TIMEZONE FROM now())")).scalar()
+        return -float(segundos) / 3600
+
+    return -LOCAL_OFFSET_HOURS
+
+
+def _shift_dates(tabla, fechas, horas):
+    """Suma `horas` a las columnas de fecha de todas las filas (NULL sigue NULL)."""
+    if not horas:
+        return 0
+
+    delta = timedelta(hours=horas)
+
+    def desplazar(frame):
+        return pd.DataFrame({
+            col: [None if pd.isna(v) else _as_datetime(v) + delta for v in frame[col]]
+            for col in fechas
+        }, dtype=object)
+
+    return backfill(tabla, fechas, desplazar)
+
+
+@migration("020_utc_timestamps")
+def _utc_timestamps():
+    """
+    Las fechas se guardan ahora en UTC. Las filas escritas por la versión
+    anterior estaban en hora local: se convierten una vez (todas las que
+    existen al correr el paso, por eso va antes de desplegar). Después se
+    recalculan el rollup de bultos y los KPI, que dependen del día local.
+    """
+    from models.bultos import Bulto
+    from models.dashboard_kpis import DashboardKpis
+    from models.post_registro import PostRegistro
+    from models.technician_error import TechnicianError
+    from utils.bultos_rollup import rebuild_bultos_rollup
+    from utils.dashboard_kpis import KPIS_ID, rebuild_dashboard_kpis
+
+    lima = _horas_a_utc(hora_servidor=False)
+    servidor = _horas_a_utc(hora_servidor=True)
+
+    _shift_dates(Bulto.__table__, ["fecha_hora", "creado_en"], lima)
+    _shift_dates(PostRegistro.__table__, ["fecha_registro"], lima)
+    _shift_dates(TechnicianError.__table__, ["fecha_hora", "creado_en"], servidor)
+
+    create_indexes(Bulto.__table__, "ix_bultos_fecha_hora")
+    create_indexes(TechnicianError.__table__,
+                   "ix_technician_errors_fecha_hora", "ix_technician_errors_creado_en")
+
+    rebuild_bultos_rollup()
+    if db.session.get(DashboardKpis, KPIS_ID) is not None:
+        rebuild_dashboard_kpis()
+
+
+@migration("022_bultos_normalized")
+def _bultos_normalized():
+    """Chofer y placa normalizados de los bultos existentes y sus índices."""
+    from models.bultos import Bulto
+    from utils.normalize import normalize_name, normalize_plate
+
+    t = Bulto.__table__
+    add_column(t, "chofer_norm", defecto="''")
+    add_column(t, "placa_norm", defecto="''")
+
+    backfill(t, ["chofer", "placa"], lambda f: pd.DataFrame({
+        "chofer_norm": f["chofer"].map(normalize_name),
+        "placa_norm": f["placa"].map(normalize_plate),
+    }))
+    create_indexes(t, "ix_bultos_chofer_norm_fecha", "ix_bultos_placa_norm_fecha")
+
+
+@migration("023_post_registro_bulto_fecha")
+def _post_registro_bulto_fecha():
+    """Índice para el conteo y la última fecha de post-registro por bulto."""
+    from models.post_registro import PostRegistro
+
+    create_indexes(PostRegistro.__table__, "ix_post_registro_bulto_fecha")
+
+
+@migration("024_post_registro_fecha_id")
+def _post_registro_fecha_id():
+    """Índice del historial de post-registro paginado por (fecha_registro, id)."""
+    from models.post_registro import PostRegistro
+
+    create_indexes(PostRegistro.__table__, "ix_post_registro_fecha_id")
@@ -0,0 +1,32 @@
+import re
+import unicodedata
+
+# =============================================================================
+# TEXTO NORMALIZADO PARA BÚSQUEDAS POR ÍNDICE
+#
+#   Los filtros de texto libre (ilike '%x%') no pueden usar un índice. Se
+#   guarda una copia normalizada (mayúsculas, sin tildes, espacios simples)
+#   en una columna indexada y se filtra por igualdad o por prefijo con un
+#   rango [prefijo, siguiente) que sí recorre el índice.
+# =============================================================================
+
+_ESPACIOS = re.compile(r"\s+")
+_NO_ALFANUM = re.compile(r"[^A-Z0-9]")
+
+
+def normalize_name(valor):
+    """ "  José  Pérez " → "JOSE PEREZ" """
+    texto = unicodedata.normalize("NFKD", str(valor or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return _ESPACIOS.sub(" ", texto).strip().upper()
+
+
+def normalize_plate(valor):
+    """ "abc-123" / "ABC 123" → "ABC123" """
+    return _NO_ALFANUM.sub("", normalize_name(valor))
+
+
+def prefix_range(col, prefijo):
+    """Predicado col empieza con prefijo, como rango [prefijo, siguiente)."""
+    siguiente = prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+    return (col >= prefijo) & (col < siguiente)
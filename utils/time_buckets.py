@@ -0,0 +1,124 @@
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from models import db
+
+# =============================================================================
+# FECHAS EN UTC + AGRUPACIÓN POR HORA / DÍA LOCAL (SQLite y PostgreSQL)
+#
+#   Las columnas de fecha se guardan en UTC sin zona (datetime.utcnow).
+#   El "día" del negocio es el de Lima, así que:
+#     - los filtros por día se traducen a un rango UTC semiabierto
+#       [inicio, fin) sobre la columna indexada (nunca func.date(col) == ...);
+#     - los agrupamientos usan una expresión propia de cada motor que
+#       primero desplaza la fecha a la hora local.
+#   Lima no tiene horario de verano: el desfase es fijo (UTC-5).
+# =============================================================================
+
+LOCAL_TZ = ZoneInfo("America/Lima")
+
+# Desfase fijo de la hora local respecto de UTC, en horas
+LOCAL_OFFSET_HOURS = int(datetime(2000, 1, 1, tzinfo=LOCAL_TZ).utcoffset().total_seconds() // 3600)
+
+BUCKETS = ("hour", "weekday", "day", "month")
+
+
+# =============================================================================
+# CONVERSIONES
+# =============================================================================
+def utc_now():
+    """Fecha actual en UTC sin zona (mismo formato que datetime.utcnow)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def to_utc(dt):
+    """Normaliza a UTC sin zona; una fecha sin zona se asume ya en UTC."""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def to_local(dt):
+    """Fecha UTC sin zona → hora local de Lima (sin zona, para mostrar)."""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(LOCAL_TZ).replace(tzinfo=None)
+
+
+def local_today():
+    return datetime.now(LOCAL_TZ).date()
+
+
+# =============================================================================
+# RANGOS SEMIABIERTOS [inicio, fin) EN UTC
+# =============================================================================
+def local_day_start(day):
+    """Inicio (UTC sin zona) del día local `day`."""
+    return to_utc(datetime.combine(day, time.min, tzinfo=LOCAL_TZ))
+
+
+def local_days_range(desde=None, hasta=None):
+    """(inicio, fin) UTC de los días locales desde..hasta, ambos inclusive."""
+    inicio = local_day_start(desde) if desde else None
+    fin = local_day_start(hasta + timedelta(days=1)) if hasta else None
+    return inicio, fin
+
+
+def in_range(col, inicio=None, fin=None):
+    """Predicado col >= inicio AND col < fin (cualquiera de los dos puede faltar)."""
+    condiciones = []
+    if inicio is not None:
+        condiciones.append(col >= inicio)
+    if fin is not None:
+        condiciones.append(col < fin)
+    return db.and_(db.true(), *condiciones)
+
+
+def on_local_day(col, day=None):
+    """Predicado del día local `day` (por defecto hoy), usable por índice."""
+    day = day or local_today()
+    return in_range(col, *local_days_range(day, day))
+
+
+def parse_day(valor):
+    """"YYYY-MM-DD" → date, o None si viene vacío o mal formado."""
+    try:
+        return date.fromisoformat(valor.strip()) if valor and valor.strip() else None
+    except ValueError:
+        return None
+
+
+# =============================================================================
+# EXPRESIONES DE AGRUPACIÓN EN HORA LOCAL
+#
+#   hour     → 0..23 (entero)
+#   weekday  → 0..6, 0 = domingo (entero, como strftime("%w"))
+#   day      → "YYYY-MM-DD"
+#   month    → "YYYY-MM"
+# =============================================================================
+_INT_BUCKETS = {"hour", "weekday"}
+_SQLITE_FORMATS = {"hour": "%H", "weekday": "%w", "day": "%Y-%m-%d", "month": "%Y-%m"}
+_POSTGRES_FIELDS = {"hour": "hour", "weekday": "dow"}
+_POSTGRES_FORMATS = {"day": "YYYY-MM-DD", "month": "YYYY-MM"}
+
+
+def bucket(col, unidad):
+    """Expresión SQL que agrupa `col` (UTC) por la unidad indicada en hora local."""
+    if unidad not in BUCKETS:
+        raise ValueError(f"Unidad de agrupación desconocida: {unidad}")
+
+    dialecto = db.engine.dialect.name
+
+    if dialecto == "sqlite":
+        expr = db.func.strftime(_SQLITE_FORMATS[unidad], col, f"{LOCAL_OFFSET_HOURS} hours")
+        return db.cast(expr, db.Integer) if unidad in _INT_BUCKETS else expr
+
+    if dialecto == "postgresql":
+        local = col + db.literal_column(f"INTERVAL '{LOCAL_OFFSET_HOURS} hours'")
+        if unidad in _INT_BUCKETS:
+            return db.cast(db.func.extract(_POSTGRES_FIELDS[unidad], local), db.Integer)
+        return db.func.to_char(local, _POSTGRES_FORMATS[unidad])
+
+    raise NotImplementedError(f"Agrupación por fecha no soportada para {dialecto}")
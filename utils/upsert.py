@@ -0,0 +1,37 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db
+
+# =============================================================================
+# INSERT ... ON CONFLICT DO UPDATE SEGÚN EL MOTOR (SQLite / PostgreSQL)
+# =============================================================================
+
+_DIALECTOS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def upsert(table, index_elements, update_cols, index_where=None):
+    """
+    Sentencia INSERT que, si ya existe una fila con la misma clave única
+    (index_elements), actualiza update_cols con los valores del INSERT.
+    update_cols es una lista de nombres de columna, o una función que recibe
+    "excluded" (los valores del INSERT) y devuelve {columna: expresión}.
+    """
+    dialecto = db.engine.dialect.name
+    if dialecto not in _DIALECTOS:
+        raise NotImplementedError(f"Upsert no soportado para {dialecto}")
+
+    stmt = _DIALECTOS[dialecto](table)
+
+    if callable(update_cols):
+        valores = update_cols(stmt.excluded)
+    else:
+        valores = {col: stmt.excluded[col] for col in update_cols}
+
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        index_where=index_where,
+        set_=valores,
+    )
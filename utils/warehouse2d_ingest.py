@@ -0,0 +1,200 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from models import db
+from models.warehouse2d import WarehouseLocation
+from models.alerts import Alert
+from utils.excel import iter_warehouse2d_excel
+from utils.dashboard_kpis import refresh_layout_kpis
+from utils.locations import location_coords_frame, location_sort_keys
+from utils.upsert import upsert
+from utils.warehouse_layout import accumulate_locations, rebuild_location_summary
+
+# =============================================================================
+# ALERTAS DE STOCK CRÍTICO (una sentencia por carga)
+#
+#   Cada alerta tiene una huella tipo|ubicación|material. Las posiciones
+#   críticas del layout recién cargado se insertan con INSERT ... SELECT:
+#   si ya hay una alerta activa con esa huella se refresca (mensaje y fecha
+#   de actualización) en vez de duplicarse. Las alertas activas que no se
+#   tocaron en esta carga son posiciones resueltas y se cierran.
+# =============================================================================
+ALERT_TYPE_CRITICO = "stock_critico_2d"
+
+
+def sync_critical_alerts(ahora=None):
+    """
+    Abre/refresca las alertas de las ubicaciones en estado crítico y cierra
+    las que ya no lo están (sin commit). Devuelve (activas, cerradas).
+    """
+    ahora = ahora or datetime.utcnow()
+    w = WarehouseLocation
+    t = Alert.__table__
+
+    ubicacion = db.func.coalesce(w.ubicacion, "")
+    material = db.func.coalesce(w.material_code, "")
+    libre = db.func.sum(w.libre_utilizacion)
+    seguridad = db.func.max(w.stock_seguridad)
+
+    mensaje = (
+        "Stock crítico en " + ubicacion + ": " + material
+        + " (" + db.func.coalesce(db.func.max(w.material_text), "") + ") "
+        + "Libre=" + db.cast(libre, db.String)
+        + ", Seguridad=" + db.cast(seguridad, db.String)
+    )
+
+    # Una fila por huella (un material repetido en la ubicación se suma)
+    criticas = (
+        db.select(
+            db.literal(ALERT_TYPE_CRITICO),
+            db.literal(ALERT_TYPE_CRITICO),
+            mensaje,
+            db.func.substr(mensaje, 1, 255),
+            db.literal("Alta"),
+            db.literal("Alta"),
+            db.literal("Layout 2D"),
+            db.literal("activo"),
+            db.literal(ahora),
+            db.literal(ahora),
+            Alert.make_fingerprint(ALERT_TYPE_CRITICO, ubicacion, material),
+        )
+        .where(w.status == "crítico")
+        .group_by(ubicacion, material)
+    )
+
+    stmt = upsert(
+        t, ["fingerprint"],
+        lambda excluded: {
+            "message": excluded.message,
+            "mensaje": excluded.mensaje,
+            "actualizado": excluded.actualizado,
+        },
+        index_where=Alert.ACTIVE_WHERE,
+    ).from_select(
+        ["alert_type", "tipo", "message", "mensaje", "severity", "nivel",
+         "origen", "estado", "fecha", "actualizado", "fingerprint"],
+        criticas,
+    )
+    activas = db.session.execute(stmt).rowcount
+
+    # Lo que no se refrescó en esta carga ya no está crítico
+    cerradas = db.session.execute(
+        t.update()
+        .where(
+            t.c.alert_type == ALERT_TYPE_CRITICO,
+            t.c.estado == "activo",
+            db.or_(t.c.actualizado.is_(None), t.c.actualizado < ahora),
+        )
+        .values(estado="cerrado", actualizado=ahora)
+    ).rowcount
+
+    return activas, cerradas
+
+
+# =============================================================================
+# CARGA DEL LAYOUT 2D (Core executemany bloque a bloque)
+# =============================================================================
+
+# Columnas del Excel 2D → columnas de "warehouse_locations"
+COLUMNAS_TEXTO_2D = {
+    "Código del Material": "material_code",
+    "Texto breve de material": "material_text",
+    "Unidad de medida base": "base_unit",
+    "Ubicación": "ubicacion",
+}
+COLUMNAS_NUMERO_2D = {
+    "Stock de seguridad": "stock_seguridad",
+    "Stock máximo": "stock_maximo",
+    "Libre utilización": "libre_utilizacion",
+}
+
+
+def status_column(libre, maximo, seguridad):
+    """WarehouseLocation.status_for vectorizado (mismo orden de reglas)."""
+    libre, maximo, seguridad = (np.asarray(x, dtype=float) for x in (libre, maximo, seguridad))
+    ratio = np.divide(libre, maximo, out=np.zeros_like(libre), where=maximo > 0)
+
+    return np.select(
+        [libre <= 0, maximo <= 0, libre < seguridad, ratio < 0.5],
+        ["vacío", "normal", "crítico", "bajo"],
+        default="normal",
+    )
+
+
+def normalize_warehouse2d_frame(df):
+    """Bloque del Excel → filas tipadas de "warehouse_locations" con estado y coordenadas."""
+    out = pd.DataFrame(index=df.index)
+
+    for excel, col in COLUMNAS_TEXTO_2D.items():
+        valores = df[excel] if excel in df else pd.Series("", index=df.index)
+        out[col] = valores.fillna("").astype(str).str.strip()
+
+    for excel, col in COLUMNAS_NUMERO_2D.items():
+        valores = df[excel] if excel in df else pd.Series(0.0, index=df.index)
+        out[col] = pd.to_numeric(valores, errors="coerce").fillna(0.0).astype(float)
+
+    out = out.reset_index(drop=True)
+    out["status"] = status_column(out["libre_utilizacion"], out["stock_maximo"], out["stock_seguridad"])
+    out["ubicacion_sort"] = location_sort_keys(out["ubicacion"]).to_numpy()
+    return pd.concat([out, location_coords_frame(out["ubicacion"])], axis=1)
+
+
+def load_warehouse2d(chunks, progreso=None):
+    """
+    Reemplaza el layout 2D con las filas de los bloques del Excel y
+    sincroniza las alertas de stock crítico. Cada bloque se inserta y se
+    descarta; el resumen por ubicación del mapa se acumula por bloque y se
+    reconstruye en la misma transacción. Devuelve el número de filas cargadas.
+    """
+    t = WarehouseLocation.__table__
+    ahora = datetime.utcnow()
+    total = 0
+    resumen = {}
+
+    try:
+        # 🔥 Limpiamos la tabla antes de cargar nuevo layout (misma transacción)
+        db.session.execute(t.delete())
+
+        for df in chunks:
+            data = normalize_warehouse2d_frame(df)
+            if not data.empty:
+                records = data.to_dict("records")
+                for r in records:
+                    r["created_at"] = ahora
+                db.session.execute(t.insert(), records)
+
+            accumulate_locations(resumen, data)
+
+            total += len(df)
+            if progreso:
+                progreso(len(df))
+
+        rebuild_location_summary(resumen)
+        sync_critical_alerts()
+        refresh_layout_kpis()
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return total
+
+
+# =============================================================================
+# TRABAJO EN SEGUNDO PLANO (utils.jobs)
+# =============================================================================
+def run_warehouse2d_upload(job, path):
+    try:
+        job.stage("Leyendo Excel")
+        with open(path, "rb") as fh:
+            chunks = iter_warehouse2d_excel(fh)
+            job.stage("Guardando layout 2D")
+            total = load_warehouse2d(chunks, progreso=job.progress)
+    finally:
+        os.remove(path)
+
+    return {"rows": total}
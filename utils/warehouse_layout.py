@@ -0,0 +1,290 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from models import db
+from models.warehouse2d import WarehouseLayout, WarehouseLocation, WarehouseLocationSummary
+from utils.locations import location_coords, location_sort_key
+from utils.upsert import upsert
+
+# =============================================================================
+# RESUMEN POR UBICACIÓN + VERSIÓN DEL LAYOUT 2D
+#
+#   La carga del Excel 2D acumula, bloque a bloque mientras inserta las
+#   filas, el total libre, la cantidad de materiales y el peor estado por
+#   ubicación.
+#   En la misma transacción la versión del layout sube en uno y sólo las
+#   filas del resumen que cambiaron se marcan con esa versión: el mapa usa la
+#   versión como ETag y el stream SSE envía las filas con version > la del
+#   cliente. Una ubicación que desaparece del Excel queda con items = 0.
+# =============================================================================
+
+LAYOUT_ID = 1
+
+SIN_UBICACION = "SIN UBICACIÓN"
+
+CHUNK_SIZE = 5000
+
+
+def layout_version():
+    """Versión actual del layout (0 si nunca se cargó)."""
+    return (
+        db.session.query(WarehouseLayout.version).filter_by(id=LAYOUT_ID).scalar() or 0
+    )
+
+
+def layout_etag(version):
+    return f"layout-{version}"
+
+
+def bump_layout_version():
+    """Sube la versión dentro de la transacción actual y la devuelve."""
+    layout = db.session.get(WarehouseLayout, LAYOUT_ID, with_for_update=True)
+    if layout is None:
+        layout = WarehouseLayout(id=LAYOUT_ID, version=0)
+        db.session.add(layout)
+
+    layout.version = (layout.version or 0) + 1
+    layout.updated_at = datetime.utcnow()
+    db.session.flush()
+    return layout.version
+
+
+def accumulate_locations(resumen, frame):
+    """
+    Suma un bloque de materiales (ubicacion, libre_utilizacion, status) al
+    resumen {ubicacion: {...}} conservando el peor estado de cada ubicación.
+    """
+    if frame.empty:
+        return
+
+    grupos = (
+        frame.assign(
+            ubicacion=frame["ubicacion"].replace("", SIN_UBICACION),
+            status_rank=frame["status"].map(WarehouseLocation.STATUS_RANK).fillna(0).astype(int),
+        )
+        .groupby("ubicacion", sort=False)
+        .agg(total_libre=("libre_utilizacion", "sum"), items=("status", "size"),
+             status_rank=("status_rank", "max"))
+    )
+
+    for loc, total_libre, items, rank in grupos.itertuples(name=None):
+        datos = resumen.get(loc)
+        if datos is None:
+            resumen[loc] = {"total_libre": float(total_libre), "items": int(items),
+                            "status": _STATUS_BY_RANK[rank], "status_rank": int(rank)}
+            continue
+
+        datos["total_libre"] += float(total_libre)
+        datos["items"] += int(items)
+        if rank > datos["status_rank"]:
+            datos["status_rank"] = int(rank)
+            datos["status"] = _STATUS_BY_RANK[rank]
+
+
+def rebuild_location_summary(resumen):
+    """
+    Actualiza la tabla resumen con los totales acumulados (sin commit): sólo
+    se escriben las ubicaciones que cambiaron, con la nueva versión del
+    layout. Devuelve esa versión.
+    """
+    version = bump_layout_version()
+
+    t = WarehouseLocationSummary.__table__
+    s = WarehouseLocationSummary
+    actuales = {
+        loc: (libre, items, status)
+        for loc, libre, items, status in db.session.execute(
+            db.select(s.ubicacion, s.total_libre, s.items, s.status)
+        )
+    }
+
+    rows = []
+    for loc, datos in resumen.items():
+        if actuales.pop(loc, None) != (datos["total_libre"], datos["items"], datos["status"]):
+            rows.append(dict(datos, ubicacion=loc, ubicacion_sort=location_sort_key(loc),
+                             version=version, **location_coords(loc)))
+
+    # Ubicaciones que ya no vienen en el Excel: quedan sin materiales
+    for loc, (_, items, _) in actuales.items():
+        if items:
+            rows.append({"ubicacion": loc, "ubicacion_sort": location_sort_key(loc),
+                         "total_libre": 0.0, "items": 0, "status": "vacío",
+                         "status_rank": 0, "version": version, **location_coords(loc)})
+
+    stmt = upsert(t, ["ubicacion"], ["total_libre", "items", "status", "status_rank", "version"])
+    for start in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(stmt, rows[start:start + CHUNK_SIZE])
+
+    return version
+
+
+def location_summaries(since=None):
+    """
+    Resumen de las ubicaciones en orden natural (una lectura por índice).
+    Con since, sólo las filas que cambiaron después de esa versión, incluidas
+    las ubicaciones eliminadas (items = 0).
+    """
+    s = WarehouseLocationSummary
+    stmt = db.select(
+        s.ubicacion.label("location"), s.total_libre, s.items, s.status,
+    ).order_by(s.ubicacion_sort)
+
+    if since is None:
+        stmt = stmt.where(s.items > 0)
+    else:
+        stmt = stmt.where(s.version > since)
+
+    return [r._asdict() for r in db.session.execute(stmt)]
+
+
+# =============================================================================
+# TILES DEL MAPA POR NIVEL DE ZOOM
+#
+#   zoom < TILE_ZOOM_AISLE     → un agregado por zona
+#   zoom < TILE_ZOOM_LOCATION  → un agregado por (zona, pasillo)
+#   zoom >= TILE_ZOOM_LOCATION → ubicaciones individuales
+#
+#   bbox = (pasillo_min, rack_min, pasillo_max, rack_max), inclusive. En el
+#   nivel de pasillos sólo se usa el rango de pasillos. Los agregados se
+#   calculan con GROUP BY sobre el resumen (índice zona/pasillo/rack/nivel).
+# =============================================================================
+
+TILE_ZOOM_AISLE = 2
+TILE_ZOOM_LOCATION = 4
+
+# Tope de ubicaciones por respuesta en el zoom máximo
+TILE_MAX_LOCATIONS = 5000
+
+_STATUS_BY_RANK = {rank: status for status, rank in WarehouseLocation.STATUS_RANK.items()}
+
+
+def tile_level(zoom):
+    if zoom >= TILE_ZOOM_LOCATION:
+        return "location"
+    if zoom >= TILE_ZOOM_AISLE:
+        return "aisle"
+    return "zone"
+
+
+def location_tiles(zoom, bbox=None, zone=None):
+    """
+    Tiles del mapa para el zoom indicado (ver tile_level), recortados por
+    zona y bbox. Devuelve {"level", "tiles", "truncated"}.
+    """
+    s = WarehouseLocationSummary
+    level = tile_level(zoom)
+
+    filtros = [s.items > 0]
+    if zone is not None:
+        filtros.append(s.zone == zone)
+    if bbox is not None and level != "zone":
+        x0, y0, x1, y1 = bbox
+        filtros.append(s.aisle.between(x0, x1))
+        if level == "location":
+            filtros.append(s.rack.between(y0, y1))
+
+    if level == "location":
+        stmt = (
+            db.select(
+                s.ubicacion.label("location"), s.zone, s.aisle, s.rack, s.level,
+                s.total_libre, s.items, s.status,
+            )
+            .where(*filtros)
+            .order_by(s.ubicacion_sort)
+            .limit(TILE_MAX_LOCATIONS + 1)
+        )
+        tiles = [r._asdict() for r in db.session.execute(stmt)]
+        truncated = len(tiles) > TILE_MAX_LOCATIONS
+        return {"level": level, "tiles": tiles[:TILE_MAX_LOCATIONS], "truncated": truncated}
+
+    grupo = [s.zone] if level == "zone" else [s.zone, s.aisle]
+    stmt = (
+        db.select(
+            *grupo,
+            db.func.count().label("locations"),
+            db.func.sum(s.items).label("items"),
+            db.func.sum(s.total_libre).label("total_libre"),
+            db.func.max(s.status_rank).label("status_rank"),
+            db.func.sum(db.case((s.status == "crítico", 1), else_=0)).label("criticos"),
+        )
+        .where(*filtros)
+        .group_by(*grupo)
+        .order_by(*grupo)
+    )
+
+    tiles = []
+    for r in db.session.execute(stmt):
+        tile = r._asdict()
+        tile["status"] = _STATUS_BY_RANK.get(tile.pop("status_rank"), "normal")
+        tiles.append(tile)
+
+    return {"level": level, "tiles": tiles, "truncated": False}
+
+
+# =============================================================================
+# DETALLE DE MATERIALES POR UBICACIÓN (lote + caché LRU por versión)
+#
+#   El detalle de varias ubicaciones se resuelve con un solo IN. Los
+#   resultados se guardan en un LRU en memoria que se vacía cuando cambia
+#   la versión del layout: una ubicación ya consultada no vuelve a la base
+#   hasta la próxima carga del Excel 2D.
+# =============================================================================
+
+DETAIL_CACHE_SIZE = 4096
+
+# Máximo de ubicaciones por petición de detalle
+MAX_DETAIL_LOCATIONS = 200
+
+_DETAIL_FIELDS = (
+    "material_code", "material_text", "base_unit", "stock_seguridad",
+    "stock_maximo", "libre_utilizacion", "status",
+)
+
+_detail_cache = {"version": None, "items": OrderedDict()}
+_detail_lock = threading.Lock()
+
+
+def location_details(ubicaciones, version=None):
+    """{ubicacion: [materiales]} para las ubicaciones pedidas (vacío si no existe)."""
+    if version is None:
+        version = layout_version()
+    resultado, faltan = {}, []
+
+    with _detail_lock:
+        cache = _detail_cache["items"]
+        if _detail_cache["version"] != version:
+            cache.clear()
+            _detail_cache["version"] = version
+
+        for loc in ubicaciones:
+            if loc in cache:
+                cache.move_to_end(loc)
+                resultado[loc] = cache[loc]
+            else:
+                faltan.append(loc)
+
+    if not faltan:
+        return resultado
+
+    w = WarehouseLocation
+    nuevos = {loc: [] for loc in faltan}
+    rows = db.session.execute(
+        db.select(w.ubicacion, *(getattr(w, f) for f in _DETAIL_FIELDS))
+        .where(w.ubicacion.in_(faltan))
+        .order_by(w.ubicacion, w.material_code)
+    )
+    for row in rows:
+        datos = row._asdict()
+        nuevos[datos.pop("ubicacion")].append(datos)
+
+    with _detail_lock:
+        # Si otra petición ya vio una versión más nueva, no mezclar datos viejos
+        if _detail_cache["version"] == version:
+            cache = _detail_cache["items"]
+            cache.update(nuevos)
+            while len(cache) > DETAIL_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    resultado.update(nuevos)
+    return resultado